@@ -11,7 +11,7 @@ from datetime import datetime, timezone
 from flask import Flask, jsonify, request, Response
 
 from backend.auth.auth_utils import get_auth_payload
-from backend.database import execute, query_one
+from backend.database import execute
 
 
 def _now_iso() -> str:
@@ -34,23 +34,17 @@ def register_routes(app: Flask) -> None:
         if not token or not isinstance(token, str):
             return jsonify({"error": "token is required"}), 400
 
-        existing = query_one("SELECT id FROM device_tokens WHERE token = ?", (token,))
-        if existing:
-            execute(
-                """
-                UPDATE device_tokens
-                SET user_id = ?, platform = ?, last_seen_at = ?
-                WHERE token = ?
-                """,
-                (user_id, platform, _now_iso(), token),
-            )
-        else:
-            execute(
-                """
-                INSERT INTO device_tokens (user_id, token, platform, last_seen_at)
-                VALUES (?, ?, ?, ?)
-                """,
-                (user_id, token, platform, _now_iso()),
-            )
+        # One statement: insert, or move an existing token to this user.
+        execute(
+            """
+            INSERT INTO device_tokens (user_id, token, platform, last_seen_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(token) DO UPDATE SET
+                user_id = excluded.user_id,
+                platform = excluded.platform,
+                last_seen_at = excluded.last_seen_at
+            """,
+            (user_id, token, platform, _now_iso()),
+        )
 
         return jsonify({"ok": True}), 200
@@ -0,0 +1,73 @@
+"""
+backend/api/events.py
+
+Cry session history API.
+
+?stream=<id> limits both endpoints to one room; without it they cover all
+streams (daily totals are summed).
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+from flask import Flask, jsonify, request, Response
+
+from backend.config import settings
+from backend.cry_events import load_daily, load_events
+from backend.models import CryDay, CryEvent
+
+
+_DEFAULT_LIMIT = 50
+_MAX_LIMIT = 500
+_MAX_DAYS = 366
+
+
+def _parse_time(value: str | None) -> datetime | None:
+    """
+    Raises ValueError for a malformed timestamp; naive values are UTC.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def register_routes(app: Flask) -> None:
+    @app.get("/api/events")
+    def events() -> tuple[Response, int]:
+        stream_id = request.args.get("stream") or None
+        if stream_id is not None and stream_id not in settings.audio_stream_ids:
+            return jsonify({"error": f"unknown stream {stream_id!r}"}), 404
+        limit = request.args.get("limit", type=int) or _DEFAULT_LIMIT
+        limit = max(1, min(limit, _MAX_LIMIT))
+        try:
+            since = _parse_time(request.args.get("since"))
+            until = _parse_time(request.args.get("until"))
+            rows, next_cursor = load_events(
+                limit, request.args.get("cursor") or None, since, until, stream_id=stream_id
+            )
+        except ValueError:
+            return jsonify({"error": "invalid cursor, since or until"}), 400
+        payload = {
+            "events": [asdict(CryEvent.from_row(row)) for row in rows],
+            "next_cursor": next_cursor,
+        }
+        return jsonify(payload), 200
+
+    @app.get("/api/events/daily")
+    def daily() -> tuple[Response, int]:
+        stream_id = request.args.get("stream") or None
+        if stream_id is not None and stream_id not in settings.audio_stream_ids:
+            return jsonify({"error": f"unknown stream {stream_id!r}"}), 404
+        days = request.args.get("days", type=int) or 7
+        days = max(1, min(days, _MAX_DAYS))
+        summary = []
+        for row in load_daily(days, stream_id=stream_id):
+            day = asdict(CryDay.from_row(row))
+            day["cry_minutes"] = round(day["cry_seconds"] / 60, 1)
+            summary.append(day)
+        return jsonify({"days": summary}), 200
@@ -0,0 +1,43 @@
+"""
+backend/api/metrics.py
+
+Prometheus metrics endpoint, per-route request timing and end-to-end
+notification latency percentiles.
+"""
+
+from __future__ import annotations
+
+import time
+
+from flask import Flask, g, jsonify, request, Response
+
+from backend.metrics import HTTP_REQUEST_SECONDS, render
+from backend.notifications.outbox import latency_summary
+
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def register_routes(app: Flask) -> None:
+    @app.before_request
+    def start_timer() -> None:
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_timing(response: Response) -> Response:
+        started = g.get("request_started")
+        if started is not None:
+            # The URL rule, not the path, keeps the label set small.
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+    @app.get("/api/metrics")
+    def metrics() -> Response:
+        return Response(render(), mimetype=None, content_type=_CONTENT_TYPE)
+
+    @app.get("/api/metrics/latency")
+    def latency() -> tuple[Response, int]:
+        return jsonify(latency_summary()), 200
@@ -10,6 +10,7 @@ from flask import Flask, jsonify, request, Response
 
 from backend.database import query_one, execute
 from backend.auth.auth_utils import get_auth_payload
+from backend.notifications.dispatcher import invalidate_candidates
 
 
 def _get_user(user_id: int) -> dict | None:
@@ -49,6 +50,7 @@ def _ensure_settings(user_id: int) -> dict:
         """,
         (user_id,),
     )
+    invalidate_candidates()
     return _get_settings(user_id) or {
         "user_id": user_id,
         "threshold_seconds": 20,
@@ -114,5 +116,6 @@ def register_routes(app: Flask) -> None:
             """,
             (new_threshold, int(new_enabled), new_cooldown, user_id),
         )
+        invalidate_candidates()
 
         return jsonify(_get_settings(user_id)), 200
@@ -1,59 +1,151 @@
 """
 backend/api/status.py
 
-Status API for current cry state.
+Status API for current cry state, per audio stream.
+
+Every endpoint takes ?stream=<id> (default: the first configured stream);
+/api/streams lists the configured streams.
 """
 
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import json
+import os
+from threading import Lock
+
 from flask import jsonify, Flask, Response, request
 
-from backend.audio.state import get_state
+from backend.audio.state import CryState, CryTimeline, get_state, STATUS_CONFIDENCE_DIGITS, STATUS_VOLUME_DIGITS
 from backend.config import settings
-from backend.database import query_all
+from backend.volume_history import load_samples
+
+
+_MAX_VOLUME_MINUTES = 7 * 24 * 60
+
+# Versions restart with the process; the boot tag keeps old ETags from matching.
+_BOOT_TAG = os.urandom(4).hex()
+_CACHE_LOCK = Lock()
+# Per stream: (timeline version, serialized timeline array)
+_TIMELINE_CACHE: dict[str, tuple[int, str]] = {}
+# Per stream: (state version, response body, etag)
+_STATUS_CACHE: dict[str, tuple[int, bytes, str]] = {}
+
+
+def _timeline_json(stream_id: str, timeline: CryTimeline) -> str:
+    cached = _TIMELINE_CACHE.get(stream_id)
+    if cached is not None and cached[0] == timeline.version:
+        return cached[1]
+    encoded = json.dumps(
+        [
+            {"minute_start": event.minute_start.isoformat(), "is_crying": event.is_crying}
+            for event in timeline
+        ],
+        separators=(",", ":"),
+    )
+    _TIMELINE_CACHE[stream_id] = (timeline.version, encoded)
+    return encoded
+
+
+def _status_document(state: CryState) -> tuple[bytes, str]:
+    """
+    Serialized /api/status body and its ETag, memoized per state version.
+
+    The version only moves when a field in this body changes, so the
+    volume and confidence are reported at the precision it tracks them at
+    and last_updated_at is the time of that change. The timeline (up to 480
+    minutes) is cached separately per timeline version, since it only
+    changes when a minute's flag does.
+    """
+    stream_id = state.stream_id
+    with _CACHE_LOCK:
+        cached = _STATUS_CACHE.get(stream_id)
+        if cached is not None and cached[0] == state.version:
+            return cached[1], cached[2]
+        head = json.dumps(
+            {
+                "stream_id": stream_id,
+                "is_crying": state.is_crying,
+                "current_minute_is_crying": state.current_minute_is_crying,
+                "effective_cry_minutes": state.effective_cry_minutes,
+                "consecutive_quiet_minutes": state.consecutive_quiet_minutes,
+                "volume_level": round(state.last_volume, STATUS_VOLUME_DIGITS),
+                "volume_threshold": state.volume_threshold,
+                "cry_confidence": (
+                    None if state.cry_confidence is None else round(state.cry_confidence, STATUS_CONFIDENCE_DIGITS)
+                ),
+                "last_updated_at": state.last_updated_at.isoformat(),
+            },
+            separators=(",", ":"),
+        )
+        body = f'{head[:-1]},"timeline":{_timeline_json(stream_id, state.timeline)}}}'.encode("utf-8")
+        etag = f"{_BOOT_TAG}-{stream_id}-{state.version}"
+        _STATUS_CACHE[stream_id] = (state.version, body, etag)
+        return body, etag
+
+
+def _requested_stream() -> str | None:
+    """
+    The ?stream= id, the default stream when absent, or None if unknown.
+    """
+    stream_id = request.args.get("stream") or settings.audio_stream_ids[0]
+    return stream_id if stream_id in settings.audio_stream_ids else None
+
+
+def _unknown_stream() -> tuple[Response, int]:
+    return jsonify({"error": f"unknown stream {request.args.get('stream')!r}"}), 404
 
 
 def register_routes(app: Flask) -> None:
-    @app.get("/api/status")
-    def status() -> tuple[Response, int]:
-        state = get_state()
-        payload = {
-            "is_crying": state.is_crying,
-            "current_minute_is_crying": state.current_minute_is_crying,
-            "effective_cry_minutes": state.effective_cry_minutes,
-            "consecutive_quiet_minutes": state.consecutive_quiet_minutes,
-            "volume_level": state.last_volume,
-            "volume_threshold": state.volume_threshold,
-            "timeline": [
+    @app.get("/api/streams")
+    def streams() -> tuple[Response, int]:
+        payload = []
+        for stream_id, device_index in settings.audio_streams:
+            state = get_state(stream_id)
+            payload.append(
                 {
-                    "minute_start": event.minute_start.isoformat(),
-                    "is_crying": event.is_crying,
+                    "stream_id": stream_id,
+                    "device_index": device_index,
+                    "is_crying": state.is_crying,
+                    "effective_cry_minutes": state.effective_cry_minutes,
+                    "last_updated_at": state.last_updated_at.isoformat(),
                 }
-                for event in state.timeline
-            ],
-            "last_updated_at": state.last_updated_at.isoformat(),
-        }
-        return jsonify(payload), 200
+            )
+        return jsonify({"streams": payload}), 200
+
+    @app.get("/api/status")
+    def status() -> tuple[Response, int]:
+        stream_id = _requested_stream()
+        if stream_id is None:
+            return _unknown_stream()
+        body, etag = _status_document(get_state(stream_id))
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response, response.status_code
 
     @app.get("/api/volume")
     def volume() -> tuple[Response, int]:
+        stream_id = _requested_stream()
+        if stream_id is None:
+            return _unknown_stream()
         minutes = request.args.get("minutes", type=int) or 15
-        minutes = max(1, min(minutes, 8 * 60))
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
-        rows = query_all(
-            """
-            SELECT recorded_at, rms
-            FROM volume_samples
-            WHERE recorded_at >= ?
-            ORDER BY recorded_at ASC
-            """,
-            (cutoff.isoformat(),),
+        minutes = max(1, min(minutes, _MAX_VOLUME_MINUTES))
+        since = request.args.get("since", type=int)
+        bucket_seconds = request.args.get("bucket_seconds", type=int)
+        if bucket_seconds is not None and bucket_seconds < 1:
+            return jsonify({"error": "bucket_seconds must be >= 1"}), 400
+        resolution, samples, cursor = load_samples(
+            minutes, since=since, bucket_seconds=bucket_seconds, stream_id=stream_id
         )
-        samples = [{"t": row["recorded_at"], "rms": row["rms"]} for row in rows]
         payload = {
+            "stream_id": stream_id,
             "samples": samples,
             "threshold": settings.audio_volume_threshold,
             "minutes": minutes,
+            "resolution_seconds": resolution,
+            "cursor": cursor,
         }
         return jsonify(payload), 200
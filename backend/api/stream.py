@@ -0,0 +1,65 @@
+"""
+backend/api/stream.py
+
+Live dashboard stream (Server-Sent Events).
+"""
+
+from __future__ import annotations
+
+from typing import Iterator
+
+from flask import Flask, jsonify, Response, request
+
+from backend.config import settings
+from backend.realtime import current_status_frame, hub_for
+
+
+_HEARTBEAT_SECONDS = 15.0
+_RETRY_MS = 3000
+
+
+def _parse_last_event_id(value: str | None) -> int | None:
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return None
+
+
+def register_routes(app: Flask) -> None:
+    @app.get("/api/stream")
+    def stream() -> Response | tuple[Response, int]:
+        stream_id = request.args.get("stream") or settings.audio_stream_ids[0]
+        if stream_id not in settings.audio_stream_ids:
+            return jsonify({"error": f"unknown stream {stream_id!r}"}), 404
+        hub = hub_for(stream_id)
+        last_id = _parse_last_event_id(
+            request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+        )
+
+        def events() -> Iterator[bytes]:
+            cursor = last_id
+            yield f"retry: {_RETRY_MS}\n\n".encode("ascii")
+            if cursor is None:
+                cursor = hub.last_id
+                yield current_status_frame(stream_id)
+            while True:
+                result = hub.wait(cursor, _HEARTBEAT_SECONDS)
+                if result is None:
+                    # Too far behind to replay: tell the client to reload.
+                    cursor = hub.last_id
+                    yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n".encode("ascii")
+                    yield current_status_frame(stream_id)
+                    continue
+                frames, cursor = result
+                if not frames:
+                    yield b": heartbeat\n\n"
+                    continue
+                yield b"".join(frames)
+
+        return Response(
+            events(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
@@ -6,11 +6,14 @@ Basic user management endpoints (minimal for v1).
 
 from __future__ import annotations
 
+import sqlite3
+
 from flask import Flask, jsonify, request, Response
 
-from backend.database import query_all, query_one, execute
-from backend.auth.auth_utils import hash_password
+from backend.database import query_all, query_one, execute, transaction
+from backend.auth.auth_utils import hash_password, password_busy_response, PasswordHashBusy
 from backend.auth.auth_utils import get_auth_payload
+from backend.notifications.dispatcher import invalidate_candidates
 
 
 def register_routes(app: Flask) -> None:
@@ -41,15 +44,21 @@ def register_routes(app: Flask) -> None:
         if existing:
             return jsonify({"error": "user already exists"}), 409
 
-        password_hash = hash_password(str(password))
-        execute(
-            "INSERT INTO users (email, password_hash, is_active) VALUES (?, ?, 1)",
-            (email, password_hash),
-        )
-        row = query_one("SELECT id, email, is_active, created_at FROM users WHERE email = ?", (email,))
-        if not row:
-            return jsonify({"error": "user creation failed"}), 500
-        return jsonify({"user": {"id": row["id"], "email": row["email"], "is_active": bool(row["is_active"])}}), 201
+        try:
+            password_hash = hash_password(str(password))
+        except PasswordHashBusy:
+            return password_busy_response()
+        try:
+            with transaction() as db:
+                cur = db.execute(
+                    "INSERT INTO users (email, password_hash, is_active) VALUES (?, ?, 1)",
+                    (email, password_hash),
+                )
+                user_id = cur.lastrowid
+        except sqlite3.IntegrityError:
+            return jsonify({"error": "user already exists"}), 409
+        invalidate_candidates()
+        return jsonify({"user": {"id": user_id, "email": email, "is_active": True}}), 201
 
     @app.post("/api/users/deactivate")
     def deactivate_user() -> tuple[Response, int]:
@@ -61,4 +70,5 @@ def register_routes(app: Flask) -> None:
         if not isinstance(user_id, int):
             return jsonify({"error": "user_id required"}), 400
         execute("UPDATE users SET is_active = 0 WHERE id = ?", (user_id,))
+        invalidate_candidates()
         return jsonify({"ok": True}), 200
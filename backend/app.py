@@ -8,6 +8,9 @@ from __future__ import annotations
 
 from threading import Thread
 from datetime import datetime, timezone
+import atexit
+import signal
+import sys
 import time
 import logging
 from typing import Callable, Any
@@ -15,7 +18,7 @@ from typing import Callable, Any
 from flask import Flask, send_from_directory
 
 from backend.config import settings, ensure_runtime_dirs
-from backend.database import execute
+from backend.volume_writer import get_volume_writer
 from pathlib import Path
 
 
@@ -44,48 +47,84 @@ def register_routes(app: Flask) -> None:
     _try_call("backend.api.settings", "register_routes", app)
     _try_call("backend.api.users", "register_routes", app)
     _try_call("backend.api.devices", "register_routes", app)
+    _try_call("backend.api.stream", "register_routes", app)
+    _try_call("backend.api.events", "register_routes", app)
+    _try_call("backend.api.metrics", "register_routes", app)
     _try_call("backend.auth.routes", "register_routes", app)
 
 
-def _build_audio_callback() -> Callable[[bytes], None]:
-    def on_audio_chunk(audio_chunk: bytes) -> None:
-        from backend.audio.detector import analyze_chunk
-        from backend.audio.state import update
-        from backend.notifications.dispatcher import evaluate_notifications
+def _build_audio_callback(stream_id: str) -> Callable[[bytes | memoryview, float | None], None]:
+    from backend.audio.detector import create_frame_detector
+    from backend.audio.state import update
+    from backend.notifications.dispatcher import evaluate_notifications
 
+    detector = create_frame_detector(stream_id)
+    frame_samples = int(settings.audio_sample_rate * settings.audio_frame_seconds)
+    hop_seconds = frame_samples / settings.audio_sample_rate
+
+    def on_audio_chunk(audio_chunk: bytes | memoryview, captured_at: float | None = None) -> None:
         try:
-            crying, level = analyze_chunk(audio_chunk)
-            state = update(crying, volume=level, threshold=settings.audio_volume_threshold)
-            evaluate_notifications(state)
+            state = None
+            frames = detector.feed(audio_chunk)
+            for index, (crying, level, confidence) in enumerate(frames):
+                # captured_at is when the chunk's last sample arrived: space
+                # the frames back from it by one hop each.
+                frame_captured_at = None
+                if captured_at is not None:
+                    frame_captured_at = captured_at - (len(frames) - 1 - index) * hop_seconds
+                state = update(
+                    crying,
+                    volume=level,
+                    threshold=settings.audio_volume_threshold,
+                    confidence=confidence,
+                    stream_id=stream_id,
+                    captured_at=frame_captured_at,
+                )
+            if state is not None:
+                evaluate_notifications(state, captured_at=captured_at)
         except Exception as exc:
-            logger.error("Audio processing failed: %s", exc)
+            logger.error("Audio processing failed for stream %s: %s", stream_id, exc)
 
     return on_audio_chunk
 
 
 def start_audio_listener() -> None:
+    if not settings.audio_enabled:
+        logger.info("Audio capture disabled (AUDIO_ENABLED=0)")
+        return
     try:
         from backend.audio.listener import start_listening
     except Exception as exc:
         logger.warning("Audio listener not started: %s", exc)
         return
 
-    callback = _build_audio_callback()
-    thread = Thread(target=start_listening, args=(callback,), daemon=True)
-    thread.start()
+    # One capture thread, detector and cry state per configured room.
+    for stream_id, device_index in settings.audio_streams:
+        callback = _build_audio_callback(stream_id)
+        thread = Thread(
+            target=start_listening,
+            args=(callback, device_index, stream_id),
+            name=f"capture-{stream_id}",
+            daemon=True,
+        )
+        thread.start()
 
 
 def start_volume_logger() -> None:
+    writer = get_volume_writer()
+    writer.start()
+    atexit.register(writer.stop)
+
     def volume_loop() -> None:
         from backend.audio.state import get_state
+        from backend.realtime import publish_volume
 
         while True:
-            state = get_state()
-            timestamp = datetime.now(timezone.utc).isoformat()
-            execute(
-                "INSERT INTO volume_samples (recorded_at, rms) VALUES (?, ?)",
-                (timestamp, float(state.last_volume)),
-            )
+            now = datetime.now(timezone.utc)
+            for stream_id in settings.audio_stream_ids:
+                level = float(get_state(stream_id).last_volume)
+                writer.add(now, level, stream_id)
+                publish_volume(stream_id, now.isoformat(), level)
             time.sleep(1)
 
     thread = Thread(target=volume_loop, daemon=True)
@@ -109,6 +148,10 @@ def create_app() -> Flask:
 
     _try_call("backend.database", "init_db")
     register_routes(app)
+    _try_call("backend.state_snapshot", "start")
+    _try_call("backend.realtime", "start")
+    _try_call("backend.notifications.outbox", "start")
+    _try_call("backend.cry_events", "start")
     start_audio_listener()
     start_volume_logger()
 
@@ -116,5 +159,7 @@ def create_app() -> Flask:
 
 
 if __name__ == "__main__":
+    # systemd stops the service with SIGTERM; exit normally so atexit flushes run.
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: sys.exit(0))
     application = create_app()
     application.run(host=settings.host, port=settings.port)
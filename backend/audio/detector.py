@@ -2,14 +2,46 @@
 backend/audio/detector.py
 
 Simple audio detector (volume threshold). Replace with ML later.
+
+Samples are native-endian 16-bit PCM, as delivered by PyAudio's paInt16.
+The RMS computation has pluggable backends, picked once at import time:
+- "numpy":   np.frombuffer over the chunk (no copy), vectorised sum of squares.
+- "audioop": stdlib C implementation (Python < 3.13).
+- "array":   pure Python, sum of squares via map() over an int16 array.
+Each backend also has a per-frame form that returns the RMS of every hop
+frame in a chunk; numpy does that in one pass over a (frames, frame_len)
+view, the others call their scalar RMS per frame.
+
+By default ("auto") the backend with the lowest measured cost per frame,
+at the configured AUDIO_CHUNK_SECONDS and AUDIO_FRAME_SECONDS, wins:
+numpy has a fixed cost per call of a few microseconds, so on short
+chunks audioop is faster. Set AUDIO_RMS_BACKEND to force one of them.
 """
 
 from __future__ import annotations
 
 from array import array
-from typing import Iterable, Tuple
+import logging
+import math
+import operator
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, Tuple
+import warnings
 
 from backend.config import settings
+from backend.metrics import DETECTOR
+
+if TYPE_CHECKING:
+    from backend.audio.spectral import SpectralCryDetector
+
+
+logger = logging.getLogger("baby_monitor.audio")
+
+_INT16_FULL_SCALE = 32768.0
+
+RmsBackend = Callable[[bytes | bytearray | memoryview], float]
+# (chunk, samples per frame) -> RMS of each complete frame
+FrameRmsBackend = Callable[[bytes | bytearray | memoryview, int], list[float]]
 
 
 def _rms_from_int16(samples: Iterable[int]) -> float:
@@ -24,6 +56,163 @@ def _rms_from_int16(samples: Iterable[int]) -> float:
     return mean_square ** 0.5
 
 
+def _usable_length(buffer: bytes | bytearray | memoryview) -> int:
+    # Ignore a trailing odd byte instead of failing on a torn sample.
+    return len(buffer) - (len(buffer) % 2)
+
+
+def _make_numpy_backend() -> RmsBackend:
+    import numpy as np  # type: ignore
+
+    def rms(buffer: bytes | bytearray | memoryview) -> float:
+        count = _usable_length(buffer) // 2
+        if count == 0:
+            return 0.0
+        samples = np.frombuffer(buffer, dtype=np.int16, count=count)
+        # float64 accumulation: int16 squares overflow int32 sums on long chunks.
+        widened = samples.astype(np.float64)
+        mean_square = float(np.dot(widened, widened)) / count
+        return mean_square ** 0.5
+
+    return rms
+
+
+def _make_audioop_backend() -> RmsBackend:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop  # type: ignore
+
+    def rms(buffer: bytes | bytearray | memoryview) -> float:
+        usable = _usable_length(buffer)
+        if usable == 0:
+            return 0.0
+        return float(audioop.rms(buffer[:usable], 2))
+
+    return rms
+
+
+def _make_array_backend() -> RmsBackend:
+    def rms(buffer: bytes | bytearray | memoryview) -> float:
+        usable = _usable_length(buffer)
+        if usable == 0:
+            return 0.0
+        samples = array("h")
+        samples.frombytes(buffer[:usable])
+        mean_square = sum(map(operator.mul, samples, samples)) / len(samples)
+        return mean_square ** 0.5
+
+    return rms
+
+
+def _make_numpy_frame_backend() -> FrameRmsBackend:
+    import numpy as np  # type: ignore
+
+    def rms_frames(buffer: bytes | bytearray | memoryview, frame_samples: int) -> list[float]:
+        frames = _usable_length(buffer) // 2 // frame_samples
+        if frames == 0:
+            return []
+        samples = np.frombuffer(buffer, dtype=np.int16, count=frames * frame_samples)
+        # float32 is exact for int16 squares and plenty for a level; half the memory traffic of float64.
+        widened = samples.astype(np.float32).reshape(frames, frame_samples)
+        mean_squares = np.einsum("ij,ij->i", widened, widened) / frame_samples
+        return np.sqrt(mean_squares).tolist()
+
+    return rms_frames
+
+
+def _per_frame(factory: Callable[[], RmsBackend]) -> Callable[[], FrameRmsBackend]:
+    def make() -> FrameRmsBackend:
+        rms = factory()
+
+        def rms_frames(buffer: bytes | bytearray | memoryview, frame_samples: int) -> list[float]:
+            frame_bytes = frame_samples * 2
+            usable = len(buffer) - len(buffer) % frame_bytes
+            return [rms(buffer[offset : offset + frame_bytes]) for offset in range(0, usable, frame_bytes)]
+
+        return rms_frames
+
+    return make
+
+
+_BACKEND_FACTORIES: dict[str, Callable[[], RmsBackend]] = {
+    "numpy": _make_numpy_backend,
+    "audioop": _make_audioop_backend,
+    "array": _make_array_backend,
+}
+
+_FRAME_BACKEND_FACTORIES: dict[str, Callable[[], FrameRmsBackend]] = {
+    "numpy": _make_numpy_frame_backend,
+    "audioop": _per_frame(_make_audioop_backend),
+    "array": _per_frame(_make_array_backend),
+}
+
+
+def _frame_cost(frame_rms: FrameRmsBackend) -> float:
+    """
+    Best-of-five seconds per frame over one capture chunk at the configured sizes.
+    """
+    frame_samples = max(1, int(settings.audio_sample_rate * settings.audio_frame_seconds))
+    frames = max(1, int(settings.audio_chunk_seconds / settings.audio_frame_seconds))
+    chunk = bytes(frame_samples * frames * 2)
+    frame_rms(chunk, frame_samples)
+    best = math.inf
+    for _ in range(5):
+        started = time.perf_counter()
+        frame_rms(chunk, frame_samples)
+        best = min(best, time.perf_counter() - started)
+    return best / frames
+
+
+def _ranked_backends() -> list[tuple[float, str]]:
+    ranked = []
+    for name, factory in _FRAME_BACKEND_FACTORIES.items():
+        try:
+            frame_rms = factory()
+        except Exception:
+            continue
+        ranked.append((_frame_cost(frame_rms), name))
+    return sorted(ranked)
+
+
+def available_backends() -> list[str]:
+    """
+    Return the RMS backends that can be loaded here, cheapest per frame first.
+    """
+    return [name for _cost, name in _ranked_backends()]
+
+
+def get_backend(name: str) -> RmsBackend:
+    factory = _BACKEND_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown RMS backend: {name!r}")
+    return factory()
+
+
+def get_frame_backend(name: str) -> FrameRmsBackend:
+    factory = _FRAME_BACKEND_FACTORIES.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown RMS backend: {name!r}")
+    return factory()
+
+
+def _select_backend(preferred: str) -> tuple[str, RmsBackend]:
+    if preferred and preferred != "auto":
+        return preferred, get_backend(preferred)
+    ranked = _ranked_backends()
+    if not ranked:
+        raise RuntimeError("No RMS backend available")
+    logger.debug(
+        "RMS backend cost per frame: %s", ", ".join(f"{name} {cost * 1e6:.2f} us" for cost, name in ranked)
+    )
+    name = ranked[0][1]
+    return name, get_backend(name)
+
+
+BACKEND_NAME, _rms_from_buffer = _select_backend(settings.audio_rms_backend)
+_frame_rms = get_frame_backend(BACKEND_NAME)
+logger.debug("RMS backend: %s", BACKEND_NAME)
+
+
 def analyze_chunk(audio_chunk: bytes | Iterable[int]) -> Tuple[bool, float]:
     """
     Return (is_crying, normalized_level) for the audio chunk.
@@ -33,17 +222,184 @@ def analyze_chunk(audio_chunk: bytes | Iterable[int]) -> Tuple[bool, float]:
     if isinstance(audio_chunk, (bytes, bytearray, memoryview)):
         if len(audio_chunk) < 2:
             return False, 0.0
-        samples = array("h")
-        samples.frombytes(bytes(audio_chunk))
-        rms = _rms_from_int16(samples)
-        normalized = rms / 32768.0
+        rms = _rms_from_buffer(audio_chunk)
+        normalized = rms / _INT16_FULL_SCALE
     else:
         rms = _rms_from_int16(audio_chunk)
-        normalized = rms / 32768.0
+        normalized = rms / _INT16_FULL_SCALE
 
     return normalized >= settings.audio_volume_threshold, normalized
 
 
+def create_spectral_detector() -> SpectralCryDetector | None:
+    """
+    Build a spectral stage for one stream, or None if disabled/unavailable.
+    """
+    if not settings.audio_spectral_enabled:
+        return None
+    try:
+        from backend.audio.spectral import SpectralCryDetector
+    except Exception as exc:
+        logger.warning("Spectral cry detection disabled: %s", exc)
+        return None
+    return SpectralCryDetector(settings.audio_sample_rate, settings.audio_fft_size)
+
+
+class FrameDetector:
+    """
+    Incremental detector for one stream.
+
+    Captured chunks of any size are cut into fixed hop frames
+    (AUDIO_FRAME_SECONDS); a partial frame is carried into the next chunk.
+    Each complete frame yields (is_crying, normalized_level, cry_confidence).
+    The spectral stage runs once per chunk over all new frames, and its
+    latest confidence is carried until it reports again.
+    """
+
+    def __init__(
+        self,
+        frame_seconds: float | None = None,
+        spectral: SpectralCryDetector | None = None,
+    ) -> None:
+        seconds = settings.audio_frame_seconds if frame_seconds is None else frame_seconds
+        frame_samples = int(settings.audio_sample_rate * seconds)
+        if frame_samples <= 0:
+            raise ValueError("AUDIO_FRAME_SECONDS must be > 0")
+        self.frame_samples = frame_samples
+        self.frame_bytes = frame_samples * 2
+        self._spectral = spectral if spectral is not None else create_spectral_detector()
+        self._pending = bytearray()
+        self._confidence: float | None = None
+
+    def feed(self, audio_chunk: bytes | bytearray | memoryview) -> list[Tuple[bool, float, float | None]]:
+        started = time.perf_counter()
+        data: bytes | bytearray | memoryview = audio_chunk
+        if self._pending:
+            self._pending += audio_chunk
+            data = bytes(self._pending)
+            self._pending.clear()
+
+        frame_bytes = self.frame_bytes
+        frames = len(data) // frame_bytes
+        usable = frames * frame_bytes
+        if usable < len(data):
+            self._pending += data[usable:]
+        if frames == 0:
+            return []
+
+        if self._spectral is not None:
+            features = self._spectral.process(data[:usable])
+            if features is not None:
+                self._confidence = features.confidence
+
+        volume_threshold = settings.audio_volume_threshold
+        confidence = self._confidence
+        confident = confidence is None or confidence >= settings.audio_cry_confidence_threshold
+        results = []
+        for rms in _frame_rms(data, self.frame_samples):
+            level = rms / _INT16_FULL_SCALE
+            results.append((confident and level >= volume_threshold, level, confidence))
+        DETECTOR.observe(time.perf_counter() - started)
+        return results
+
+
+def _detector_process(conn, frame_seconds: float | None) -> None:
+    detector = FrameDetector(frame_seconds)
+    while True:
+        try:
+            chunk = conn.recv_bytes()
+        except EOFError:
+            return
+        conn.send(detector.feed(chunk))
+
+
+class ProcessFrameDetector:
+    """
+    FrameDetector running in a child process, so the RMS and spectral work
+    of each stream gets its own core instead of sharing the GIL.
+
+    Same feed() interface; the capture thread waits on the pipe (without
+    holding the GIL) while the child analyses the chunk. If the child dies
+    it is started again and the chunk resent (a partial frame it held is
+    lost). After MAX_RESTARTS failures in a row, or if it cannot be
+    started, analysis falls back to an in-process FrameDetector.
+    """
+
+    MAX_RESTARTS = 3
+
+    def __init__(self, frame_seconds: float | None = None, name: str = "detector") -> None:
+        self.frame_seconds = frame_seconds
+        self.name = name
+        self.restarts = 0
+        self._failures = 0
+        self._fallback: FrameDetector | None = None
+        self._spawn()
+
+    def _spawn(self) -> None:
+        import multiprocessing
+
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_detector_process, args=(child_conn, self.frame_seconds), name=self.name, daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+
+    def _stop_process(self) -> None:
+        self._conn.close()
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join(timeout=5)
+
+    def _recover(self, exc: Exception) -> None:
+        self._failures += 1
+        logger.error("Analysis process %s failed (%r)", self.name, exc)
+        self._stop_process()
+        if self._failures <= self.MAX_RESTARTS:
+            try:
+                self._spawn()
+            except Exception as spawn_exc:
+                logger.error("Restarting analysis process %s failed: %s", self.name, spawn_exc)
+            else:
+                self.restarts += 1
+                return
+        logger.error("Analysing stream %s in-process from now on", self.name)
+        self._fallback = FrameDetector(self.frame_seconds)
+
+    def feed(self, audio_chunk: bytes | bytearray | memoryview) -> list[Tuple[bool, float, float | None]]:
+        started = time.perf_counter()
+        while self._fallback is None:
+            try:
+                self._conn.send_bytes(audio_chunk)
+                results = self._conn.recv()
+            except (EOFError, OSError) as exc:
+                self._recover(exc)
+                continue
+            self._failures = 0
+            DETECTOR.observe(time.perf_counter() - started)
+            return results
+        return self._fallback.feed(audio_chunk)
+
+    def close(self) -> None:
+        if self._fallback is None:
+            self._conn.close()
+            self._process.join(timeout=5)
+
+
+def create_frame_detector(stream_id: str = "default") -> FrameDetector | ProcessFrameDetector:
+    """
+    Detector for one stream: in-process, or in its own process when
+    AUDIO_ANALYSIS_PROCESSES is on.
+    """
+    if settings.audio_analysis_processes:
+        try:
+            return ProcessFrameDetector(name=f"detector-{stream_id}")
+        except Exception as exc:
+            logger.warning("Analysis process for stream %s failed to start (%s); using a thread", stream_id, exc)
+    return FrameDetector()
+
+
 def is_crying(audio_chunk: bytes | Iterable[int]) -> bool:
     crying, _level = analyze_chunk(audio_chunk)
     return crying
@@ -1,63 +1,128 @@
 """
 backend/audio/listener.py
 
-Microphone listener. Uses PyAudio if available.
+Audio listener: pumps an AudioSource (PyAudio by default) into analysis.
+
+One start_listening() call per stream (room); each has its own input
+device, capture thread, ring buffer and analysis thread.
 """
 
 from __future__ import annotations
 
 import logging
+import math
+from threading import Thread
 import time
 from typing import Callable
 
+from backend.audio.ring import PcmRingBuffer
+from backend.audio.sources import AudioSource, open_source
 from backend.config import settings
+from backend.metrics import AUDIO_ANALYSIS, AUDIO_READ, register_collector
 
 
 logger = logging.getLogger("baby_monitor.audio")
 
 
-def start_listening(callback: Callable[[bytes], None]) -> None:
+# stream_id -> capture ring buffer of that stream
+_RINGS: dict[str, PcmRingBuffer] = {}
+
+
+def capture_stats(stream_id: str | None = None) -> dict[str, int]:
+    """
+    Counters of a stream's capture ring buffer (empty when not listening).
+    """
+    ring = _RINGS.get(stream_id or settings.audio_stream_ids[0])
+    return ring.stats() if ring else {}
+
+
+def _ring_counter(field: str) -> Callable[[], list[tuple[dict[str, str], float]]]:
+    return lambda: [({"stream": stream_id}, ring.stats()[field]) for stream_id, ring in list(_RINGS.items())]
+
+
+register_collector(
+    "baby_monitor_audio_overflows_total",
+    "counter",
+    "Input overflows reported by the audio device.",
+    _ring_counter("overflowed"),
+)
+register_collector(
+    "baby_monitor_audio_dropped_chunks_total",
+    "counter",
+    "Captured chunks dropped because analysis fell behind.",
+    _ring_counter("dropped"),
+)
+
+
+ChunkCallback = Callable[[memoryview, float], None]
+
+
+def _analysis_worker(ring: PcmRingBuffer, callback: ChunkCallback) -> None:
+    while True:
+        chunk = ring.read(timeout=1.0)
+        if chunk is None:
+            if ring.closed:
+                return
+            continue
+        started = time.perf_counter()
+        try:
+            callback(chunk, ring.captured_at())
+        except Exception as exc:
+            logger.error("Audio callback failed: %s", exc)
+        finally:
+            ring.release()
+            AUDIO_ANALYSIS.observe(time.perf_counter() - started)
+
+
+def start_listening(
+    callback: ChunkCallback,
+    device_index: int | None = None,
+    stream_id: str | None = None,
+    source: AudioSource | None = None,
+) -> None:
     """
-    Capture microphone audio and feed chunks to callback.
+    Capture audio from `source` (default: AUDIO_SOURCE, the microphone at
+    input `device_index`) and feed chunks to callback.
 
-    This runs a blocking loop. Call from a background thread.
+    This runs a blocking capture loop. Call from a background thread.
+    The callback runs on a separate analysis thread fed through a ring buffer,
+    so slow analysis never stalls a live capture; non-live sources (file
+    replay, synthetic audio) wait for it instead so no audio is skipped. The chunk passed to the callback is
+    a view into the ring and is only valid for the duration of the call; the
+    second argument is the epoch time the chunk was read from the source.
     """
-    try:
-        import pyaudio  # type: ignore
-    except Exception as exc:
-        raise RuntimeError("PyAudio is required for microphone capture") from exc
-
-    chunk_frames = int(settings.audio_sample_rate * settings.audio_chunk_seconds)
-    if chunk_frames <= 0:
-        raise ValueError("AUDIO_CHUNK_SECONDS must be > 0")
-
-    audio = pyaudio.PyAudio()
-    stream = audio.open(
-        format=pyaudio.paInt16,
-        channels=settings.audio_channels,
-        rate=settings.audio_sample_rate,
-        input=True,
-        frames_per_buffer=chunk_frames,
-    )
+    stream_id = stream_id or settings.audio_stream_ids[0]
+    if source is None:
+        source = open_source(device_index=device_index)
+
+    slots = max(2, math.ceil(settings.audio_ring_seconds / settings.audio_chunk_seconds))
+    ring = PcmRingBuffer(slots, source.chunk_bytes)
+    _RINGS[stream_id] = ring
+    source.on_overflow = ring.note_overflow
 
-    logger.info("Audio listener started: %s Hz, %s ch", settings.audio_sample_rate, settings.audio_channels)
+    worker = Thread(target=_analysis_worker, args=(ring, callback), name=f"analysis-{stream_id}", daemon=True)
+    worker.start()
+
+    logger.info(
+        "Audio listener %r started: %s, %s Hz, %s ch, %s ring slots",
+        stream_id,
+        source.describe(),
+        source.sample_rate,
+        source.channels,
+        slots,
+    )
+    chunks = source.chunks()
     try:
         while True:
-            try:
-                data = stream.read(chunk_frames, exception_on_overflow=False)
-            except Exception as exc:
-                logger.warning("Audio read failed: %s", exc)
-                time.sleep(0.05)
-                continue
-            if not data:
-                time.sleep(0.01)
-                continue
-            try:
-                callback(data)
-            except Exception as exc:
-                logger.error("Audio callback failed: %s", exc)
-                time.sleep(0.05)
+            started = time.perf_counter()
+            data = next(chunks, None)
+            if data is None:
+                break
+            captured_at = time.time()
+            AUDIO_READ.observe(time.perf_counter() - started)
+            # Replayed and synthetic audio wait for analysis instead of being dropped.
+            if not ring.write(data, captured_at, block=not source.live) and ring.dropped % 100 == 1:
+                logger.warning("Audio analysis of %r is behind; %s chunks dropped so far", stream_id, ring.dropped)
     finally:
-        stream.stop_stream()
-        stream.close()
-        audio.terminate()
+        ring.close()
+        source.close()
@@ -0,0 +1,141 @@
+"""
+backend/audio/ring.py
+
+Preallocated ring buffer of PCM chunks between the capture thread and the
+analysis worker.
+
+One writer (capture) and one reader (analysis). The lock only guards the
+sequence counters; sample data is copied into a slot before the slot is
+published, and the reader gets a memoryview of the slot instead of a copy.
+When the reader falls behind and every slot is full, the incoming chunk is
+dropped and counted so live capture never waits on analysis. Writers that
+are not bound to real time (file replay, synthetic audio) pass block=True
+and wait for a free slot instead.
+
+Each slot also keeps the wall-clock time its chunk was captured, so
+latency can be measured from capture onwards.
+"""
+
+from __future__ import annotations
+
+from threading import Condition
+
+
+class PcmRingBuffer:
+    def __init__(self, slots: int, slot_bytes: int) -> None:
+        if slots <= 0:
+            raise ValueError("slots must be > 0")
+        if slot_bytes <= 0:
+            raise ValueError("slot_bytes must be > 0")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._buffer = bytearray(slots * slot_bytes)
+        self._view = memoryview(self._buffer)
+        self._lengths = [0] * slots
+        self._captured_at = [0.0] * slots
+        self._cond = Condition()
+        self._write_seq = 0
+        self._read_seq = 0
+        self._reading = False
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.overflowed = 0
+        self.truncated = 0
+
+    def write(self, data: bytes | bytearray | memoryview, captured_at: float = 0.0, block: bool = False) -> bool:
+        """
+        Copy a chunk into the next free slot. Returns False if it was dropped
+        (or, with block=True, the ring was closed while waiting).
+
+        `captured_at` is the epoch time the chunk was read from the device.
+        """
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: self._write_seq - self._read_seq < self.slots or self._closed)
+                if self._closed:
+                    return False
+            elif self._write_seq - self._read_seq >= self.slots:
+                self.dropped += 1
+                return False
+            index = self._write_seq % self.slots
+
+        size = len(data)
+        if size > self.slot_bytes:
+            size = self.slot_bytes
+            self.truncated += 1
+        start = index * self.slot_bytes
+        self._view[start : start + size] = data[:size]
+        self._lengths[index] = size
+        self._captured_at[index] = captured_at
+
+        with self._cond:
+            self._write_seq += 1
+            self.written += 1
+            self._cond.notify()
+        return True
+
+    def read(self, timeout: float | None = None) -> memoryview | None:
+        """
+        Return a view of the oldest unread chunk, or None on timeout/close.
+
+        The view stays valid until release() is called; do not keep it after.
+        """
+        with self._cond:
+            if self._reading:
+                raise RuntimeError("previous chunk was not released")
+            if not self._cond.wait_for(
+                lambda: self._write_seq > self._read_seq or self._closed, timeout
+            ):
+                return None
+            if self._write_seq == self._read_seq:
+                return None
+            self._reading = True
+            index = self._read_seq % self.slots
+
+        start = index * self.slot_bytes
+        return self._view[start : start + self._lengths[index]]
+
+    def captured_at(self) -> float:
+        """
+        Capture time of the chunk returned by the last read().
+        """
+        return self._captured_at[self._read_seq % self.slots]
+
+    def release(self) -> None:
+        with self._cond:
+            if not self._reading:
+                return
+            self._reading = False
+            self._read_seq += 1
+            # Wake a writer blocked on a full ring.
+            self._cond.notify_all()
+
+    def note_overflow(self) -> None:
+        # Only the capture thread touches this counter.
+        self.overflowed += 1
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._write_seq - self._read_seq
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "pending": self._write_seq - self._read_seq,
+                "written": self.written,
+                "dropped": self.dropped,
+                "overflowed": self.overflowed,
+                "truncated": self.truncated,
+            }
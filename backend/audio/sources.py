@@ -0,0 +1,376 @@
+"""
+backend/audio/sources.py
+
+Audio sources: where a stream's PCM chunks come from.
+
+Every source yields native-endian 16-bit PCM chunks of a fixed number of
+frames at AUDIO_SAMPLE_RATE / AUDIO_CHANNELS, the format the detector
+expects. The last chunk of a finite source may be shorter.
+- PyAudioSource:   a live input device (the default, "mic"); input
+                   overflows are counted without dropping the buffer.
+- FileSource:      replays a WAV or raw PCM file, paced at `speed` times
+                   real time (0: as fast as the consumer reads).
+- SyntheticSource: background noise with cry bursts and loud non-cry
+                   bumps on a seeded schedule; `labels` holds the cry
+                   intervals, so detector accuracy can be scored.
+
+open_source() builds one from an AUDIO_SOURCE spec.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+from pathlib import Path
+import queue
+import random
+import time
+from typing import Callable, Iterator
+import wave
+
+from backend.config import settings
+
+
+logger = logging.getLogger("baby_monitor.audio")
+
+
+def _default_chunk_frames() -> int:
+    frames = int(settings.audio_sample_rate * settings.audio_chunk_seconds)
+    if frames <= 0:
+        raise ValueError("AUDIO_CHUNK_SECONDS must be > 0")
+    return frames
+
+
+class AudioSource:
+    """
+    Base class. Subclasses implement chunks(); finite sources stop
+    iterating at the end of the audio.
+    """
+
+    # Live sources produce audio whether or not it is read: the capture loop
+    # drops chunks rather than fall behind. Others wait for the analysis.
+    live = False
+
+    def __init__(self, chunk_frames: int | None = None) -> None:
+        self.chunk_frames = chunk_frames or _default_chunk_frames()
+        self.sample_rate = settings.audio_sample_rate
+        self.channels = settings.audio_channels
+        # Called when the device reports an input overflow.
+        self.on_overflow: Callable[[], None] | None = None
+
+    @property
+    def chunk_bytes(self) -> int:
+        return self.chunk_frames * self.channels * 2
+
+    def chunks(self) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+
+class _Pacer:
+    """
+    Sleeps so that audio is produced at `speed` times real time.
+    """
+
+    def __init__(self, speed: float) -> None:
+        self.speed = speed
+        self._started = time.monotonic()
+
+    def wait(self, audio_seconds: float) -> None:
+        if self.speed <= 0:
+            return
+        delay = self._started + audio_seconds / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class PyAudioSource(AudioSource):
+    """
+    A live input device, opened in callback mode.
+
+    PortAudio hands each filled buffer to _on_audio on its own thread, with
+    status flags; an input overflow (samples PortAudio itself lost) is
+    reported through on_overflow, but the buffer that carried the flag is
+    still delivered. A blocking read with exception_on_overflow=True would
+    discard that whole buffer as well.
+    """
+
+    live = True
+
+    # Buffers waiting for chunks(); the capture loop only copies them into
+    # the ring, so this only fills if that thread is starved.
+    _QUEUE_CHUNKS = 32
+
+    def __init__(self, device_index: int | None = None, chunk_frames: int | None = None) -> None:
+        super().__init__(chunk_frames)
+        self.device_index = device_index
+        try:
+            import pyaudio  # type: ignore
+        except Exception as exc:
+            raise RuntimeError("PyAudio is required for microphone capture") from exc
+        self._pyaudio = pyaudio
+        # (data, overflowed) per captured buffer.
+        self._chunks: queue.Queue[tuple[bytes, bool]] = queue.Queue(maxsize=self._QUEUE_CHUNKS)
+        # Buffers dropped because the queue was full; reported as overflows.
+        self._lost = 0
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.sample_rate,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=self.chunk_frames,
+            stream_callback=self._on_audio,
+        )
+
+    def _on_audio(self, in_data: bytes | None, frame_count: int, time_info: dict, status_flags: int):
+        # PortAudio's thread: hand the buffer over and return at once.
+        overflowed = bool(status_flags & self._pyaudio.paInputOverflow)
+        if in_data:
+            try:
+                self._chunks.put_nowait((in_data, overflowed))
+            except queue.Full:
+                self._lost += 1
+        return None, self._pyaudio.paContinue
+
+    def chunks(self) -> Iterator[bytes]:
+        self._stream.start_stream()
+        lost = 0
+        while True:
+            try:
+                item = self._chunks.get(timeout=1.0)
+            except queue.Empty:
+                if not self._stream.is_active():
+                    logger.warning("Audio input stream stopped")
+                    return
+                continue
+            data, overflowed = item
+            if self.on_overflow is not None:
+                if overflowed:
+                    self.on_overflow()
+                # Counted here so on_overflow always runs on the capture thread.
+                while lost < self._lost:
+                    lost += 1
+                    self.on_overflow()
+            yield data
+
+    def close(self) -> None:
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+    def describe(self) -> str:
+        return f"device {'default' if self.device_index is None else self.device_index}"
+
+
+class FileSource(AudioSource):
+    """
+    Replay a WAV file (16-bit, matching rate and channels) or a headerless
+    .raw/.pcm file of int16 samples at AUDIO_SAMPLE_RATE.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        speed: float = 1.0,
+        loop: bool = False,
+        chunk_frames: int | None = None,
+    ) -> None:
+        super().__init__(chunk_frames)
+        self.path = Path(path)
+        self.speed = speed
+        self.loop = loop
+        self._wav = self.path.suffix.lower() in (".wav", ".wave")
+        if self._wav:
+            with wave.open(str(self.path), "rb") as wav:
+                self._check_format(wav)
+                self.total_frames = wav.getnframes()
+        else:
+            self.total_frames = self.path.stat().st_size // (self.channels * 2)
+
+    def _check_format(self, wav: wave.Wave_read) -> None:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{self.path}: expected 16-bit samples, got {wav.getsampwidth() * 8}-bit")
+        if wav.getnchannels() != self.channels:
+            raise ValueError(f"{self.path}: expected {self.channels} channel(s), got {wav.getnchannels()}")
+        if wav.getframerate() != self.sample_rate:
+            raise ValueError(
+                f"{self.path}: recorded at {wav.getframerate()} Hz, AUDIO_SAMPLE_RATE is {self.sample_rate}"
+            )
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.total_frames / self.sample_rate
+
+    def _read_pass(self) -> Iterator[bytes]:
+        if self._wav:
+            with wave.open(str(self.path), "rb") as wav:
+                while True:
+                    data = wav.readframes(self.chunk_frames)
+                    if not data:
+                        return
+                    yield data
+        else:
+            with self.path.open("rb") as handle:
+                while True:
+                    data = handle.read(self.chunk_bytes)
+                    if not data:
+                        return
+                    yield data
+
+    def chunks(self) -> Iterator[bytes]:
+        pacer = _Pacer(self.speed)
+        frame_bytes = self.channels * 2
+        produced = 0
+        while True:
+            for data in self._read_pass():
+                produced += len(data) // frame_bytes
+                pacer.wait(produced / self.sample_rate)
+                yield data
+            if not self.loop or produced == 0:
+                return
+
+    def describe(self) -> str:
+        pace = f"{self.speed:g}x real time" if self.speed > 0 else "full speed"
+        return f"file {self.path} ({self.duration_seconds:.0f} s, {pace})"
+
+
+class SyntheticSource(AudioSource):
+    """
+    Generated audio: Gaussian background noise, cry bursts (a harmonic tone
+    with a 250-600 Hz fundamental and vibrato) and loud broadband bumps that
+    should not count as crying. Requires NumPy.
+
+    With the defaults, an hour holds about two cries of 20-240 s and six
+    one-second bumps. The schedule depends only on `seed`.
+    """
+
+    def __init__(
+        self,
+        seconds: float = 3600.0,
+        seed: int = 1,
+        speed: float = 0.0,
+        cries_per_hour: float = 2.0,
+        cry_seconds: tuple[float, float] = (20.0, 240.0),
+        bumps_per_hour: float = 6.0,
+        noise_level: float = 0.003,
+        cry_level: float = 0.25,
+        bump_level: float = 0.3,
+        chunk_frames: int | None = None,
+    ) -> None:
+        super().__init__(chunk_frames)
+        try:
+            import numpy as np  # type: ignore
+        except Exception as exc:
+            raise RuntimeError("NumPy is required for the synthetic audio source") from exc
+        self._np = np
+        self.seconds = seconds
+        self.seed = seed
+        self.speed = speed
+        self.noise_level = noise_level
+        self.cry_level = cry_level
+        self.bump_level = bump_level
+        rng = random.Random(seed)
+        self.labels = self._schedule(rng, cries_per_hour, cry_seconds)
+        self.bumps = self._schedule(rng, bumps_per_hour, (0.5, 1.5))
+        # Cry pitch per episode, so cries differ like real ones.
+        self._cry_f0 = [rng.uniform(350.0, 500.0) for _ in self.labels]
+
+    def _schedule(
+        self, rng: random.Random, per_hour: float, duration: tuple[float, float]
+    ) -> list[tuple[float, float]]:
+        """
+        Non-overlapping (start, end) seconds from a Poisson process.
+        """
+        events: list[tuple[float, float]] = []
+        if per_hour <= 0:
+            return events
+        t = 0.0
+        while True:
+            t += rng.expovariate(per_hour / 3600.0)
+            length = rng.uniform(*duration)
+            if t + length >= self.seconds:
+                return events
+            events.append((t, t + length))
+            t += length
+
+    def _render(self, first_frame: int, frames: int):
+        np = self._np
+        rate = self.sample_rate
+        start = first_frame / rate
+        end = (first_frame + frames) / rate
+        rng = np.random.default_rng((self.seed, first_frame))
+        signal = rng.normal(0.0, self.noise_level, frames)
+
+        for (cry_start, cry_end), f0 in zip(self.labels, self._cry_f0):
+            if cry_end <= start or cry_start >= end:
+                continue
+            lo = max(0, int(math.ceil((cry_start - start) * rate)))
+            hi = min(frames, int(math.ceil((cry_end - start) * rate)))
+            t = (first_frame + np.arange(lo, hi)) / rate
+            # Closed-form phase of f0 * (1 + 0.05 sin(2 pi 3 t)): continuous across chunks.
+            phase = 2 * np.pi * f0 * (t - 0.05 / (2 * np.pi * 3.0) * np.cos(2 * np.pi * 3.0 * t))
+            tone = sum((1.0 / k) * np.sin(k * phase) for k in range(1, 8))
+            signal[lo:hi] += self.cry_level * 0.4 * tone
+
+        for bump_start, bump_end in self.bumps:
+            if bump_end <= start or bump_start >= end:
+                continue
+            lo = max(0, int(math.ceil((bump_start - start) * rate)))
+            hi = min(frames, int(math.ceil((bump_end - start) * rate)))
+            signal[lo:hi] += rng.normal(0.0, self.bump_level, hi - lo)
+
+        pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype(np.int16)
+        if self.channels > 1:
+            pcm = np.repeat(pcm, self.channels)
+        return pcm.tobytes()
+
+    def chunks(self) -> Iterator[bytes]:
+        pacer = _Pacer(self.speed)
+        total = int(self.seconds * self.sample_rate)
+        frame = 0
+        while frame < total:
+            frames = min(self.chunk_frames, total - frame)
+            data = self._render(frame, frames)
+            frame += frames
+            pacer.wait(frame / self.sample_rate)
+            yield data
+
+    def is_crying_at(self, seconds: float) -> bool:
+        return any(start <= seconds < end for start, end in self.labels)
+
+    def describe(self) -> str:
+        return f"synthetic {self.seconds:.0f} s, {len(self.labels)} cries, seed {self.seed}"
+
+
+def open_source(
+    spec: str | None = None,
+    device_index: int | None = None,
+    chunk_frames: int | None = None,
+) -> AudioSource:
+    """
+    Build a source from an AUDIO_SOURCE spec:
+    "mic", "file:<path>" or "synthetic[:<seconds>]".
+    """
+    spec = (spec or settings.audio_source).strip()
+    kind, _, arg = spec.partition(":")
+    kind = kind.lower()
+    if kind == "mic":
+        return PyAudioSource(device_index, chunk_frames=chunk_frames)
+    if kind == "file":
+        if not arg:
+            raise ValueError("AUDIO_SOURCE=file:<path> needs a path")
+        return FileSource(arg, speed=settings.audio_replay_speed, loop=True, chunk_frames=chunk_frames)
+    if kind == "synthetic":
+        seconds = float(arg) if arg else 24 * 3600.0
+        seed = device_index if device_index is not None else 1
+        return SyntheticSource(
+            seconds, seed=seed, speed=settings.audio_replay_speed, chunk_frames=chunk_frames
+        )
+    raise ValueError(f"Unknown AUDIO_SOURCE: {spec!r}")
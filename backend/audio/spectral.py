@@ -0,0 +1,150 @@
+"""
+backend/audio/spectral.py
+
+Streaming spectral features for cry detection (requires NumPy).
+
+Each chunk is cut into Hann-windowed frames (50% overlap, samples carried
+over between chunks). Per frame we compute band energies, the spectral
+centroid and an autocorrelation pitch estimate restricted to the infant
+cry range (250-600 Hz). The per-frame scores are energy-weighted into a
+single cry confidence for the chunk.
+
+Window, band masks, lag ranges and scratch arrays are built once per
+detector and reused for every chunk; NumPy's pocketfft keeps its own plan
+cache for the fixed FFT sizes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np  # type: ignore
+
+
+# (low_hz, high_hz) edges of the reported band energies.
+BANDS_HZ: Tuple[Tuple[float, float], ...] = (
+    (0.0, 250.0),
+    (250.0, 600.0),
+    (600.0, 4000.0),
+    (4000.0, float("inf")),
+)
+
+CRY_F0_MIN_HZ = 250.0
+CRY_F0_MAX_HZ = 600.0
+_CENTROID_MIN_HZ = 400.0
+_CENTROID_MAX_HZ = 3500.0
+_VOICING_FLOOR = 0.3
+
+
+@dataclass(frozen=True)
+class SpectralFeatures:
+    band_energies: Tuple[float, ...]
+    centroid_hz: float
+    f0_hz: float | None
+    periodicity: float
+    confidence: float
+
+
+_SILENT = SpectralFeatures(
+    band_energies=tuple(0.0 for _ in BANDS_HZ),
+    centroid_hz=0.0,
+    f0_hz=None,
+    periodicity=0.0,
+    confidence=0.0,
+)
+
+
+class SpectralCryDetector:
+    """
+    Stateful feature extractor. Use one instance per audio stream.
+    """
+
+    def __init__(self, sample_rate: int, fft_size: int = 2048) -> None:
+        if fft_size <= 0 or fft_size & (fft_size - 1):
+            raise ValueError("fft_size must be a power of two")
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.hop = fft_size // 2
+
+        self._window = np.hanning(fft_size).astype(np.float64)
+        freqs = np.fft.rfftfreq(fft_size, d=1.0 / sample_rate)
+        self._freqs = freqs
+        self._band_masks = [(freqs >= lo) & (freqs < hi) for lo, hi in BANDS_HZ]
+        self._voice_mask = (freqs >= CRY_F0_MIN_HZ) & (freqs < 4000.0)
+
+        # Lags for the pitch search; zero padding to 2N keeps the ACF linear.
+        self._lag_min = max(1, int(sample_rate / CRY_F0_MAX_HZ))
+        self._lag_max = min(fft_size - 1, int(np.ceil(sample_rate / CRY_F0_MIN_HZ)))
+        self._acf_size = 2 * fft_size
+
+        self._carry = np.zeros(0, dtype=np.float64)
+        self._frames = np.zeros((0, fft_size), dtype=np.float64)
+
+    def reset(self) -> None:
+        self._carry = np.zeros(0, dtype=np.float64)
+
+    def _scratch(self, count: int) -> np.ndarray:
+        if self._frames.shape[0] < count:
+            self._frames = np.empty((count, self.fft_size), dtype=np.float64)
+        return self._frames[:count]
+
+    def process(self, audio_chunk: bytes | bytearray | memoryview) -> SpectralFeatures | None:
+        """
+        Feed 16-bit PCM mono audio and return features for the new frames.
+
+        Returns None until enough samples are buffered for a full frame.
+        """
+        count = len(audio_chunk) // 2
+        pcm = np.frombuffer(audio_chunk, dtype=np.int16, count=count)
+        samples = np.concatenate((self._carry, pcm.astype(np.float64) / 32768.0))
+
+        if samples.shape[0] < self.fft_size:
+            self._carry = samples
+            return None
+
+        n_frames = 1 + (samples.shape[0] - self.fft_size) // self.hop
+        consumed = n_frames * self.hop
+        self._carry = samples[consumed:].copy()
+
+        views = np.lib.stride_tricks.sliding_window_view(samples, self.fft_size)[:: self.hop][:n_frames]
+        frames = self._scratch(n_frames)
+        np.multiply(views, self._window, out=frames)
+
+        spectrum = np.fft.rfft(frames, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        frame_energy = power.sum(axis=1)
+        total_energy = float(frame_energy.sum())
+        if total_energy <= 0.0:
+            return _SILENT
+
+        band_energies = tuple(float(power[:, mask].sum()) for mask in self._band_masks)
+        safe_energy = np.where(frame_energy > 0.0, frame_energy, 1.0)
+        centroids = (power @ self._freqs) / safe_energy
+        voice_ratio = power[:, self._voice_mask].sum(axis=1) / safe_energy
+
+        padded = np.fft.rfft(frames, n=self._acf_size, axis=1)
+        acf = np.fft.irfft(padded.real ** 2 + padded.imag ** 2, axis=1)
+        zero_lag = np.where(acf[:, 0] > 0.0, acf[:, 0], 1.0)
+        search = acf[:, self._lag_min : self._lag_max + 1]
+        peak_index = search.argmax(axis=1)
+        periodicity = np.clip(search[np.arange(n_frames), peak_index] / zero_lag, 0.0, 1.0)
+        f0 = self.sample_rate / (peak_index + self._lag_min)
+
+        in_range = (f0 >= CRY_F0_MIN_HZ) & (f0 <= CRY_F0_MAX_HZ) & (periodicity >= _VOICING_FLOOR)
+        centroid_ok = (centroids >= _CENTROID_MIN_HZ) & (centroids <= _CENTROID_MAX_HZ)
+        scores = np.where(in_range & centroid_ok, periodicity * voice_ratio, 0.0)
+        weights = frame_energy / total_energy
+        confidence = float(np.clip((scores * weights).sum(), 0.0, 1.0))
+
+        weighted_periodicity = float((periodicity * weights).sum())
+        best = int(weights.argmax())
+        f0_hz = float(f0[best]) if in_range[best] else None
+
+        return SpectralFeatures(
+            band_energies=band_energies,
+            centroid_hz=float((centroids * weights).sum()),
+            f0_hz=f0_hz,
+            periodicity=weighted_periodicity,
+            confidence=confidence,
+        )
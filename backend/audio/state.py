@@ -1,18 +1,31 @@
 """
 backend/audio/state.py
 
-Global crying state tracker.
+Crying state tracker, one CryStateMachine per audio stream (room).
+
+The module-level functions (update, get_state, snapshot, restore) take a
+stream_id and default to the first configured stream, so single-room
+callers do not need to care.
 """
 
 from __future__ import annotations
 
 from collections import deque
 from dataclasses import dataclass
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
+import logging
+import math
+import struct
 from threading import Lock
 import time
+from typing import Callable, Iterator
 
 from backend.config import settings
+from backend.metrics import STATE_LOCK_HOLD
+
+
+logger = logging.getLogger("baby_monitor.audio")
+
 
 @dataclass(frozen=True)
 class CryMinuteEvent:
@@ -20,6 +33,55 @@ class CryMinuteEvent:
     is_crying: bool
 
 
+def _minute_to_datetime(epoch_minute: int) -> datetime:
+    return datetime.fromtimestamp(epoch_minute * 60, tz=timezone.utc)
+
+
+def _epoch_minute(value: datetime) -> int:
+    return int(value.timestamp() // 60)
+
+
+class CryTimeline:
+    """
+    Immutable view of per-minute cry flags, oldest first, ending with the
+    in-progress minute.
+
+    Completed minutes are one byte each in a shared bytes object keyed by
+    epoch minute; it is only rebuilt on minute rollover, so every state
+    within a minute shares it and a new view costs O(1). `version` changes
+    whenever the content does.
+    """
+
+    __slots__ = ("_completed", "current_minute", "current_is_crying", "version")
+
+    def __init__(self, completed: bytes, current_minute: int, current_is_crying: bool, version: int) -> None:
+        self._completed = completed
+        self.current_minute = current_minute
+        self.current_is_crying = current_is_crying
+        self.version = version
+
+    @property
+    def start_minute(self) -> int:
+        return self.current_minute - len(self._completed)
+
+    def flags(self) -> bytes:
+        """
+        One byte (0/1) per minute from start_minute through current_minute.
+        """
+        return self._completed + (b"\x01" if self.current_is_crying else b"\x00")
+
+    def __len__(self) -> int:
+        return len(self._completed) + 1
+
+    def __iter__(self) -> Iterator[CryMinuteEvent]:
+        start = self.start_minute
+        for offset, flag in enumerate(self._completed):
+            yield CryMinuteEvent(minute_start=_minute_to_datetime(start + offset), is_crying=bool(flag))
+        yield CryMinuteEvent(
+            minute_start=_minute_to_datetime(self.current_minute), is_crying=self.current_is_crying
+        )
+
+
 @dataclass(frozen=True)
 class CryState:
     is_crying: bool
@@ -27,34 +89,112 @@ class CryState:
     current_minute_is_crying: bool
     effective_cry_minutes: int
     consecutive_quiet_minutes: int
-    timeline: list[CryMinuteEvent]
+    timeline: CryTimeline
     last_volume: float
     volume_threshold: float
+    # When a client-visible field last changed (see version).
     last_updated_at: datetime
+    cry_confidence: float | None = None
+    # Increments when a client-visible field changes: the cry flags and
+    # counters, the timeline, the threshold, the session start, or the
+    # volume and confidence at STATUS_VOLUME_DIGITS / STATUS_CONFIDENCE_DIGITS.
+    # Cheap change detection for caches and ETags.
+    version: int = 0
+    # Current cry session: set when crying starts, cleared once it has been
+    # quiet for CRY_SESSION_END_QUIET_SECONDS. last_cry_at is the end of a
+    # finished session.
+    cry_session_started_at: datetime | None = None
+    last_cry_at: datetime | None = None
+    stream_id: str = "default"
+    # Capture time of the session's first crying frame: where onset-to-push
+    # latency is measured from.
+    cry_onset_captured_at: datetime | None = None
+    # Seconds of the current minute the detector reported crying; with
+    # effective_cry_minutes this is the crying that counts towards alerts.
+    current_minute_cry_seconds: float = 0.0
 
 
-_LOCK = Lock()
 _MAX_MINUTES = 480
-_TIMELINE: deque[CryMinuteEvent] = deque(maxlen=_MAX_MINUTES)
-_VOLUME_WINDOW_SECONDS = 2.0
-_VOLUME_SAMPLES: deque[tuple[float, float]] = deque()
+# Precision clients see the smoothed volume and cry confidence at; smaller
+# changes do not bump CryState.version.
+STATUS_VOLUME_DIGITS = 3
+STATUS_CONFIDENCE_DIGITS = 2
+# A frame is credited with at most this much crying time, so a gap between
+# updates (startup, a stalled source) is not counted as crying.
+_MAX_FRAME_SECONDS = 1.0
+_VOLUME_WINDOW_SECONDS = settings.audio_window_seconds
+_ONSET_WINDOW_SECONDS = settings.audio_onset_seconds
+
+
+class _RunningWindow:
+    """
+    Time-based sliding mean with an O(1) running sum per added sample.
+    """
 
+    __slots__ = ("seconds", "_samples", "_total", "_ops")
 
-def _floor_minute(value: datetime) -> datetime:
-    return value.replace(second=0, microsecond=0)
+    # Re-sum from scratch now and then so float drift cannot accumulate.
+    _RESUM_EVERY = 100_000
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self._samples: deque[tuple[float, float]] = deque()
+        self._total = 0.0
+        self._ops = 0
+
+    def add(self, now_ts: float, value: float) -> float:
+        samples = self._samples
+        samples.append((now_ts, value))
+        self._total += value
+        cutoff = now_ts - self.seconds
+        while samples[0][0] < cutoff:
+            self._total -= samples.popleft()[1]
+        self._ops += 1
+        if self._ops >= self._RESUM_EVERY:
+            self._ops = 0
+            self._total = sum(sample[1] for sample in samples)
+        return self._total / len(samples)
+
+    def mean(self) -> float | None:
+        if not self._samples:
+            return None
+        return self._total / len(self._samples)
+
+
+StateListener = Callable[[CryState], None]
+_LISTENERS: list[StateListener] = []
+
+
+def add_listener(listener: StateListener) -> None:
+    """
+    Call listener(state) after every update() of any stream, outside the
+    state lock. state.stream_id tells streams apart.
+
+    Listeners run on the analysis thread and must return quickly.
+    """
+    if listener not in _LISTENERS:
+        _LISTENERS.append(listener)
+
+
+def remove_listener(listener: StateListener) -> None:
+    if listener in _LISTENERS:
+        _LISTENERS.remove(listener)
 
 
-_STATE = CryState(
-    is_crying=False,
-    current_minute_start=_floor_minute(datetime.now(timezone.utc)),
-    current_minute_is_crying=False,
-    effective_cry_minutes=0,
-    consecutive_quiet_minutes=0,
-    timeline=[],
-    last_volume=0.0,
-    volume_threshold=settings.audio_volume_threshold,
-    last_updated_at=datetime.now(timezone.utc),
-)
+def _notify_listeners(state: CryState) -> None:
+    for listener in _LISTENERS:
+        try:
+            listener(state)
+        except Exception as exc:
+            logger.error("State listener %r failed: %s", listener, exc)
+
+
+def _rounded(value: float | None, digits: int) -> float | None:
+    return None if value is None else round(value, digits)
+
+
+def _floor_minute(value: datetime) -> datetime:
+    return value.replace(second=0, microsecond=0)
 
 
 def _now() -> datetime:
@@ -72,85 +212,366 @@ def _apply_minute(
     return effective_cry_minutes, consecutive_quiet_minutes
 
 
-def _append_minute(minute_start: datetime, is_crying: bool) -> None:
-    _TIMELINE.append(CryMinuteEvent(minute_start=minute_start, is_crying=is_crying))
+# version, current epoch minute, current minute crying, effective minutes,
+# quiet streak, session start, last cry (epoch seconds, NaN if unset), then
+# one byte per completed timeline minute.
+_SNAPSHOT_HEADER = struct.Struct("<BqBiidd")
+_SNAPSHOT_VERSION = 1
+
+
+def _ts_or_nan(value: datetime | None) -> float:
+    return value.timestamp() if value is not None else math.nan
 
 
-def _update_volume_window(level: float) -> float:
-    now_ts = time.time()
-    _VOLUME_SAMPLES.append((now_ts, level))
-    cutoff = now_ts - _VOLUME_WINDOW_SECONDS
-    while _VOLUME_SAMPLES and _VOLUME_SAMPLES[0][0] < cutoff:
-        _VOLUME_SAMPLES.popleft()
-    if not _VOLUME_SAMPLES:
-        return 0.0
-    total = sum(sample[1] for sample in _VOLUME_SAMPLES)
-    return total / len(_VOLUME_SAMPLES)
+def _datetime_or_none(value: float) -> datetime | None:
+    return None if math.isnan(value) else datetime.fromtimestamp(value, tz=timezone.utc)
 
 
-def update(is_crying: bool, volume: float | None = None, threshold: float | None = None) -> CryState:
+class CryStateMachine:
     """
-    Update global cry state based on the latest detector output.
+    Cry state for one stream. update() is called from that stream's
+    analysis thread; get_state() from anywhere.
     """
-    global _STATE
-    with _LOCK:
-        now = _now()
-        minute_start = _floor_minute(now)
 
-        effective = _STATE.effective_cry_minutes
-        quiet_streak = _STATE.consecutive_quiet_minutes
-        current_minute_is_crying = _STATE.current_minute_is_crying
+    def __init__(self, stream_id: str, clock: Callable[[], float] | None = None) -> None:
+        self.stream_id = stream_id
+        # Epoch seconds; replays inject the audio's own timeline here.
+        self._clock = clock
+        # Latest capture time passed to update(); only the analysis thread touches it.
+        self._last_captured_at = 0.0
+        # Epoch time of the previous update(), for the crying time it covers.
+        self._last_update_ts: float | None = None
+        self._lock = Lock()
+        # Completed minutes (the in-progress minute is kept on the state itself).
+        self._timeline = b""
+        self._timeline_version = 0
+        # Slow windows smooth the reported level and hold a cry through short
+        # pauses; fast windows let an onset register within a few frames.
+        self._volume_slow = _RunningWindow(_VOLUME_WINDOW_SECONDS)
+        self._volume_fast = _RunningWindow(_ONSET_WINDOW_SECONDS)
+        self._confidence_slow = _RunningWindow(_VOLUME_WINDOW_SECONDS)
+        self._confidence_fast = _RunningWindow(_ONSET_WINDOW_SECONDS)
+        started_at = self._now()
+        start_minute = _floor_minute(started_at)
+        self._state = CryState(
+            is_crying=False,
+            current_minute_start=start_minute,
+            current_minute_is_crying=False,
+            effective_cry_minutes=0,
+            consecutive_quiet_minutes=0,
+            timeline=CryTimeline(self._timeline, _epoch_minute(start_minute), False, 0),
+            last_volume=0.0,
+            volume_threshold=settings.audio_volume_threshold,
+            last_updated_at=started_at,
+            stream_id=stream_id,
+        )
 
-        new_minute = minute_start != _STATE.current_minute_start
-        if new_minute:
-            prev_minute = _STATE.current_minute_start
-            _append_minute(prev_minute, current_minute_is_crying)
-            effective, quiet_streak = _apply_minute(
-                current_minute_is_crying, effective, quiet_streak
+    def _now(self) -> datetime:
+        if self._clock is None:
+            return _now()
+        return datetime.fromtimestamp(self._clock(), tz=timezone.utc)
+
+    def _roll_timeline(self, prev_is_crying: bool, gap_minutes: int) -> None:
+        # Once a minute: append the finished minute plus any quiet gap minutes.
+        keep = _MAX_MINUTES - 1
+        appended = (b"\x01" if prev_is_crying else b"\x00") + bytes(min(max(gap_minutes, 0), keep))
+        self._timeline = (self._timeline + appended)[-keep:]
+
+    def _rollover(
+        self,
+        prev_minute: datetime,
+        prev_is_crying: bool,
+        effective: int,
+        quiet_streak: int,
+        minute_start: datetime,
+    ) -> tuple[int, int]:
+        """
+        Close `prev_minute` and count the minutes up to `minute_start` as quiet.
+        """
+        effective, quiet_streak = _apply_minute(prev_is_crying, effective, quiet_streak)
+        gap_minutes = int((minute_start - prev_minute).total_seconds() // 60) - 1
+        self._roll_timeline(prev_is_crying, gap_minutes)
+        # Two quiet minutes already reset the counter; later ones only extend the streak.
+        for _ in range(min(gap_minutes, 2)):
+            effective, quiet_streak = _apply_minute(False, effective, quiet_streak)
+        if gap_minutes > 2:
+            quiet_streak += gap_minutes - 2
+        return effective, quiet_streak
+
+    def update(
+        self,
+        is_crying: bool,
+        volume: float | None = None,
+        threshold: float | None = None,
+        confidence: float | None = None,
+        captured_at: float | None = None,
+    ) -> CryState:
+        """
+        Update the cry state based on the latest detector output.
+
+        Call once per detector frame. Crying starts as soon as the short onset
+        window is over the threshold and holds while the long window is. When
+        the detector reports a spectral cry confidence, it must also reach
+        AUDIO_CRY_CONFIDENCE_THRESHOLD; loud but non-cry sounds (doors, vacuum
+        cleaners) then do not count as crying.
+
+        `captured_at` is the epoch time the frame's audio was captured. When
+        given, the frame is placed at that time rather than when it is
+        processed, so a backlog analysed in a burst after a stall keeps its
+        real spacing in the onset and slow windows.
+        """
+        if captured_at is not None:
+            # Never step back: frame times estimated from chunk capture times may overlap slightly.
+            now_ts = max(captured_at, self._last_captured_at)
+            self._last_captured_at = now_ts
+            now = datetime.fromtimestamp(now_ts, tz=timezone.utc)
+        elif self._clock is None:
+            now, now_ts = _now(), time.time()
+        else:
+            now_ts = self._clock()
+            now = datetime.fromtimestamp(now_ts, tz=timezone.utc)
+        minute_start = _floor_minute(now)
+        with self._lock:
+            held_at = time.perf_counter()
+            prev = self._state
+            effective = prev.effective_cry_minutes
+            quiet_streak = prev.consecutive_quiet_minutes
+            current_minute_is_crying = prev.current_minute_is_crying
+
+            new_minute = minute_start != prev.current_minute_start
+            if new_minute:
+                effective, quiet_streak = self._rollover(
+                    prev.current_minute_start, current_minute_is_crying, effective, quiet_streak, minute_start
+                )
+                current_minute_is_crying = False
+
+            window_level = prev.last_volume
+            if volume is not None:
+                self._volume_fast.add(now_ts, float(volume))
+                window_level = self._volume_slow.add(now_ts, float(volume))
+
+            window_confidence = prev.cry_confidence
+            if confidence is not None:
+                self._confidence_fast.add(now_ts, float(confidence))
+                window_confidence = self._confidence_slow.add(now_ts, float(confidence))
+
+            threshold_value = prev.volume_threshold if threshold is None else float(threshold)
+            onset_level = self._volume_fast.mean()
+            is_crying_effective = window_level >= threshold_value or (
+                onset_level is not None and onset_level >= threshold_value
+            )
+            if window_confidence is not None:
+                confidence_cutoff = settings.audio_cry_confidence_threshold
+                onset_confidence = self._confidence_fast.mean()
+                is_crying_effective = is_crying_effective and (
+                    window_confidence >= confidence_cutoff
+                    or (onset_confidence is not None and onset_confidence >= confidence_cutoff)
+                )
+
+            session_started_at = prev.cry_session_started_at
+            onset_captured_at = prev.cry_onset_captured_at
+            last_cry_at = prev.last_cry_at
+            if is_crying_effective:
+                last_cry_at = now
+                if session_started_at is None:
+                    session_started_at = now
+                    onset_captured_at = now
+            elif (
+                session_started_at is not None
+                and last_cry_at is not None
+                and (now - last_cry_at).total_seconds() >= settings.cry_session_end_quiet_seconds
+            ):
+                session_started_at = None
+                onset_captured_at = None
+
+            if new_minute:
+                current_minute_is_crying = is_crying_effective
+                cry_seconds = 0.0
+            else:
+                current_minute_is_crying = current_minute_is_crying or is_crying_effective
+                cry_seconds = prev.current_minute_cry_seconds
+            if is_crying_effective and self._last_update_ts is not None:
+                cry_seconds += min(max(now_ts - self._last_update_ts, 0.0), _MAX_FRAME_SECONDS)
+            self._last_update_ts = now_ts
+
+            timeline = prev.timeline
+            if new_minute or current_minute_is_crying != timeline.current_is_crying:
+                self._timeline_version += 1
+                timeline = CryTimeline(
+                    self._timeline, _epoch_minute(minute_start), current_minute_is_crying, self._timeline_version
+                )
+
+            changed = (
+                is_crying_effective != prev.is_crying
+                or current_minute_is_crying != prev.current_minute_is_crying
+                or effective != prev.effective_cry_minutes
+                or quiet_streak != prev.consecutive_quiet_minutes
+                or timeline is not prev.timeline
+                or threshold_value != prev.volume_threshold
+                or session_started_at != prev.cry_session_started_at
+                or round(window_level, STATUS_VOLUME_DIGITS) != round(prev.last_volume, STATUS_VOLUME_DIGITS)
+                or _rounded(window_confidence, STATUS_CONFIDENCE_DIGITS)
+                != _rounded(prev.cry_confidence, STATUS_CONFIDENCE_DIGITS)
             )
 
-            gap_minutes = int((minute_start - prev_minute).total_seconds() // 60) - 1
-            for i in range(gap_minutes):
-                gap_start = prev_minute + timedelta(minutes=i + 1)
-                _append_minute(gap_start, False)
-                effective, quiet_streak = _apply_minute(False, effective, quiet_streak)
+            state = CryState(
+                is_crying=is_crying_effective,
+                current_minute_start=minute_start,
+                current_minute_is_crying=current_minute_is_crying,
+                effective_cry_minutes=effective,
+                consecutive_quiet_minutes=quiet_streak,
+                timeline=timeline,
+                last_volume=window_level,
+                volume_threshold=threshold_value,
+                last_updated_at=now if changed else prev.last_updated_at,
+                cry_confidence=window_confidence,
+                version=prev.version + 1 if changed else prev.version,
+                cry_session_started_at=session_started_at,
+                last_cry_at=last_cry_at,
+                stream_id=self.stream_id,
+                cry_onset_captured_at=onset_captured_at,
+                current_minute_cry_seconds=cry_seconds,
+            )
+            self._state = state
+            STATE_LOCK_HOLD.observe(time.perf_counter() - held_at)
+        if _LISTENERS:
+            _notify_listeners(state)
+        return state
+
+    def get_state(self) -> CryState:
+        with self._lock:
+            return self._state
+
+    def snapshot(self) -> bytes:
+        """
+        Compact binary image of the cry-state machine (a few hundred bytes).
+        """
+        with self._lock:
+            state = self._state
+            completed = self._timeline
+        header = _SNAPSHOT_HEADER.pack(
+            _SNAPSHOT_VERSION,
+            _epoch_minute(state.current_minute_start),
+            int(state.current_minute_is_crying),
+            state.effective_cry_minutes,
+            state.consecutive_quiet_minutes,
+            _ts_or_nan(state.cry_session_started_at),
+            _ts_or_nan(state.last_cry_at),
+        )
+        return header + completed
+
+    def restore(self, blob: bytes, now: datetime | None = None) -> CryState | None:
+        """
+        Resume from snapshot(), treating the minutes since it was taken as quiet
+        exactly like update() treats a gap. Returns None for an unusable blob.
+        """
+        if len(blob) < _SNAPSHOT_HEADER.size or blob[0] != _SNAPSHOT_VERSION:
+            return None
+        _version, epoch_minute, minute_crying, effective, quiet_streak, session_ts, last_cry_ts = (
+            _SNAPSHOT_HEADER.unpack_from(blob)
+        )
+        now = now or self._now()
+        minute_start = _floor_minute(now)
+        snapshot_minute = _minute_to_datetime(epoch_minute)
+        if snapshot_minute > minute_start:
+            return None
+
+        session_started_at = _datetime_or_none(session_ts)
+        last_cry_at = _datetime_or_none(last_cry_ts)
+        if session_started_at is not None and (
+            last_cry_at is None
+            or (now - last_cry_at).total_seconds() >= settings.cry_session_end_quiet_seconds
+        ):
+            session_started_at = None
+
+        current_minute_is_crying = bool(minute_crying)
+        with self._lock:
+            self._timeline = bytes(blob[_SNAPSHOT_HEADER.size :])[-(_MAX_MINUTES - 1) :]
+            if snapshot_minute != minute_start:
+                effective, quiet_streak = self._rollover(
+                    snapshot_minute, current_minute_is_crying, effective, quiet_streak, minute_start
+                )
+                current_minute_is_crying = False
+            self._timeline_version += 1
+            state = CryState(
+                is_crying=False,
+                current_minute_start=minute_start,
+                current_minute_is_crying=current_minute_is_crying,
+                effective_cry_minutes=effective,
+                consecutive_quiet_minutes=quiet_streak,
+                timeline=CryTimeline(
+                    self._timeline, _epoch_minute(minute_start), current_minute_is_crying, self._timeline_version
+                ),
+                last_volume=0.0,
+                volume_threshold=self._state.volume_threshold,
+                last_updated_at=now,
+                cry_confidence=None,
+                version=self._state.version + 1,
+                cry_session_started_at=session_started_at,
+                last_cry_at=last_cry_at,
+                stream_id=self.stream_id,
+                # The capture time is not snapshotted; the session start is the closest known.
+                cry_onset_captured_at=session_started_at,
+            )
+            self._state = state
+        return state
 
-            current_minute_is_crying = False
 
-        window_level = _STATE.last_volume
-        if volume is not None:
-            window_level = _update_volume_window(float(volume))
+_MACHINES: dict[str, CryStateMachine] = {}
+_MACHINES_LOCK = Lock()
 
-        threshold_value = _STATE.volume_threshold if threshold is None else float(threshold)
-        is_crying_effective = window_level >= threshold_value
 
-        if new_minute:
-            current_minute_is_crying = is_crying_effective
-        else:
-            current_minute_is_crying = current_minute_is_crying or is_crying_effective
+def default_stream_id() -> str:
+    return settings.audio_stream_ids[0]
 
-        timeline = list(_TIMELINE)
-        timeline.append(
-            CryMinuteEvent(minute_start=minute_start, is_crying=current_minute_is_crying)
-        )
 
-        _STATE = CryState(
-            is_crying=is_crying_effective,
-            current_minute_start=minute_start,
-            current_minute_is_crying=current_minute_is_crying,
-            effective_cry_minutes=effective,
-            consecutive_quiet_minutes=quiet_streak,
-            timeline=timeline[-_MAX_MINUTES:],
-            last_volume=window_level,
-            volume_threshold=threshold_value,
-            last_updated_at=now,
-        )
-        return _STATE
+def machine(stream_id: str | None = None) -> CryStateMachine:
+    """
+    The state machine for `stream_id`, created on first use.
+    """
+    key = stream_id or default_stream_id()
+    found = _MACHINES.get(key)
+    if found is not None:
+        return found
+    with _MACHINES_LOCK:
+        found = _MACHINES.get(key)
+        if found is None:
+            found = _MACHINES[key] = CryStateMachine(key)
+        return found
+
+
+def stream_ids() -> list[str]:
+    """
+    Configured streams first, then any others that have state.
+    """
+    ids = list(settings.audio_stream_ids)
+    ids.extend(key for key in list(_MACHINES) if key not in ids)
+    return ids
+
 
+def update(
+    is_crying: bool,
+    volume: float | None = None,
+    threshold: float | None = None,
+    confidence: float | None = None,
+    stream_id: str | None = None,
+    captured_at: float | None = None,
+) -> CryState:
+    return machine(stream_id).update(
+        is_crying, volume=volume, threshold=threshold, confidence=confidence, captured_at=captured_at
+    )
 
-def get_state() -> CryState:
+
+def get_state(stream_id: str | None = None) -> CryState:
     """
     Read the current cry state.
     """
-    with _LOCK:
-        return _STATE
+    return machine(stream_id).get_state()
+
+
+def snapshot(stream_id: str | None = None) -> bytes:
+    return machine(stream_id).snapshot()
+
+
+def restore(blob: bytes, now: datetime | None = None, stream_id: str | None = None) -> CryState | None:
+    return machine(stream_id).restore(blob, now)
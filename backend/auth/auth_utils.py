@@ -2,24 +2,113 @@
 backend/auth/auth_utils.py
 
 Password hashing and lightweight token helpers.
+
+Password hashes are stored as pbkdf2_sha256$<iterations>$<salt>$<hash>
+(salt and hash in hex), so PASSWORD_HASH_ITERATIONS can change without
+breaking existing hashes. Hashes from before the iteration count was
+stored ("<salt>$<hash>") used 200,000 iterations. The PBKDF2 work itself
+runs in backend.auth.hashing's process pool.
+
+Verified tokens are cached (bounded LRU keyed by the token string) until
+they expire: clients send the same token on every request, so a hit skips
+the HMAC, base64 and JSON work. Only tokens that verified are cached; a
+forged or garbled token always takes the full path. The HMAC key is set up
+once and copied per signature.
 """
 
 from __future__ import annotations
 
 import base64
+from collections import OrderedDict
 import hashlib
 import hmac
 import json
 import os
+from threading import Lock
 import time
 from typing import Any
 
-from flask import Request
+from flask import jsonify, Request, Response
 
+from backend.auth.hashing import PasswordHashBusy, derive
 from backend.config import settings
+from backend.metrics import register_collector
+
+
+_HASH_SCHEME = "pbkdf2_sha256"
+# Iterations of hashes stored without a count.
+_LEGACY_ITERATIONS = 200_000
+
+# Keyed HMAC-SHA256 state; copy() reuses the key pads instead of re-deriving them.
+_SIGNER = hmac.new(settings.jwt_secret.encode("utf-8"), digestmod=hashlib.sha256)
+
+
+def _sign(signing_input: bytes) -> bytes:
+    signer = _SIGNER.copy()
+    signer.update(signing_input)
+    return signer.digest()
+
+
+class _TokenCache:
+    """
+    token -> (payload, exp) for tokens that verified, least recently used first.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max(0, max_size)
+        self._entries: OrderedDict[str, tuple[dict[str, Any], int]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str, now: int) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+        # Callers get their own dict; the cached payload stays as verified.
+        return dict(entry[0])
 
+    def put(self, token: str, payload: dict[str, Any], exp: int) -> None:
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._entries[token] = (dict(payload), exp)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
 
-_HASH_ITERATIONS = 200_000
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_TOKEN_CACHE = _TokenCache(settings.jwt_cache_size)
+
+
+def token_cache_stats() -> dict[str, int]:
+    return _TOKEN_CACHE.stats()
+
+
+def clear_token_cache() -> None:
+    _TOKEN_CACHE.clear()
+
+
+register_collector(
+    "baby_monitor_token_cache_lookups_total",
+    "counter",
+    "Verified-token cache lookups by result.",
+    lambda: [({"result": "hit"}, _TOKEN_CACHE.hits), ({"result": "miss"}, _TOKEN_CACHE.misses)],
+)
 
 
 def _b64url_encode(data: bytes) -> str:
@@ -31,25 +120,67 @@ def _b64url_decode(data: str) -> bytes:
     return base64.urlsafe_b64decode(data + padding)
 
 
+def _parse_hash(stored: str) -> tuple[int, bytes, bytes] | None:
+    """
+    (iterations, salt, hash) of a stored password hash, or None if malformed.
+    """
+    parts = stored.split("$")
+    try:
+        if len(parts) == 4 and parts[0] == _HASH_SCHEME:
+            iterations = int(parts[1])
+            salt_hex, hash_hex = parts[2], parts[3]
+        elif len(parts) == 2:
+            iterations = _LEGACY_ITERATIONS
+            salt_hex, hash_hex = parts
+        else:
+            return None
+        salt, expected = bytes.fromhex(salt_hex), bytes.fromhex(hash_hex)
+    except ValueError:
+        return None
+    if iterations <= 0:
+        return None
+    return iterations, salt, expected
+
+
 def hash_password(password: str) -> str:
     """
-    Hash a password using PBKDF2-HMAC-SHA256.
-    Returns: salt$hash (both hex).
+    Hash a password using PBKDF2-HMAC-SHA256 at PASSWORD_HASH_ITERATIONS.
+    Returns: pbkdf2_sha256$iterations$salt$hash. Raises PasswordHashBusy.
     """
+    iterations = settings.password_hash_iterations
     salt = os.urandom(16)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, _HASH_ITERATIONS)
-    return f"{salt.hex()}${dk.hex()}"
+    dk = derive(password, salt, iterations)
+    return f"{_HASH_SCHEME}${iterations}${salt.hex()}${dk.hex()}"
 
 
 def verify_password(password: str, stored: str) -> bool:
-    try:
-        salt_hex, hash_hex = stored.split("$", 1)
-        salt = bytes.fromhex(salt_hex)
-        expected = bytes.fromhex(hash_hex)
-    except Exception:
+    """
+    Check a password against either stored format. Raises PasswordHashBusy.
+    """
+    parsed = _parse_hash(stored)
+    if parsed is None:
         return False
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, _HASH_ITERATIONS)
-    return hmac.compare_digest(dk, expected)
+    iterations, salt, expected = parsed
+    return hmac.compare_digest(derive(password, salt, iterations), expected)
+
+
+def password_needs_rehash(stored: str) -> bool:
+    """
+    True for legacy hashes and hashes made with a different iteration count.
+    """
+    parsed = _parse_hash(stored)
+    if parsed is None or not stored.startswith(f"{_HASH_SCHEME}$"):
+        return True
+    return parsed[0] != settings.password_hash_iterations
+
+
+def password_busy_response() -> tuple[Response, int]:
+    """
+    503 for an endpoint whose password hashing was turned away (PasswordHashBusy).
+    """
+    response = jsonify({"error": "server busy, retry shortly"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
 
 
 def create_token(payload: dict[str, Any]) -> str:
@@ -63,20 +194,24 @@ def create_token(payload: dict[str, Any]) -> str:
     header_b64 = _b64url_encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode("utf-8"))
     body_b64 = _b64url_encode(json.dumps(body, separators=(",", ":"), sort_keys=True).encode("utf-8"))
     signing_input = f"{header_b64}.{body_b64}".encode("ascii")
-    signature = hmac.new(settings.jwt_secret.encode("utf-8"), signing_input, hashlib.sha256).digest()
-    sig_b64 = _b64url_encode(signature)
+    sig_b64 = _b64url_encode(_sign(signing_input))
     return f"{header_b64}.{body_b64}.{sig_b64}"
 
 
 def verify_token(token: str) -> dict[str, Any] | None:
+    now = int(time.time())
+    cached = _TOKEN_CACHE.get(token, now)
+    if cached is not None:
+        return cached
+
     try:
         header_b64, body_b64, sig_b64 = token.split(".", 2)
-    except ValueError:
+        signing_input = f"{header_b64}.{body_b64}".encode("ascii")
+        signature = sig_b64.encode("ascii")
+    except (ValueError, UnicodeEncodeError):
         return None
 
-    signing_input = f"{header_b64}.{body_b64}".encode("ascii")
-    expected_sig = hmac.new(settings.jwt_secret.encode("utf-8"), signing_input, hashlib.sha256).digest()
-    if not hmac.compare_digest(_b64url_encode(expected_sig), sig_b64):
+    if not hmac.compare_digest(_b64url_encode(_sign(signing_input)).encode("ascii"), signature):
         return None
 
     try:
@@ -84,12 +219,15 @@ def verify_token(token: str) -> dict[str, Any] | None:
     except Exception:
         return None
 
+    if not isinstance(body, dict):
+        return None
     exp = body.get("exp")
     if not isinstance(exp, int):
         return None
-    if exp < int(time.time()):
+    if exp < now:
         return None
 
+    _TOKEN_CACHE.put(token, body, exp)
     return body
 
 
@@ -0,0 +1,167 @@
+"""
+backend/auth/hashing.py
+
+PBKDF2 key derivation off the request threads.
+
+A password hash costs hundreds of milliseconds of CPU on a Pi. Running it
+inline lets a burst of logins (every device re-authenticating after a
+redeploy) take every core the audio analysis and /api/status need. Instead
+derive() hands the work to a small pool of worker processes
+(PASSWORD_HASH_WORKERS) and waits for the result. At most
+PASSWORD_HASH_QUEUE_MAX further calls may wait for a worker; beyond that
+derive() raises PasswordHashBusy at once and the endpoint answers 503.
+
+If worker processes cannot be started, hashing falls back to the calling
+thread (still bounded by the same limit).
+"""
+
+from __future__ import annotations
+
+import atexit
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+import hashlib
+import logging
+from threading import BoundedSemaphore, Lock
+import time
+
+from backend.config import settings
+from backend.metrics import STAGE_SECONDS, register_collector
+
+
+logger = logging.getLogger("baby_monitor.auth")
+
+_HASH_RUN = STAGE_SECONDS.labels("password_hash")
+_HASH_WAIT = STAGE_SECONDS.labels("password_hash_wait")
+
+
+class PasswordHashBusy(Exception):
+    """
+    Too many password hashes are already queued; retry shortly.
+    """
+
+
+def _pbkdf2(password: bytes, salt: bytes, iterations: int) -> tuple[bytes, float]:
+    # Runs in a worker process; returns the key and how long deriving it took.
+    started = time.perf_counter()
+    key = hashlib.pbkdf2_hmac("sha256", password, salt, iterations)
+    return key, time.perf_counter() - started
+
+
+class HashPool:
+    def __init__(self, workers: int, queue_max: int) -> None:
+        self.workers = max(1, workers)
+        self.queue_max = max(0, queue_max)
+        self._slots = BoundedSemaphore(self.workers + self.queue_max)
+        self._executor: ProcessPoolExecutor | None = None
+        self._inline = False
+        self._lock = Lock()
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor | None:
+        with self._lock:
+            if self._executor is None and not self._inline:
+                import multiprocessing
+
+                try:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                except Exception as exc:
+                    logger.warning("Password hashing processes unavailable (%s); hashing inline", exc)
+                    self._inline = True
+                else:
+                    atexit.register(self.stop)
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def derive(self, password: str, salt: bytes, iterations: int) -> bytes:
+        """
+        PBKDF2-HMAC-SHA256 of `password`. Raises PasswordHashBusy when the queue is full.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashBusy("password hashing queue is full")
+        with self._lock:
+            self.pending += 1
+        started = time.perf_counter()
+        try:
+            args = (password.encode("utf-8"), salt, iterations)
+            executor = self._get_executor()
+            if executor is None:
+                key, run_seconds = _pbkdf2(*args)
+            else:
+                try:
+                    key, run_seconds = executor.submit(_pbkdf2, *args).result()
+                except BrokenExecutor:
+                    # A worker died: start a fresh pool next time, finish this one here.
+                    logger.error("Password hashing process died; restarting the pool")
+                    self._reset_executor(executor)
+                    key, run_seconds = _pbkdf2(*args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+        _HASH_RUN.observe(run_seconds)
+        _HASH_WAIT.observe(max(0.0, time.perf_counter() - started - run_seconds))
+        with self._lock:
+            self.completed += 1
+        return key
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+_POOL: HashPool | None = None
+_POOL_LOCK = Lock()
+
+
+def get_hash_pool() -> HashPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = HashPool(settings.password_hash_workers, settings.password_hash_queue_max)
+        return _POOL
+
+
+def derive(password: str, salt: bytes, iterations: int) -> bytes:
+    return get_hash_pool().derive(password, salt, iterations)
+
+
+def _pool_metrics() -> dict[str, int]:
+    return _POOL.metrics() if _POOL is not None else {}
+
+
+register_collector(
+    "baby_monitor_password_hash_pending",
+    "gauge",
+    "Password hashes running or waiting for a worker process.",
+    lambda: [({}, _pool_metrics().get("pending", 0))],
+)
+register_collector(
+    "baby_monitor_password_hashes_total",
+    "counter",
+    "Password hash requests: completed, or rejected because the queue was full.",
+    lambda: [({"result": name}, _pool_metrics().get(name, 0)) for name in ("completed", "rejected")],
+)
@@ -6,10 +6,37 @@ Auth endpoints: login + register.
 
 from __future__ import annotations
 
+import logging
+import sqlite3
+
 from flask import Flask, jsonify, request, Response
 
-from backend.database import query_one, execute
-from backend.auth.auth_utils import hash_password, verify_password, create_token
+from backend.database import execute, query_one, transaction
+from backend.auth.auth_utils import (
+    PasswordHashBusy,
+    create_token,
+    hash_password,
+    password_busy_response,
+    password_needs_rehash,
+    verify_password,
+)
+from backend.notifications.dispatcher import invalidate_candidates
+
+
+logger = logging.getLogger("baby_monitor.auth")
+
+
+def _upgrade_hash(user_id: int, password: str) -> None:
+    """
+    Re-hash at the configured iteration count after a successful login.
+    """
+    try:
+        execute("UPDATE users SET password_hash = ? WHERE id = ?", (hash_password(password), user_id))
+    except PasswordHashBusy:
+        # Try again at the next login.
+        return
+    except sqlite3.Error as exc:
+        logger.error("Upgrading the password hash of user %s failed: %s", user_id, exc)
 
 
 def register_routes(app: Flask) -> None:
@@ -25,16 +52,23 @@ def register_routes(app: Flask) -> None:
         if existing:
             return jsonify({"error": "user already exists"}), 409
 
-        password_hash = hash_password(str(password))
-        execute(
-            "INSERT INTO users (email, password_hash, is_active) VALUES (?, ?, 1)",
-            (email, password_hash),
-        )
-        row = query_one("SELECT id, email FROM users WHERE email = ?", (email,))
-        if not row:
-            return jsonify({"error": "user creation failed"}), 500
-        token = create_token({"sub": row["id"], "email": row["email"]})
-        return jsonify({"token": token, "user": {"id": row["id"], "email": row["email"]}}), 201
+        try:
+            password_hash = hash_password(str(password))
+        except PasswordHashBusy:
+            return password_busy_response()
+        try:
+            with transaction() as db:
+                cur = db.execute(
+                    "INSERT INTO users (email, password_hash, is_active) VALUES (?, ?, 1)",
+                    (email, password_hash),
+                )
+                user_id = cur.lastrowid
+        except sqlite3.IntegrityError:
+            # Registered concurrently since the check above.
+            return jsonify({"error": "user already exists"}), 409
+        invalidate_candidates()
+        token = create_token({"sub": user_id, "email": email})
+        return jsonify({"token": token, "user": {"id": user_id, "email": email}}), 201
 
     @app.post("/auth/login")
     def login() -> tuple[Response, int]:
@@ -47,8 +81,13 @@ def register_routes(app: Flask) -> None:
         row = query_one("SELECT id, email, password_hash, is_active FROM users WHERE email = ?", (email,))
         if not row or not row["is_active"]:
             return jsonify({"error": "invalid credentials"}), 401
-        if not verify_password(str(password), row["password_hash"]):
-            return jsonify({"error": "invalid credentials"}), 401
+        try:
+            if not verify_password(str(password), row["password_hash"]):
+                return jsonify({"error": "invalid credentials"}), 401
+        except PasswordHashBusy:
+            return password_busy_response()
+        if password_needs_rehash(row["password_hash"]):
+            _upgrade_hash(row["id"], str(password))
 
         token = create_token({"sub": row["id"], "email": row["email"]})
         return jsonify({"token": token, "user": {"id": row["id"], "email": row["email"]}}), 200
@@ -78,6 +78,29 @@ def _env_bool(key: str, default: bool) -> bool:
     raise ValueError(f"Environment variable {key} must be boolean-like, got: {v!r}")
 
 
+def _env_streams(key: str) -> tuple[tuple[str, int | None], ...]:
+    """
+    Parse "nursery:1,twins:3" into (stream_id, input device index) pairs.
+    A stream without ":index" uses the default input device.
+    """
+    v = os.environ.get(key)
+    if not v or not v.strip():
+        return (("default", None),)
+    streams: list[tuple[str, int | None]] = []
+    for item in v.split(","):
+        name, _, device = item.strip().partition(":")
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            streams.append((name, int(device) if device.strip() else None))
+        except ValueError:
+            raise ValueError(f"Environment variable {key} has a bad device index: {item!r}")
+    if len({name for name, _ in streams}) != len(streams):
+        raise ValueError(f"Environment variable {key} repeats a stream id: {v!r}")
+    return tuple(streams) or (("default", None),)
+
+
 @dataclass(frozen=True)
 class Settings:
     # --- App / server ---
@@ -91,34 +114,120 @@ class Settings:
     # In production, set a strong random value in .env
     jwt_secret: str = "dev-change-me"
     jwt_exp_minutes: int = 60 * 24 * 7  # 7 days
+    # Verified tokens kept in memory (LRU) until they expire; 0 disables the cache.
+    jwt_cache_size: int = 1024
+    # PBKDF2-SHA256 cost of new password hashes; existing hashes keep theirs
+    # until the user next logs in.
+    password_hash_iterations: int = 200_000
+    # Hashing runs in this many worker processes; at most queue_max more
+    # requests wait for one, the rest get 503.
+    password_hash_workers: int = 1
+    password_hash_queue_max: int = 8
 
     # --- Database ---
     database_path: str = "data/baby_monitor.sqlite3"
+    # One writer connection plus up to this many pooled read connections (WAL).
+    database_readers: int = 4
+    database_busy_timeout_ms: int = 5000
+    database_mmap_bytes: int = 64 * 1024 * 1024
+    # NORMAL is crash-safe in WAL mode and skips the fsync on every commit.
+    database_synchronous: str = "NORMAL"
+    # Prepared statements kept per connection.
+    database_statement_cache: int = 256
 
     # --- Audio ---
     audio_sample_rate: int = 44100
     audio_channels: int = 1
-    audio_chunk_seconds: float = 0.5
+    # Capture read size. Keep it short: detection cannot react faster than one read.
+    audio_chunk_seconds: float = 0.04
+    # Hop frame the detector classifies; each frame produces one state update.
+    audio_frame_seconds: float = 0.02
+    # Sliding means over detector frames: the long window smooths the level,
+    # the short onset window lets a cry register within ~100 ms.
+    audio_window_seconds: float = 2.0
+    audio_onset_seconds: float = 0.08
+    # Capture buffered ahead of analysis before chunks are dropped.
+    audio_ring_seconds: float = 10.0
 
     # Volume threshold used by a simple detector (can improve later)
     # This is intentionally a tunable knob.
     audio_volume_threshold: float = 0.03
 
+    # Monitored rooms: (stream id, PyAudio input device index or None).
+    # AUDIO_STREAMS="nursery:1,twins:3"; each stream gets its own capture
+    # thread, detector and cry state.
+    audio_streams: tuple[tuple[str, int | None], ...] = (("default", None),)
+    # Run each stream's detector in its own process so N streams use N cores.
+    audio_analysis_processes: bool = False
+    # Start capture at all; off for API-only instances and benchmarks.
+    audio_enabled: bool = True
+    # Where audio comes from: "mic" (PyAudio), "file:<path>" (WAV or raw
+    # int16 PCM replay) or "synthetic" (generated noise with cry bursts).
+    audio_source: str = "mic"
+    # Replay speed of file/synthetic sources: 1.0 is real time, 0 as fast as possible.
+    audio_replay_speed: float = 1.0
+
+    # RMS compute backend: auto | numpy | audioop | array
+    audio_rms_backend: str = "auto"
+
+    # Spectral cry stage (needs NumPy). Loud audio only counts as crying when
+    # its cry confidence (pitch 250-600 Hz, voiced, speech-band energy) is high enough.
+    audio_spectral_enabled: bool = True
+    audio_fft_size: int = 2048
+    audio_cry_confidence_threshold: float = 0.4
+
+    # A cry session (cry_events row) ends after this long without crying.
+    cry_session_end_quiet_seconds: float = 60.0
+    # Cry state is snapshotted this often (0 = only at exit) and restored at startup.
+    state_snapshot_seconds: float = 10.0
+
+    # --- Volume history ---
+    # Samples are buffered in memory and written in one transaction per flush.
+    volume_flush_seconds: float = 10.0
+    volume_flush_max_rows: int = 300
+    volume_queue_max_rows: int = 3600
+    # Retention of raw samples and of the 10 s / 1 min / 1 h rollups.
+    volume_retention_raw_hours: int = 48
+    volume_retention_10s_days: int = 14
+    volume_retention_1m_days: int = 90
+    volume_retention_1h_days: int = 730
+    volume_retention_interval_seconds: int = 3600
+
     # --- Notification behavior ---
     # Prevent spamming a user repeatedly while the baby is continuously crying.
     notify_cooldown_seconds: int = 60
+    # Alerts are written to notification_outbox and delivered by a drainer.
+    outbox_poll_seconds: float = 5.0
+    outbox_batch_size: int = 100
+    outbox_max_attempts: int = 10
+    outbox_max_age_seconds: float = 1800.0
+    outbox_retention_days: int = 7
 
     # --- Firebase Push Notifications ---
     # For FCM HTTP v1 you typically use a service account; for legacy you use a server key.
     # We'll support a simple server-key approach first.
     fcm_enabled: bool = False
     fcm_server_key: str | None = None
+    # Overridable so a local stub server can stand in for FCM.
+    fcm_endpoint: str = "https://fcm.googleapis.com/fcm/send"
+    # Pushes are sent by a small worker pool over keep-alive connections.
+    push_workers: int = 4
+    push_queue_max: int = 1000
+    push_timeout_seconds: float = 10.0
+    # Transient failures are retried with exponential backoff and full jitter.
+    push_max_attempts: int = 4
+    push_backoff_seconds: float = 0.5
+    push_backoff_max_seconds: float = 30.0
 
     # --- Misc ---
     # If true, the server can serve the static web folder.
     serve_web: bool = True
     web_dir: str = "web"
 
+    @property
+    def audio_stream_ids(self) -> tuple[str, ...]:
+        return tuple(name for name, _device in self.audio_streams)
+
 
 def load_settings() -> Settings:
     """
@@ -146,22 +255,69 @@ def load_settings() -> Settings:
         # Security
         jwt_secret=_env("JWT_SECRET", "dev-change-me") or "dev-change-me",
         jwt_exp_minutes=_env_int("JWT_EXP_MINUTES", 60 * 24 * 7),
+        jwt_cache_size=_env_int("JWT_CACHE_SIZE", 1024),
+        password_hash_iterations=_env_int("PASSWORD_HASH_ITERATIONS", 200_000),
+        password_hash_workers=_env_int("PASSWORD_HASH_WORKERS", 1),
+        password_hash_queue_max=_env_int("PASSWORD_HASH_QUEUE_MAX", 8),
 
         # DB
         database_path=_env("DATABASE_PATH", "data/baby_monitor.sqlite3") or "data/baby_monitor.sqlite3",
+        database_readers=_env_int("DATABASE_READERS", 4),
+        database_busy_timeout_ms=_env_int("DATABASE_BUSY_TIMEOUT_MS", 5000),
+        database_mmap_bytes=_env_int("DATABASE_MMAP_BYTES", 64 * 1024 * 1024),
+        database_synchronous=(_env("DATABASE_SYNCHRONOUS", "NORMAL") or "NORMAL").upper(),
+        database_statement_cache=_env_int("DATABASE_STATEMENT_CACHE", 256),
 
         # Audio
         audio_sample_rate=_env_int("AUDIO_SAMPLE_RATE", 44100),
         audio_channels=_env_int("AUDIO_CHANNELS", 1),
-        audio_chunk_seconds=_env_float("AUDIO_CHUNK_SECONDS", 0.5),
+        audio_chunk_seconds=_env_float("AUDIO_CHUNK_SECONDS", 0.04),
+        audio_frame_seconds=_env_float("AUDIO_FRAME_SECONDS", 0.02),
+        audio_window_seconds=_env_float("AUDIO_WINDOW_SECONDS", 2.0),
+        audio_onset_seconds=_env_float("AUDIO_ONSET_SECONDS", 0.08),
+        audio_ring_seconds=_env_float("AUDIO_RING_SECONDS", 10.0),
         audio_volume_threshold=_env_float("AUDIO_VOLUME_THRESHOLD", 0.01),
+        audio_streams=_env_streams("AUDIO_STREAMS"),
+        audio_analysis_processes=_env_bool("AUDIO_ANALYSIS_PROCESSES", False),
+        audio_enabled=_env_bool("AUDIO_ENABLED", True),
+        audio_source=_env("AUDIO_SOURCE", "mic") or "mic",
+        audio_replay_speed=_env_float("AUDIO_REPLAY_SPEED", 1.0),
+        audio_rms_backend=_env("AUDIO_RMS_BACKEND", "auto") or "auto",
+        audio_spectral_enabled=_env_bool("AUDIO_SPECTRAL_ENABLED", True),
+        audio_fft_size=_env_int("AUDIO_FFT_SIZE", 2048),
+        audio_cry_confidence_threshold=_env_float("AUDIO_CRY_CONFIDENCE_THRESHOLD", 0.4),
+        cry_session_end_quiet_seconds=_env_float("CRY_SESSION_END_QUIET_SECONDS", 60.0),
+        state_snapshot_seconds=_env_float("STATE_SNAPSHOT_SECONDS", 10.0),
+
+        # Volume history
+        volume_flush_seconds=_env_float("VOLUME_FLUSH_SECONDS", 10.0),
+        volume_flush_max_rows=_env_int("VOLUME_FLUSH_MAX_ROWS", 300),
+        volume_queue_max_rows=_env_int("VOLUME_QUEUE_MAX_ROWS", 3600),
+        volume_retention_raw_hours=_env_int("VOLUME_RETENTION_RAW_HOURS", 48),
+        volume_retention_10s_days=_env_int("VOLUME_RETENTION_10S_DAYS", 14),
+        volume_retention_1m_days=_env_int("VOLUME_RETENTION_1M_DAYS", 90),
+        volume_retention_1h_days=_env_int("VOLUME_RETENTION_1H_DAYS", 730),
+        volume_retention_interval_seconds=_env_int("VOLUME_RETENTION_INTERVAL_SECONDS", 3600),
 
         # Notifications
         notify_cooldown_seconds=_env_int("NOTIFY_COOLDOWN_SECONDS", 60),
+        outbox_poll_seconds=_env_float("OUTBOX_POLL_SECONDS", 5.0),
+        outbox_batch_size=_env_int("OUTBOX_BATCH_SIZE", 100),
+        outbox_max_attempts=_env_int("OUTBOX_MAX_ATTEMPTS", 10),
+        outbox_max_age_seconds=_env_float("OUTBOX_MAX_AGE_SECONDS", 1800.0),
+        outbox_retention_days=_env_int("OUTBOX_RETENTION_DAYS", 7),
 
         # FCM
         fcm_enabled=_env_bool("FCM_ENABLED", False),
         fcm_server_key=_env("FCM_SERVER_KEY", None),
+        fcm_endpoint=_env("FCM_ENDPOINT", "https://fcm.googleapis.com/fcm/send")
+        or "https://fcm.googleapis.com/fcm/send",
+        push_workers=_env_int("PUSH_WORKERS", 4),
+        push_queue_max=_env_int("PUSH_QUEUE_MAX", 1000),
+        push_timeout_seconds=_env_float("PUSH_TIMEOUT_SECONDS", 10.0),
+        push_max_attempts=_env_int("PUSH_MAX_ATTEMPTS", 4),
+        push_backoff_seconds=_env_float("PUSH_BACKOFF_SECONDS", 0.5),
+        push_backoff_max_seconds=_env_float("PUSH_BACKOFF_MAX_SECONDS", 30.0),
 
         # Web
         serve_web=_env_bool("SERVE_WEB", True),
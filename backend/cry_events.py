@@ -0,0 +1,280 @@
+"""
+backend/cry_events.py
+
+Cry session history: cry_events rows and the cry_daily aggregate.
+
+A state listener watches CryState.cry_session_started_at of every audio
+stream, with one recorder per stream. When a session
+starts it inserts an open cry_events row. When the session ends it closes
+that row and folds the session into cry_daily (per stream and UTC day of
+the start: session count, seconds cried, longest session) in the same
+transaction. The listener runs on the analysis thread, so both writes are
+handed to the volume writer's thread; the row id is allocated up front,
+so open_event_id() knows it before the row is written. The outbox
+drainer fills in alert_latency_seconds when the session's first alert is
+delivered.
+History reads use keyset pagination on (started_at, id), so a page costs
+the same at any depth.
+"""
+
+from __future__ import annotations
+
+import base64
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import logging
+from threading import Lock
+
+from backend.audio.state import CryState, add_listener, get_state, stream_ids
+from backend.database import query_all, query_one, transaction
+from backend.volume_writer import get_volume_writer
+
+
+logger = logging.getLogger("baby_monitor.events")
+
+_UPSERT_DAILY_SQL = """
+    INSERT INTO cry_daily (stream_id, day, session_count, cry_seconds, longest_seconds)
+    VALUES (?, ?, 1, ?, ?)
+    ON CONFLICT(stream_id, day) DO UPDATE SET
+        session_count = session_count + 1,
+        cry_seconds = cry_seconds + excluded.cry_seconds,
+        longest_seconds = MAX(longest_seconds, excluded.longest_seconds)
+"""
+
+
+class _SessionRecorder:
+    def __init__(self, stream_id: str) -> None:
+        self.stream_id = stream_id
+        self.started_at: datetime | None = None
+        self.event_id: int | None = None
+
+    def on_state(self, state: CryState) -> None:
+        started_at = state.cry_session_started_at
+        if started_at == self.started_at:
+            return
+        if self.started_at is not None:
+            self._close(state.last_cry_at or self.started_at)
+        if started_at is not None:
+            self._open(started_at)
+
+    def _open(self, started_at: datetime) -> None:
+        self.started_at = started_at
+        self.event_id = None
+        try:
+            self.event_id = _allocate_event_id()
+        except Exception as exc:
+            logger.error("Recording cry session start failed: %s", exc)
+            return
+        get_volume_writer().submit(partial(_insert_session, self.stream_id, self.event_id, started_at))
+
+    def _close(self, ended_at: datetime) -> None:
+        started_at, event_id = self.started_at, self.event_id
+        self.started_at = None
+        self.event_id = None
+        if started_at is None or event_id is None:
+            return
+        close = partial(
+            close_session, stream_id=self.stream_id, event_id=event_id, started_at=started_at, ended_at=ended_at
+        )
+        get_volume_writer().submit(close)
+
+
+# Last cry_events id handed out; ids are allocated here so a session's row
+# id is known before the writer thread inserts it.
+_LAST_EVENT_ID: int | None = None
+_EVENT_ID_LOCK = Lock()
+
+
+def _allocate_event_id() -> int:
+    global _LAST_EVENT_ID
+    with _EVENT_ID_LOCK:
+        if _LAST_EVENT_ID is None:
+            # AUTOINCREMENT never reuses ids, so continue after the highest ever used.
+            row = query_one(
+                """
+                SELECT MAX(
+                    COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'cry_events'), 0),
+                    COALESCE((SELECT MAX(id) FROM cry_events), 0)
+                ) AS n
+                """
+            )
+            _LAST_EVENT_ID = int(row["n"]) if row else 0
+        _LAST_EVENT_ID += 1
+        return _LAST_EVENT_ID
+
+
+def _insert_session(stream_id: str, event_id: int, started_at: datetime, db) -> None:
+    db.execute(
+        "INSERT INTO cry_events (id, stream_id, started_at) VALUES (?, ?, ?)",
+        (event_id, stream_id, started_at.isoformat()),
+    )
+
+
+def close_session(db, stream_id: str, event_id: int, started_at: datetime, ended_at: datetime) -> None:
+    """
+    Close a cry_events row and add it to cry_daily; the caller owns the transaction.
+    """
+    ended_at = max(ended_at, started_at)
+    duration = int(round((ended_at - started_at).total_seconds()))
+    db.execute(
+        "UPDATE cry_events SET ended_at = ?, duration_seconds = ? WHERE id = ?",
+        (ended_at.isoformat(), duration, event_id),
+    )
+    db.execute(_UPSERT_DAILY_SQL, (stream_id, started_at.date().isoformat(), duration, duration))
+
+
+def close_dangling_sessions(keep: dict[str, datetime] | None = None) -> dict[str, int]:
+    """
+    Close sessions left open by a crash, ending them at the last volume
+    sample the same stream recorded during the session (or at their start).
+
+    `keep` maps stream ids to the start of a session a restored state
+    snapshot is still in; those rows are left open and their ids returned.
+    """
+    keep = keep or {}
+    kept: dict[str, int] = {}
+    with transaction() as db:
+        rows = db.execute(
+            """
+            SELECT e.id, e.stream_id, e.started_at,
+                   (SELECT MAX(v.recorded_at) FROM volume_samples v
+                    WHERE v.stream_id = e.stream_id AND v.recorded_at >= e.started_at) AS last_seen_at
+            FROM cry_events e
+            WHERE e.ended_at IS NULL
+            """
+        ).fetchall()
+        for row in rows:
+            started_at = datetime.fromisoformat(row["started_at"])
+            keep_started_at = keep.get(row["stream_id"])
+            # The snapshot stores epoch seconds: allow for float rounding.
+            if keep_started_at is not None and abs((started_at - keep_started_at).total_seconds()) < 0.001:
+                kept[row["stream_id"]] = row["id"]
+                continue
+            ended_at = datetime.fromisoformat(row["last_seen_at"]) if row["last_seen_at"] else started_at
+            close_session(db, row["stream_id"], row["id"], started_at, ended_at)
+    closed = len(rows) - len(kept)
+    if closed:
+        logger.info("Closed %s cry session(s) left open by a restart", closed)
+    return kept
+
+
+_RECORDERS: dict[str, _SessionRecorder] = {}
+
+
+def open_event_id(stream_id: str) -> int | None:
+    """
+    The cry_events row of the stream's session in progress, if any.
+    """
+    recorder = _RECORDERS.get(stream_id)
+    return recorder.event_id if recorder is not None else None
+
+
+def _on_state(state: CryState) -> None:
+    recorder = _RECORDERS.get(state.stream_id)
+    if recorder is None:
+        recorder = _RECORDERS.setdefault(state.stream_id, _SessionRecorder(state.stream_id))
+    recorder.on_state(state)
+
+
+def start() -> None:
+    # A restored state snapshot may still be inside a session: keep its row.
+    open_sessions = {}
+    for stream_id in stream_ids():
+        started_at = get_state(stream_id).cry_session_started_at
+        if started_at is not None:
+            open_sessions[stream_id] = started_at
+    for stream_id, event_id in close_dangling_sessions(open_sessions).items():
+        recorder = _RECORDERS.setdefault(stream_id, _SessionRecorder(stream_id))
+        recorder.started_at = open_sessions[stream_id]
+        recorder.event_id = event_id
+    add_listener(_on_state)
+
+
+def encode_cursor(started_at: str, event_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{started_at}|{event_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """
+    Raises ValueError for a malformed cursor.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    started_at, _, event_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").rpartition("|")
+    if not started_at:
+        raise ValueError("malformed cursor")
+    return started_at, int(event_id)
+
+
+def load_events(
+    limit: int,
+    cursor: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    stream_id: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    Newest-first page of cry sessions (of one stream, or all of them) and
+    the cursor for the next page.
+    """
+    clauses: list[str] = []
+    params: dict = {"limit": limit + 1}
+    if stream_id is not None:
+        clauses.append("stream_id = :stream")
+        params["stream"] = stream_id
+    if cursor is not None:
+        cursor_started, cursor_id = decode_cursor(cursor)
+        # Index-friendly form of (started_at, id) < (:cs, :cid).
+        clauses.append("started_at <= :cs AND (started_at < :cs OR id < :cid)")
+        params.update(cs=cursor_started, cid=cursor_id)
+    if since is not None:
+        clauses.append("started_at >= :since")
+        params["since"] = since.astimezone(timezone.utc).isoformat()
+    if until is not None:
+        clauses.append("started_at < :until")
+        params["until"] = until.astimezone(timezone.utc).isoformat()
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = query_all(
+        f"""
+        SELECT id, stream_id, started_at, ended_at, duration_seconds, alert_latency_seconds
+        FROM cry_events
+        {where}
+        ORDER BY started_at DESC, id DESC
+        LIMIT :limit
+        """,
+        params,
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["started_at"], rows[-1]["id"])
+    return [dict(row) for row in rows], next_cursor
+
+
+def load_daily(days: int, stream_id: str | None = None) -> list[dict]:
+    """
+    Per-day totals for one stream, or summed over all streams.
+    """
+    first_day = (datetime.now(timezone.utc) - timedelta(days=days - 1)).date().isoformat()
+    if stream_id is not None:
+        rows = query_all(
+            """
+            SELECT day, session_count, cry_seconds, longest_seconds
+            FROM cry_daily
+            WHERE stream_id = ? AND day >= ?
+            ORDER BY day DESC
+            """,
+            (stream_id, first_day),
+        )
+        return [dict(row) for row in rows]
+    rows = query_all(
+        """
+        SELECT day, SUM(session_count) AS session_count, SUM(cry_seconds) AS cry_seconds,
+               MAX(longest_seconds) AS longest_seconds
+        FROM cry_daily
+        WHERE day >= ?
+        GROUP BY day
+        ORDER BY day DESC
+        """,
+        (first_day,),
+    )
+    return [dict(row) for row in rows]
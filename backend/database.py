@@ -2,94 +2,326 @@
 backend/database.py
 
 SQLite helpers for the Baby Monitor backend.
+
+- Reads (query_one, query_all) use the pooled read-only connections: they
+  never commit and never wait for a write.
+- Writes go through the single writer connection. execute/execute_many
+  commit one statement; transaction() groups several statements into one
+  commit (or one rollback on error).
+
+Statements are prepared once and cached per connection. See
+backend/db_pool.py.
 """
 
 from __future__ import annotations
 
+from contextlib import contextmanager
 import sqlite3
-from pathlib import Path
-from typing import Any, Mapping, Sequence
+from threading import Lock
+import time
+from typing import Any, Iterable, Iterator, Mapping, Sequence
 
 from backend.config import settings, ensure_runtime_dirs
+from backend.db_pool import ConnectionPool
+from backend.metrics import DB_READ, DB_WRITE
+
+
+_POOL: ConnectionPool | None = None
+_POOL_LOCK = Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            ensure_runtime_dirs()
+            _POOL = ConnectionPool(
+                settings.database_path,
+                max_readers=settings.database_readers,
+                busy_timeout_ms=settings.database_busy_timeout_ms,
+                mmap_bytes=settings.database_mmap_bytes,
+                synchronous=settings.database_synchronous,
+                statement_cache=settings.database_statement_cache,
+            )
+        return _POOL
 
 
-_CONNECTION: sqlite3.Connection | None = None
+@contextmanager
+def writer() -> Iterator[sqlite3.Connection]:
+    """
+    Hold the writer connection for a block, committing nothing by itself.
+    """
+    with get_pool().writer() as db:
+        yield db
 
 
-def get_db() -> sqlite3.Connection:
-    global _CONNECTION
-    if _CONNECTION is None:
-        ensure_runtime_dirs()
-        db_path = Path(settings.database_path)
-        _CONNECTION = sqlite3.connect(db_path, check_same_thread=False)
-        _CONNECTION.row_factory = sqlite3.Row
-    return _CONNECTION
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Run a block of writes as one transaction on the writer connection.
+
+    Commits when the block exits normally, rolls back if it raises. The
+    time from getting the writer to the commit is recorded as db_write.
+    """
+    with get_pool().writer() as db:
+        started = time.perf_counter()
+        try:
+            with db:
+                yield db
+        finally:
+            DB_WRITE.observe(time.perf_counter() - started)
 
 
 def init_db() -> None:
-    db = get_db()
-    db.executescript(
+    with writer() as db:
+        _create_schema(db)
+
+
+_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_active INTEGER NOT NULL DEFAULT 1,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS notification_settings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        threshold_seconds INTEGER NOT NULL DEFAULT 20,
+        enabled INTEGER NOT NULL DEFAULT 1,
+        cooldown_seconds INTEGER NOT NULL DEFAULT 60,
+        last_notified_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS cry_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        started_at TEXT NOT NULL,
+        ended_at TEXT,
+        duration_seconds INTEGER,
+        stream_id TEXT NOT NULL,
+        alert_latency_seconds REAL
+    );
+
+    CREATE TABLE IF NOT EXISTS cry_daily (
+        stream_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        session_count INTEGER NOT NULL,
+        cry_seconds INTEGER NOT NULL,
+        longest_seconds INTEGER NOT NULL,
+        PRIMARY KEY (stream_id, day)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS state_snapshots (
+        stream_id TEXT PRIMARY KEY,
+        saved_at TEXT NOT NULL,
+        data BLOB NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS volume_samples (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recorded_at TEXT NOT NULL,
+        rms REAL NOT NULL,
+        stream_id TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS volume_rollups (
+        stream_id TEXT NOT NULL,
+        resolution_seconds INTEGER NOT NULL,
+        bucket_start INTEGER NOT NULL,
+        sample_count INTEGER NOT NULL,
+        rms_sum REAL NOT NULL,
+        rms_min REAL NOT NULL,
+        rms_max REAL NOT NULL,
+        PRIMARY KEY (stream_id, resolution_seconds, bucket_start)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        body TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        next_attempt_at TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        delivered_at TEXT,
+        failed_at TEXT,
+        stream_id TEXT NOT NULL,
+        onset_at TEXT,
+        captured_at TEXT,
+        cry_event_id INTEGER,
+        latency_seconds REAL,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS notification_deliveries (
+        outbox_id INTEGER NOT NULL,
+        token TEXT NOT NULL,
+        delivered_at TEXT NOT NULL,
+        PRIMARY KEY (outbox_id, token)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS device_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        token TEXT NOT NULL UNIQUE,
+        platform TEXT,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_seen_at TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+"""
+
+_INDEXES_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_volume_samples_recorded_at
+        ON volume_samples (recorded_at);
+
+    CREATE INDEX IF NOT EXISTS idx_volume_samples_stream_recorded_at
+        ON volume_samples (stream_id, recorded_at);
+
+    CREATE INDEX IF NOT EXISTS idx_cry_events_started_at
+        ON cry_events (started_at);
+
+    CREATE INDEX IF NOT EXISTS idx_cry_events_stream_started_at
+        ON cry_events (stream_id, started_at);
+
+    CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+        ON notification_outbox (next_attempt_at)
+        WHERE delivered_at IS NULL AND failed_at IS NULL;
+"""
+
+# Tables from before multi-stream support whose primary key now includes
+# stream_id: rebuilt by copying rows into the new layout.
+_REBUILT_TABLES = {
+    "volume_rollups": (
+        "resolution_seconds, bucket_start, sample_count, rms_sum, rms_min, rms_max",
+        """
+        CREATE TABLE volume_rollups (
+            stream_id TEXT NOT NULL,
+            resolution_seconds INTEGER NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            sample_count INTEGER NOT NULL,
+            rms_sum REAL NOT NULL,
+            rms_min REAL NOT NULL,
+            rms_max REAL NOT NULL,
+            PRIMARY KEY (stream_id, resolution_seconds, bucket_start)
+        ) WITHOUT ROWID
+        """,
+    ),
+    "cry_daily": (
+        "day, session_count, cry_seconds, longest_seconds",
         """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            is_active INTEGER NOT NULL DEFAULT 1,
-            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-        );
-
-        CREATE TABLE IF NOT EXISTS notification_settings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            threshold_seconds INTEGER NOT NULL DEFAULT 20,
-            enabled INTEGER NOT NULL DEFAULT 1,
-            cooldown_seconds INTEGER NOT NULL DEFAULT 60,
-            last_notified_at TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        );
-
-        CREATE TABLE IF NOT EXISTS cry_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            started_at TEXT NOT NULL,
-            ended_at TEXT,
-            duration_seconds INTEGER
-        );
-
-        CREATE TABLE IF NOT EXISTS volume_samples (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            recorded_at TEXT NOT NULL,
-            rms REAL NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS device_tokens (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            token TEXT NOT NULL UNIQUE,
-            platform TEXT,
-            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            last_seen_at TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        );
+        CREATE TABLE cry_daily (
+            stream_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            session_count INTEGER NOT NULL,
+            cry_seconds INTEGER NOT NULL,
+            longest_seconds INTEGER NOT NULL,
+            PRIMARY KEY (stream_id, day)
+        ) WITHOUT ROWID
+        """,
+    ),
+    "state_snapshots": (
+        "saved_at, data",
         """
-    )
+        CREATE TABLE state_snapshots (
+            stream_id TEXT PRIMARY KEY,
+            saved_at TEXT NOT NULL,
+            data BLOB NOT NULL
+        )
+        """,
+    ),
+}
+
+# Tables that only gained a stream_id column.
+_ALTERED_TABLES = ("cry_events", "volume_samples", "notification_outbox")
+
+
+# Nullable columns added since; older databases get them with ALTER TABLE.
+_ADDED_COLUMNS = (
+    ("cry_events", "alert_latency_seconds", "REAL"),
+    ("notification_outbox", "onset_at", "TEXT"),
+    ("notification_outbox", "captured_at", "TEXT"),
+    ("notification_outbox", "cry_event_id", "INTEGER"),
+    ("notification_outbox", "latency_seconds", "REAL"),
+)
+
+
+def _has_column(db: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in db.execute(f"PRAGMA table_info({table})"))
+
+
+def _migrate_stream_ids(db: sqlite3.Connection) -> None:
+    """
+    Key single-room tables by stream_id; existing rows go to the first
+    configured stream.
+    """
+    stream_id = settings.audio_stream_ids[0]
+    with db:
+        for table in _ALTERED_TABLES:
+            if not _has_column(db, table, "stream_id"):
+                db.execute(f"ALTER TABLE {table} ADD COLUMN stream_id TEXT NOT NULL DEFAULT ''")
+                db.execute(f"UPDATE {table} SET stream_id = ?", (stream_id,))
+        for table, (columns, create_sql) in _REBUILT_TABLES.items():
+            if _has_column(db, table, "stream_id"):
+                continue
+            db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            db.execute(create_sql)
+            db.execute(
+                f"INSERT INTO {table} (stream_id, {columns}) SELECT ?, {columns} FROM {table}_old",
+                (stream_id,),
+            )
+            db.execute(f"DROP TABLE {table}_old")
+
+
+def _add_columns(db: sqlite3.Connection) -> None:
+    with db:
+        for table, column, declaration in _ADDED_COLUMNS:
+            if not _has_column(db, table, column):
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+def _create_schema(db: sqlite3.Connection) -> None:
+    db.executescript(_TABLES_SQL)
+    _migrate_stream_ids(db)
+    _add_columns(db)
+    db.executescript(_INDEXES_SQL)
     db.commit()
 
+    from backend.volume_history import backfill_rollups
+
+    backfill_rollups(db)
+
 
 Params = Sequence[Any] | Mapping[str, Any]
 
 
 def execute(query: str, params: Params = ()) -> sqlite3.Cursor:
-    db = get_db()
-    cur = db.execute(query, params)
-    db.commit()
-    return cur
+    with transaction() as db:
+        return db.execute(query, params)
+
+
+def execute_many(query: str, params_seq: Iterable[Params]) -> sqlite3.Cursor:
+    with transaction() as db:
+        return db.executemany(query, params_seq)
 
 
 def query_one(query: str, params: Params = ()) -> sqlite3.Row | None:
-    cur = execute(query, params)
-    return cur.fetchone()
+    with get_pool().reader() as db:
+        started = time.perf_counter()
+        cur = db.execute(query, params)
+        row = cur.fetchone()
+        cur.close()
+        DB_READ.observe(time.perf_counter() - started)
+    return row
 
 
 def query_all(query: str, params: Params = ()) -> list[sqlite3.Row]:
-    cur = execute(query, params)
-    return list(cur.fetchall())
+    with get_pool().reader() as db:
+        started = time.perf_counter()
+        rows = db.execute(query, params).fetchall()
+        DB_READ.observe(time.perf_counter() - started)
+        return rows
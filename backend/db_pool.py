@@ -0,0 +1,123 @@
+"""
+backend/db_pool.py
+
+SQLite connection pool: one writer, several readers, WAL journal.
+
+In WAL mode readers and the writer never block each other, so dashboard
+reads, the 1 Hz volume writer and the notification path can run at the
+same time. Writes are serialised through a single connection behind a
+lock, since SQLite allows only one writer anyway; this turns "database is
+locked" errors into short waits. Reads borrow a query_only connection from
+a small pool, so concurrent requests run on separate connections (and
+cores) instead of sharing one.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import queue
+import sqlite3
+from threading import Lock, RLock
+from typing import Iterator
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        path: str,
+        max_readers: int = 4,
+        busy_timeout_ms: int = 5000,
+        mmap_bytes: int = 0,
+        synchronous: str = "NORMAL",
+        statement_cache: int = 256,
+    ) -> None:
+        self.path = path
+        self.max_readers = max(1, max_readers)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_bytes = mmap_bytes
+        self.synchronous = synchronous
+        self.statement_cache = statement_cache
+        self._writer: sqlite3.Connection | None = None
+        self._write_lock = RLock()
+        self._readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = Lock()
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        if self.mmap_bytes > 0:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_bytes)}")
+        if read_only:
+            conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = self._connect(read_only=False)
+            # Persistent: set once on the database file.
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._writer = conn
+        return self._writer
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Exclusive use of the writer connection for the duration of the block.
+        """
+        with self._write_lock:
+            yield self._get_writer()
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._reader_lock:
+            if self._reader_count < self.max_readers:
+                self._reader_count += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                with self._write_lock:
+                    # Make sure WAL is on before the first reader opens the file.
+                    self._get_writer()
+                return self._connect(read_only=True)
+            except Exception:
+                with self._reader_lock:
+                    self._reader_count -= 1
+                raise
+        return self._readers.get()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a read-only connection; waits if all readers are busy.
+        """
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._reader_lock:
+            self._reader_count = 0
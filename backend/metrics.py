@@ -0,0 +1,210 @@
+"""
+backend/metrics.py
+
+Low-overhead hot-path metrics, rendered as Prometheus text at /api/metrics.
+
+Histograms have fixed bucket bounds and a preallocated count per bucket,
+so observe() is a bisect, two adds and an increment under a lock: no
+allocation per sample. Labelled histograms create one child per label
+value on first use (stages and routes are a small fixed set). Counters
+that other components already keep (ring buffers, push pool, outbox) are
+read at scrape time through collectors instead of being duplicated.
+
+Timing is done inline so the hot path allocates nothing:
+
+    started = time.perf_counter()
+    ...
+    DETECTOR.observe(time.perf_counter() - started)
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+import math
+from threading import Lock
+from typing import Callable, Iterable
+
+
+# 50 us .. 10 s: audio frames and lock holds at the low end, FCM calls at the top.
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    __slots__ = ("bounds", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.bounds = bounds
+        # One slot per bound plus the +Inf overflow.
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> tuple[list[int], float, int]:
+        """
+        Cumulative bucket counts, sum and count.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = [], 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class HistogramFamily:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: tuple[str, ...],
+        bounds: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.bounds = bounds
+        self._children: dict[tuple[str, ...], Histogram] = {}
+        self._lock = Lock()
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.bounds))
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for values, child in sorted(self._children.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, values))
+            prefix = f"{labels}," if labels else ""
+            cumulative, total, count = child.snapshot()
+            for bound, running in zip((*self.bounds, math.inf), cumulative):
+                yield f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {running}'
+            suffix = f"{{{labels}}}" if labels else ""
+            yield f"{self.name}_sum{suffix} {_format_value(total)}"
+            yield f"{self.name}_count{suffix} {count}"
+
+
+class LatencyRing:
+    """
+    The last `size` latencies, for percentiles over recent events.
+
+    Preallocated: observe() overwrites the oldest slot. Meant for rare,
+    per-event latencies (one per notification), where a histogram's fixed
+    buckets would blur the number being tuned.
+    """
+
+    def __init__(self, size: int = 512) -> None:
+        self._values = [0.0] * max(1, size)
+        self._next = 0
+        self._filled = 0
+        self._lock = Lock()
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._values[self._next] = value
+            self._next = (self._next + 1) % len(self._values)
+            self._filled = min(self._filled + 1, len(self._values))
+            self.count += 1
+
+    def percentiles(self, quantiles: tuple[float, ...] = (0.5, 0.9, 0.99)) -> dict[str, float | None]:
+        """
+        Nearest-rank percentiles and the max of the values held, None when empty.
+        """
+        with self._lock:
+            values = sorted(self._values[: self._filled])
+        result: dict[str, float | None] = {}
+        for quantile in quantiles:
+            key = f"p{quantile * 100:g}"
+            result[key] = values[max(0, math.ceil(quantile * len(values)) - 1)] if values else None
+        result["max"] = values[-1] if values else None
+        return result
+
+    def summary(self) -> dict:
+        return {"count": self.count, "window": self._filled, **self.percentiles()}
+
+
+# Returns (labels, value) samples of one metric.
+Collector = Callable[[], Iterable[tuple[dict[str, str], float]]]
+# name -> (type, help, collector)
+_COLLECTORS: dict[str, tuple[str, str, Collector]] = {}
+_FAMILIES: list[HistogramFamily] = []
+
+
+def histogram(name: str, help_text: str, label_names: tuple[str, ...] = ()) -> HistogramFamily:
+    family = HistogramFamily(name, help_text, label_names)
+    _FAMILIES.append(family)
+    return family
+
+
+def register_collector(name: str, kind: str, help_text: str, collect: Collector) -> None:
+    """
+    Expose values another component keeps; `collect` runs at scrape time.
+    """
+    _COLLECTORS[name] = (kind, help_text, collect)
+
+
+def render() -> str:
+    lines: list[str] = []
+    for family in _FAMILIES:
+        lines.extend(family.render())
+    for name, (kind, help_text, collect) in _COLLECTORS.items():
+        try:
+            samples = list(collect())
+        except Exception:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            series = f"{name}{{{label_text}}}" if label_text else name
+            lines.append(f"{series} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = histogram(
+    "baby_monitor_stage_seconds",
+    "Time spent per hot-path stage.",
+    ("stage",),
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "baby_monitor_http_request_seconds",
+    "Flask request handling time by route.",
+    ("method", "route", "status"),
+)
+
+# Bound children for the per-frame stages, so the hot path skips the label lookup.
+AUDIO_READ = STAGE_SECONDS.labels("audio_read")
+AUDIO_ANALYSIS = STAGE_SECONDS.labels("audio_analysis")
+DETECTOR = STAGE_SECONDS.labels("detector")
+STATE_LOCK_HOLD = STAGE_SECONDS.labels("state_lock_hold")
+DISPATCHER = STAGE_SECONDS.labels("dispatcher")
+PUSH_REQUEST = STAGE_SECONDS.labels("push_request")
+DB_WRITE = STAGE_SECONDS.labels("db_write")
+DB_READ = STAGE_SECONDS.labels("db_read")
@@ -52,6 +52,9 @@ class CryEvent:
     started_at: str
     ended_at: str | None
     duration_seconds: int | None
+    stream_id: str = "default"
+    # Cry onset to the first delivered alert of the session.
+    alert_latency_seconds: float | None = None
 
     @classmethod
     def from_row(cls, row: dict) -> "CryEvent":
@@ -60,4 +63,23 @@ class CryEvent:
             started_at=str(row["started_at"]),
             ended_at=row["ended_at"],
             duration_seconds=row["duration_seconds"],
+            stream_id=str(row["stream_id"]),
+            alert_latency_seconds=row["alert_latency_seconds"],
+        )
+
+
+@dataclass(frozen=True)
+class CryDay:
+    day: str
+    session_count: int
+    cry_seconds: int
+    longest_seconds: int
+
+    @classmethod
+    def from_row(cls, row: dict) -> "CryDay":
+        return cls(
+            day=str(row["day"]),
+            session_count=int(row["session_count"]),
+            cry_seconds=int(row["cry_seconds"]),
+            longest_seconds=int(row["longest_seconds"]),
         )
@@ -2,6 +2,19 @@
 backend/notifications/dispatcher.py
 
 Decide who should be notified based on cry state and user settings.
+
+Candidates (active users with notifications enabled) are cached in memory
+and reloaded only after invalidate_candidates(), which the settings, user
+and registration endpoints call. Cooldown timestamps also live in memory,
+so deciding that nobody is due does no database I/O. Cooldowns run per
+(user, stream): a crying twin does not silence the nursery next door.
+last_notified_at in the database holds the newest alert of any stream.
+
+When someone is due, one transaction writes their notification_outbox
+rows and last_notified_at; delivery happens on the outbox drainer. The rows
+carry the capture times of the cry onset and of the chunk that triggered
+the alert, and the open cry_events row, so delivery can record end-to-end
+latency.
 """
 
 from __future__ import annotations
@@ -9,12 +22,17 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime, timezone
 import logging
-import math
-from typing import Iterable
+import sqlite3
+from threading import Lock
+import time
+from typing import Iterable, Mapping
 
 from backend.config import settings
-from backend.database import query_all, execute
+from backend.cry_events import open_event_id
+from backend.database import query_all, transaction
+from backend.metrics import DISPATCHER
 from backend.audio.state import CryState
+from backend.notifications import outbox
 
 
 logger = logging.getLogger("baby_monitor.notifications")
@@ -42,7 +60,7 @@ def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def _load_candidates() -> list[NotificationCandidate]:
+def _load_candidates_from_db() -> list[NotificationCandidate]:
     rows = query_all(
         """
         SELECT u.id AS user_id,
@@ -69,65 +87,178 @@ def _load_candidates() -> list[NotificationCandidate]:
     return candidates
 
 
-def _cooldown_ok(candidate: NotificationCandidate, now: datetime) -> bool:
+_CACHE_LOCK = Lock()
+_CANDIDATES: list[NotificationCandidate] | None = None
+_CACHE_GENERATION = 0
+
+# (user_id, stream_id) -> last notification time; the newest of memory and database.
+_LAST_NOTIFIED: dict[tuple[int, str], datetime] = {}
+_COOLDOWN_LOCK = Lock()
+
+
+def invalidate_candidates() -> None:
+    """
+    Drop the cached candidates; the next evaluation reloads them.
+
+    Call after anything that changes users or notification_settings.
+    """
+    global _CANDIDATES, _CACHE_GENERATION
+    with _CACHE_LOCK:
+        _CANDIDATES = None
+        _CACHE_GENERATION += 1
+
+
+def _load_candidates() -> list[NotificationCandidate]:
+    global _CANDIDATES
+    with _CACHE_LOCK:
+        if _CANDIDATES is not None:
+            return _CANDIDATES
+        generation = _CACHE_GENERATION
+
+    candidates = _load_candidates_from_db()
+    with _COOLDOWN_LOCK:
+        for candidate in candidates:
+            stored = candidate.last_notified_at
+            if stored is None:
+                continue
+            # The stored time is not per stream: apply it to all of them.
+            for stream_id in settings.audio_stream_ids:
+                known = _LAST_NOTIFIED.get((candidate.user_id, stream_id))
+                if known is None or stored > known:
+                    _LAST_NOTIFIED[(candidate.user_id, stream_id)] = stored
+
+    with _CACHE_LOCK:
+        # Only publish if nothing was invalidated while we were loading.
+        if generation == _CACHE_GENERATION:
+            _CANDIDATES = candidates
+    return candidates
+
+
+def _cooldown_ok(
+    candidate: NotificationCandidate,
+    stream_id: str,
+    now: datetime,
+    last_notified: Mapping[tuple[int, str], datetime],
+) -> bool:
     cooldown = candidate.cooldown_seconds or settings.notify_cooldown_seconds
-    if not candidate.last_notified_at:
+    last_notified_at = last_notified.get((candidate.user_id, stream_id))
+    if not last_notified_at:
         return True
-    return (now - candidate.last_notified_at).total_seconds() >= cooldown
+    return (now - last_notified_at).total_seconds() >= cooldown
 
 
-def mark_notified(user_id: int, when: datetime | None = None) -> None:
-    ts = (when or _now()).isoformat()
-    execute(
-        "UPDATE notification_settings SET last_notified_at = ? WHERE user_id = ?",
-        (ts, user_id),
-    )
+def record_notifications(
+    user_ids: list[int],
+    title: str,
+    body: str,
+    when: datetime,
+    stream_id: str | None = None,
+    onset_at: datetime | None = None,
+    captured_at: datetime | None = None,
+) -> bool:
+    """
+    Store outbox rows and cooldowns for `user_ids` in one transaction.
+
+    `onset_at` and `captured_at` are the capture times of the cry onset and
+    of the triggering chunk (default: `when`).
+    """
+    stream_id = stream_id or settings.audio_stream_ids[0]
+    try:
+        with transaction() as db:
+            outbox.enqueue(
+                db,
+                user_ids,
+                title,
+                body,
+                when,
+                stream_id,
+                onset_at=onset_at,
+                captured_at=captured_at,
+                cry_event_id=open_event_id(stream_id),
+            )
+            db.executemany(
+                "UPDATE notification_settings SET last_notified_at = ? WHERE user_id = ?",
+                [(when.isoformat(), user_id) for user_id in user_ids],
+            )
+    except sqlite3.Error as exc:
+        # Nothing recorded, so the cooldown is not armed and the next chunk retries.
+        logger.error("Recording notifications failed: %s", exc)
+        return False
+    with _COOLDOWN_LOCK:
+        for user_id in user_ids:
+            _LAST_NOTIFIED[(user_id, stream_id)] = when
+    outbox.get_outbox().notify(len(user_ids))
+    return True
 
 
-def evaluate_notifications(state: CryState) -> list[int]:
+def effective_cry_seconds(state: CryState) -> float:
     """
-    Return list of user_ids that were notified.
+    Accumulated crying that counts towards alert thresholds, in seconds.
+
+    The effective cry minutes plus the crying the detector actually reported
+    in the current minute. A 20 s threshold therefore needs 20 s of detected
+    crying, not two short noises 20 s apart, and fires without waiting for
+    the next minute boundary.
+    """
+    return state.effective_cry_minutes * 60.0 + state.current_minute_cry_seconds
+
+
+def _cry_duration_text(seconds: float) -> str:
+    if seconds < 60:
+        count = int(seconds)
+        return f"{count} second{'' if count == 1 else 's'}"
+    minutes = int(seconds // 60)
+    return f"{minutes} minute{'' if minutes == 1 else 's'}"
+
+
+def due_candidates(
+    state: CryState,
+    candidates: Iterable[NotificationCandidate],
+    now: datetime,
+    last_notified: Mapping[tuple[int, str], datetime],
+) -> list[NotificationCandidate]:
+    """
+    The candidates `state` should notify at `now`; no I/O.
     """
     if not state.current_minute_is_crying:
         return []
-
-    now = _now()
-    notified: list[int] = []
-    for candidate in _load_candidates():
-        threshold_minutes = int(math.ceil(candidate.threshold_seconds / 60))
-        if threshold_minutes == 0:
-            pass
-        elif state.effective_cry_minutes < threshold_minutes:
+    cry_seconds = effective_cry_seconds(state)
+    due: list[NotificationCandidate] = []
+    for candidate in candidates:
+        if cry_seconds < candidate.threshold_seconds:
             continue
-        if not _cooldown_ok(candidate, now):
+        if not _cooldown_ok(candidate, state.stream_id, now, last_notified):
             continue
-        _send_notification(candidate, state)
-        mark_notified(candidate.user_id, now)
-        notified.append(candidate.user_id)
-    return notified
-
-
-def _send_notification(candidate: NotificationCandidate, state: CryState) -> None:
-    if not settings.fcm_enabled:
-        logger.info(
-            "Notify user %s (%s): crying for %sm",
-            candidate.user_id,
-            candidate.email,
-            state.effective_cry_minutes,
-        )
-        return
+        due.append(candidate)
+    return due
+
+
+def evaluate_notifications(
+    state: CryState, now: datetime | None = None, captured_at: float | None = None
+) -> list[int]:
+    """
+    Return list of user_ids that were notified.
+
+    `captured_at` is the epoch capture time of the chunk that produced `state`.
+    """
+    if not state.current_minute_is_crying:
+        return []
 
+    started = time.perf_counter()
     try:
-        from backend.notifications.push import send_push
-    except Exception as exc:
-        logger.error("Push notification failed to import: %s", exc)
-        return
-
-    title = "Baby is crying"
-    body = f"Crying for {state.effective_cry_minutes} minutes."
-    tokens = query_all("SELECT token FROM device_tokens WHERE user_id = ?", (candidate.user_id,))
-    if not tokens:
-        logger.warning("No device tokens for user %s", candidate.user_id)
-        return
-    for row in tokens:
-        send_push(row["token"], title, body)
+        now = now or _now()
+        due = due_candidates(state, _load_candidates(), now, _LAST_NOTIFIED)
+        if not due:
+            return []
+        title = "Baby is crying"
+        if len(settings.audio_streams) > 1:
+            title = f"Baby is crying ({state.stream_id})"
+        body = f"Crying for {_cry_duration_text(effective_cry_seconds(state))}."
+        user_ids = [candidate.user_id for candidate in due]
+        captured = now if captured_at is None else datetime.fromtimestamp(captured_at, tz=timezone.utc)
+        onset_at = state.cry_onset_captured_at or state.cry_session_started_at or captured
+        if not record_notifications(user_ids, title, body, now, state.stream_id, onset_at, captured):
+            return []
+        return user_ids
+    finally:
+        DISPATCHER.observe(time.perf_counter() - started)
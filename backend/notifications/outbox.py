@@ -0,0 +1,531 @@
+"""
+backend/notifications/outbox.py
+
+Durable notification outbox.
+
+The dispatcher writes every alert as a notification_outbox row in the same
+transaction that records the user's last_notified_at, so an alert and its
+cooldown are stored together or not at all. A drainer thread delivers
+pending rows through the push pool. A row is marked delivered only after
+every device was reached, or FCM rejected the token for good. Failed rows
+are rescheduled with backoff up to OUTBOX_MAX_ATTEMPTS; the devices they
+did reach are kept in notification_deliveries, and a retry only pushes to
+the others, so nobody gets the same alert twice. Rows still pending
+after a crash or restart are picked up again at startup, unless they are
+older than OUTBOX_MAX_AGE_SECONDS (a stale "baby is crying" alert helps nobody).
+
+Rows carry the capture times of the cry onset and of the chunk that
+triggered them. When FCM first accepts the push for one of the user's
+devices, the onset-to-send latency is stored on the row (and on the
+session's cry_events row, for its first alert) and kept, with the
+capture-to-send latency, in ring buffers for percentiles. Rows completed
+without a push (no devices, FCM disabled, every token pruned) record no
+latency.
+"""
+
+from __future__ import annotations
+
+import atexit
+from datetime import datetime, timedelta, timezone
+from functools import partial
+import logging
+import random
+import sqlite3
+from threading import Event, Lock, Thread
+import time
+
+from backend.config import settings
+from backend.database import execute, execute_many, query_all, query_one, transaction
+from backend.metrics import LatencyRing, register_collector
+
+
+logger = logging.getLogger("baby_monitor.notifications")
+
+_INSERT_SQL = """
+    INSERT INTO notification_outbox (
+        user_id, stream_id, title, body, created_at, next_attempt_at, onset_at, captured_at, cry_event_id
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SELECT_DUE_SQL = """
+    SELECT id, user_id, title, body, attempts, created_at, onset_at, captured_at, cry_event_id, latency_seconds
+    FROM notification_outbox
+    WHERE delivered_at IS NULL AND failed_at IS NULL AND next_attempt_at <= ?
+    ORDER BY id ASC
+    LIMIT ?
+"""
+
+_MAX_TOKENS_PER_JOB = 1000
+_RETENTION_INTERVAL_SECONDS = 3600.0
+
+# First crying frame captured -> push accepted: the number to tune against.
+ONSET_TO_SEND = LatencyRing()
+# Triggering chunk captured -> push accepted: the pipeline's share of it,
+# without the time the baby had to cry before the alert was due.
+CAPTURE_TO_SEND = LatencyRing()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(
+    db: sqlite3.Connection,
+    user_ids: list[int],
+    title: str,
+    body: str,
+    now: datetime,
+    stream_id: str,
+    onset_at: datetime | None = None,
+    captured_at: datetime | None = None,
+    cry_event_id: int | None = None,
+) -> None:
+    """
+    Add outbox rows on `db`; the caller owns the transaction.
+    """
+    ts = now.isoformat()
+    onset = (onset_at or now).isoformat()
+    captured = (captured_at or now).isoformat()
+    db.executemany(
+        _INSERT_SQL,
+        [(user_id, stream_id, title, body, ts, ts, onset, captured, cry_event_id) for user_id in user_ids],
+    )
+
+
+class OutboxDrainer:
+    def __init__(
+        self,
+        poll_seconds: float,
+        batch_size: int,
+        max_attempts: int,
+        max_age_seconds: float,
+        retention_days: int,
+    ) -> None:
+        self.poll_seconds = poll_seconds
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.max_age_seconds = max_age_seconds
+        self.retention_days = retention_days
+        self._in_flight: set[int] = set()
+        self._lock = Lock()
+        self._wake = Event()
+        self._stopping = Event()
+        self._thread: Thread | None = None
+        self._last_retention = 0.0
+        self._started_at = time.monotonic()
+
+        self.enqueued = 0
+        self.delivered = 0
+        self.rescheduled = 0
+        self.failed = 0
+        self.expired = 0
+        self.replayed = 0
+        self.last_latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+    def notify(self, count: int = 1) -> None:
+        """
+        Called after new rows were committed: wake the drainer now.
+        """
+        self.enqueued += count
+        self._wake.set()
+
+    def _backoff(self, attempts: int) -> float:
+        cap = min(settings.push_backoff_max_seconds, settings.push_backoff_seconds * (2 ** attempts))
+        return random.uniform(cap / 2, cap)
+
+    def _record_latency(
+        self, db: sqlite3.Connection, rows: list[sqlite3.Row], pushed_ids: set[int] | frozenset[int], now: datetime
+    ) -> None:
+        """
+        Record latency for the rows in `pushed_ids` that reach a device for
+        the first time; the caller owns the transaction.
+        """
+        updates, first_alerts = [], []
+        for row in rows:
+            if row["id"] not in pushed_ids or row["latency_seconds"] is not None:
+                continue
+            latency = (now - datetime.fromisoformat(row["created_at"])).total_seconds()
+            self.last_latency_seconds = latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+            if row["onset_at"]:
+                onset_latency = (now - datetime.fromisoformat(row["onset_at"])).total_seconds()
+                ONSET_TO_SEND.observe(onset_latency)
+                updates.append((onset_latency, row["id"]))
+                if row["cry_event_id"] is not None:
+                    first_alerts.append((onset_latency, row["cry_event_id"]))
+            if row["captured_at"]:
+                CAPTURE_TO_SEND.observe((now - datetime.fromisoformat(row["captured_at"])).total_seconds())
+        if updates:
+            db.executemany("UPDATE notification_outbox SET latency_seconds = ? WHERE id = ?", updates)
+        if first_alerts:
+            # Only the session's first delivered alert counts.
+            db.executemany(
+                """
+                UPDATE cry_events SET alert_latency_seconds = ?
+                WHERE id = ? AND alert_latency_seconds IS NULL
+                """,
+                first_alerts,
+            )
+
+    def _mark_delivered(
+        self, rows: list[sqlite3.Row], pushed_ids: set[int] | frozenset[int] = frozenset()
+    ) -> None:
+        """
+        Mark rows done; latency is recorded only for `pushed_ids`, the rows
+        a push actually reached a device for.
+        """
+        if not rows:
+            return
+        now = _now()
+        with transaction() as db:
+            self._record_latency(db, rows, pushed_ids, now)
+            db.executemany(
+                "UPDATE notification_outbox SET delivered_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now.isoformat(), row["id"]) for row in rows],
+            )
+            retried = [(row["id"],) for row in rows if row["attempts"]]
+            if retried:
+                db.executemany("DELETE FROM notification_deliveries WHERE outbox_id = ?", retried)
+        self.delivered += len(rows)
+
+    def _reschedule(
+        self, rows: list[sqlite3.Row], error: str, reached: dict[int, list[str]] | None = None
+    ) -> None:
+        """
+        Retry rows later, or give up on them. `reached` maps a row id to the
+        tokens that did get it; they are skipped on the retry.
+        """
+        if not rows:
+            return
+        reached = reached or {}
+        now = _now()
+        retry, give_up = [], []
+        for row in rows:
+            attempts = row["attempts"] + 1
+            if attempts >= self.max_attempts:
+                give_up.append((attempts, error, now.isoformat(), row["id"]))
+            else:
+                due = now + timedelta(seconds=self._backoff(attempts))
+                retry.append((attempts, error, due.isoformat(), row["id"]))
+        with transaction() as db:
+            self._record_latency(db, rows, set(reached), now)
+            db.executemany(
+                "INSERT OR IGNORE INTO notification_deliveries (outbox_id, token, delivered_at) VALUES (?, ?, ?)",
+                [(row_id, token, now.isoformat()) for row_id, tokens in reached.items() for token in tokens],
+            )
+            db.executemany(
+                "UPDATE notification_outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                retry,
+            )
+            db.executemany(
+                "UPDATE notification_outbox SET attempts = ?, last_error = ?, failed_at = ? WHERE id = ?",
+                give_up,
+            )
+        self.rescheduled += len(retry)
+        if give_up:
+            self.failed += len(give_up)
+            logger.error("Giving up on %s notification(s): %s", len(give_up), error)
+
+    def _on_push_done(
+        self,
+        rows: list[sqlite3.Row],
+        owners: dict[str, list[int]],
+        undelivered: list[str],
+        delivered: list[str],
+    ) -> None:
+        try:
+            failed_ids = {row_id for token in undelivered for row_id in owners.get(token, ())}
+            reached: dict[int, list[str]] = {}
+            for token in delivered:
+                for row_id in owners.get(token, ()):
+                    reached.setdefault(row_id, []).append(token)
+            self._mark_delivered([row for row in rows if row["id"] not in failed_ids], set(reached))
+            self._reschedule(
+                [row for row in rows if row["id"] in failed_ids],
+                "push delivery failed",
+                {row_id: tokens for row_id, tokens in reached.items() if row_id in failed_ids},
+            )
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(row["id"] for row in rows)
+
+    def _expire(self, rows: list[sqlite3.Row], now: datetime) -> list[sqlite3.Row]:
+        if self.max_age_seconds <= 0:
+            return rows
+        cutoff = (now - timedelta(seconds=self.max_age_seconds)).isoformat()
+        stale = [row for row in rows if row["created_at"] < cutoff]
+        if not stale:
+            return rows
+        execute_many(
+            "UPDATE notification_outbox SET failed_at = ?, last_error = 'expired' WHERE id = ?",
+            [(now.isoformat(), row["id"]) for row in stale],
+        )
+        self.expired += len(stale)
+        logger.warning("Dropped %s expired notification(s)", len(stale))
+        stale_ids = {row["id"] for row in stale}
+        return [row for row in rows if row["id"] not in stale_ids]
+
+    def drain_once(self) -> int:
+        """
+        Hand every due row to the push pool. Returns the number of rows taken.
+        """
+        now = _now()
+        with self._lock:
+            in_flight = set(self._in_flight)
+        rows = [
+            row
+            for row in query_all(_SELECT_DUE_SQL, (now.isoformat(), self.batch_size + len(in_flight)))
+            if row["id"] not in in_flight
+        ][: self.batch_size]
+        rows = self._expire(rows, now)
+        if not rows:
+            return 0
+
+        if not settings.fcm_enabled:
+            for row in rows:
+                logger.info("Notify user %s: %s", row["user_id"], row["body"])
+            self._mark_delivered(rows)
+            return len(rows)
+
+        user_ids = sorted({row["user_id"] for row in rows})
+        placeholders = ",".join("?" * len(user_ids))
+        tokens_by_user: dict[int, list[str]] = {}
+        for token_row in query_all(
+            f"SELECT user_id, token FROM device_tokens WHERE user_id IN ({placeholders})", user_ids
+        ):
+            tokens_by_user.setdefault(token_row["user_id"], []).append(token_row["token"])
+
+        # A retried row skips the devices an earlier attempt already reached.
+        reached: dict[int, set[str]] = {}
+        retried_ids = [row["id"] for row in rows if row["attempts"]]
+        if retried_ids:
+            placeholders = ",".join("?" * len(retried_ids))
+            for delivery in query_all(
+                f"SELECT outbox_id, token FROM notification_deliveries WHERE outbox_id IN ({placeholders})",
+                retried_ids,
+            ):
+                reached.setdefault(delivery["outbox_id"], set()).add(delivery["token"])
+        row_tokens: dict[int, list[str]] = {}
+        for row in rows:
+            skip = reached.get(row["id"], ())
+            user_tokens = tokens_by_user.get(row["user_id"], ())
+            row_tokens[row["id"]] = [token for token in user_tokens if token not in skip]
+
+        for row in rows:
+            if row["user_id"] not in tokens_by_user:
+                logger.warning("No device tokens for user %s", row["user_id"])
+        self._mark_delivered([row for row in rows if not row_tokens[row["id"]]])
+
+        # Rows with the same message share multicast jobs of up to 1,000 tokens.
+        groups: dict[tuple[str, str], list[sqlite3.Row]] = {}
+        for row in rows:
+            if row_tokens[row["id"]]:
+                groups.setdefault((row["title"], row["body"]), []).append(row)
+
+        from backend.notifications.push import get_push_pool
+
+        pool = get_push_pool()
+        for (title, body), group in groups.items():
+            job_rows: list[sqlite3.Row] = []
+            # token -> outbox rows it delivers (a user may have several rows in a group)
+            owners: dict[str, list[int]] = {}
+            for row in group:
+                user_tokens = row_tokens[row["id"]]
+                if job_rows and len(owners) + len(user_tokens) > _MAX_TOKENS_PER_JOB:
+                    self._submit(pool, job_rows, owners, title, body)
+                    job_rows, owners = [], {}
+                job_rows.append(row)
+                for token in user_tokens:
+                    owners.setdefault(token, []).append(row["id"])
+            self._submit(pool, job_rows, owners, title, body)
+        return len(rows)
+
+    def _submit(
+        self, pool, rows: list[sqlite3.Row], owners: dict[str, list[int]], title: str, body: str
+    ) -> None:
+        with self._lock:
+            self._in_flight.update(row["id"] for row in rows)
+        pool.submit(list(owners), title, body, on_done=partial(self._on_push_done, rows, owners))
+
+    def _apply_retention(self) -> None:
+        now = time.monotonic()
+        if self._last_retention and now - self._last_retention < _RETENTION_INTERVAL_SECONDS:
+            return
+        self._last_retention = now
+        cutoff = (_now() - timedelta(days=self.retention_days)).isoformat()
+        cur = execute(
+            """
+            DELETE FROM notification_outbox
+            WHERE (delivered_at IS NOT NULL AND delivered_at < ?)
+               OR (failed_at IS NOT NULL AND failed_at < ?)
+            """,
+            (cutoff, cutoff),
+        )
+        if cur.rowcount:
+            logger.info("Outbox retention removed %s rows", cur.rowcount)
+        # Deliveries of rows that were given up on or removed.
+        execute(
+            """
+            DELETE FROM notification_deliveries
+            WHERE outbox_id NOT IN (
+                SELECT id FROM notification_outbox WHERE delivered_at IS NULL AND failed_at IS NULL
+            )
+            """
+        )
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.drain_once()
+                self._apply_retention()
+            except Exception as exc:
+                logger.error("Outbox drain failed: %s", exc)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        row = query_one(
+            "SELECT COUNT(*) AS n FROM notification_outbox WHERE delivered_at IS NULL AND failed_at IS NULL"
+        )
+        self.replayed = int(row["n"]) if row else 0
+        if self.replayed:
+            logger.info("Replaying %s undelivered notification(s)", self.replayed)
+        self._started_at = time.monotonic()
+        self._thread = Thread(target=self._run, name="outbox-drainer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def metrics(self) -> dict[str, float]:
+        row = query_one(
+            "SELECT COUNT(*) AS n FROM notification_outbox WHERE delivered_at IS NULL AND failed_at IS NULL"
+        )
+        uptime = max(time.monotonic() - self._started_at, 1e-9)
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {
+            "pending": int(row["n"]) if row else 0,
+            "in_flight": in_flight,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "rescheduled": self.rescheduled,
+            "failed": self.failed,
+            "expired": self.expired,
+            "replayed": self.replayed,
+            "delivered_per_second": self.delivered / uptime,
+            "last_latency_seconds": self.last_latency_seconds,
+            "max_latency_seconds": self.max_latency_seconds,
+        }
+
+
+def latency_summary() -> dict[str, dict]:
+    """
+    Count and percentiles (seconds) of recent delivered notifications.
+    """
+    return {"onset_to_send": ONSET_TO_SEND.summary(), "capture_to_send": CAPTURE_TO_SEND.summary()}
+
+
+def _quantiles(ring: LatencyRing) -> list[tuple[dict[str, str], float]]:
+    quantiles = (0.5, 0.9, 0.99)
+    values = ring.percentiles(quantiles)
+    return [
+        ({"quantile": f"{quantile:g}"}, values[f"p{quantile * 100:g}"])
+        for quantile in quantiles
+        if values[f"p{quantile * 100:g}"] is not None
+    ]
+
+
+register_collector(
+    "baby_monitor_onset_to_send_seconds",
+    "summary",
+    "First crying frame captured to push accepted, over recent notifications.",
+    lambda: _quantiles(ONSET_TO_SEND),
+)
+register_collector(
+    "baby_monitor_capture_to_send_seconds",
+    "summary",
+    "Triggering audio chunk captured to push accepted, over recent notifications.",
+    lambda: _quantiles(CAPTURE_TO_SEND),
+)
+
+
+_DRAINER: OutboxDrainer | None = None
+_DRAINER_LOCK = Lock()
+
+
+def _drainer_metrics() -> dict[str, float]:
+    return _DRAINER.metrics() if _DRAINER is not None else {}
+
+
+def _outbox_rows() -> list[tuple[dict[str, str], float]]:
+    metrics = _drainer_metrics()
+    return [({"state": name}, metrics.get(name, 0)) for name in ("pending", "in_flight")]
+
+
+def _outbox_counters() -> list[tuple[dict[str, str], float]]:
+    metrics = _drainer_metrics()
+    return [
+        ({"result": name}, metrics.get(name, 0))
+        for name in ("enqueued", "delivered", "rescheduled", "failed", "expired", "replayed")
+    ]
+
+
+def _outbox_latency() -> list[tuple[dict[str, str], float]]:
+    metrics = _drainer_metrics()
+    return [
+        ({"stat": "last"}, metrics.get("last_latency_seconds", 0.0)),
+        ({"stat": "max"}, metrics.get("max_latency_seconds", 0.0)),
+    ]
+
+
+register_collector(
+    "baby_monitor_outbox_rows",
+    "gauge",
+    "Undelivered outbox rows (pending) and those handed to the push pool (in_flight).",
+    _outbox_rows,
+)
+register_collector(
+    "baby_monitor_outbox_rows_total",
+    "counter",
+    "Outbox rows by outcome: enqueued, delivered, rescheduled, failed, expired, replayed at startup.",
+    _outbox_counters,
+)
+register_collector(
+    "baby_monitor_outbox_delivered_per_second",
+    "gauge",
+    "Outbox rows delivered per second since the drainer started.",
+    lambda: [({}, _drainer_metrics().get("delivered_per_second", 0.0))],
+)
+register_collector(
+    "baby_monitor_outbox_delivery_latency_seconds",
+    "gauge",
+    "Outbox row created to first device reached: the latest and the largest since startup.",
+    _outbox_latency,
+)
+
+
+def get_outbox() -> OutboxDrainer:
+    global _DRAINER
+    with _DRAINER_LOCK:
+        if _DRAINER is None:
+            _DRAINER = OutboxDrainer(
+                poll_seconds=settings.outbox_poll_seconds,
+                batch_size=settings.outbox_batch_size,
+                max_attempts=settings.outbox_max_attempts,
+                max_age_seconds=settings.outbox_max_age_seconds,
+                retention_days=settings.outbox_retention_days,
+            )
+        return _DRAINER
+
+
+def start() -> None:
+    get_outbox().start()
@@ -2,47 +2,394 @@
 backend/notifications/push.py
 
 Firebase Cloud Messaging (legacy HTTP) push sender.
+
+Pushes are handed to a PushPool: a bounded queue drained by a few worker
+threads, so the audio thread never waits on the network. Each job is one
+notification for many device tokens, sent as multicast requests
+(registration_ids, up to 1,000 tokens each); tokens FCM reports as
+NotRegistered or InvalidRegistration are deleted from device_tokens. Each worker keeps
+one keep-alive connection to FCM_ENDPOINT, so only the first push from a
+worker pays the TCP/TLS handshake. Transient failures (connection errors,
+429, 5xx, "Unavailable") are retried, for the affected tokens only, with
+exponential backoff and full jitter, honouring Retry-After.
 """
 
 from __future__ import annotations
 
+import atexit
+from dataclasses import dataclass, field
+import http.client
 import json
 import logging
-from urllib import request
+import queue
+import random
+from threading import Event, Lock, Thread, local
+import time
+from typing import Callable
+from urllib.parse import urlsplit
 
 from backend.config import settings
+from backend.database import execute_many
+from backend.metrics import PUSH_REQUEST, register_collector
 
 
 logger = logging.getLogger("baby_monitor.notifications")
 
-_FCM_LEGACY_ENDPOINT = "https://fcm.googleapis.com/fcm/send"
+# Per-message errors FCM asks us to retry.
+_RETRYABLE_ERRORS = frozenset({"Unavailable", "InternalServerError"})
+# Per-message errors meaning the token will never work again.
+_INVALID_TOKEN_ERRORS = frozenset({"NotRegistered", "InvalidRegistration", "MismatchSenderId"})
+# Legacy API limit for registration_ids.
+_MAX_REGISTRATION_IDS = 1000
 
+_local = local()
 
-def send_push(token: str, title: str, body: str) -> None:
+# Called with the tokens that could not be delivered (empty on success) and
+# the tokens FCM accepted.
+DoneCallback = Callable[[list[str], list[str]], None]
+
+
+class PushError(Exception):
+    def __init__(self, message: str, retryable: bool = True, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def _connection() -> http.client.HTTPConnection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        parts = urlsplit(settings.fcm_endpoint)
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        conn = conn_cls(parts.hostname, parts.port, timeout=settings.push_timeout_seconds)
+        _local.conn = conn
+    return conn
+
+
+def _drop_connection() -> None:
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _post(payload: dict) -> dict:
+    """
+    POST one message over this thread's keep-alive connection.
+
+    Returns the decoded JSON response; raises PushError on failure.
+    """
+    parts = urlsplit(settings.fcm_endpoint)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    data = json.dumps(payload).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"key={settings.fcm_server_key}",
+    }
+
+    started = time.perf_counter()
+    try:
+        for attempt in range(2):
+            conn = _connection()
+            try:
+                conn.request("POST", path, body=data, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as exc:
+                # The server closed an idle keep-alive connection: reconnect once.
+                _drop_connection()
+                if attempt == 0:
+                    continue
+                raise PushError(f"connection lost: {exc}") from exc
+            except (http.client.HTTPException, OSError) as exc:
+                _drop_connection()
+                raise PushError(f"request failed: {exc}") from exc
+            if resp.will_close:
+                _drop_connection()
+            break
+    finally:
+        PUSH_REQUEST.observe(time.perf_counter() - started)
+
+    if resp.status == 429 or resp.status >= 500:
+        raise PushError(f"HTTP {resp.status}", retry_after=_parse_retry_after(resp.getheader("Retry-After")))
+    if resp.status >= 400:
+        raise PushError(f"HTTP {resp.status}: {raw.decode('utf-8', 'ignore')}", retryable=False)
+    try:
+        return json.loads(raw or b"{}")
+    except ValueError:
+        return {}
+
+
+@dataclass
+class MulticastResult:
+    sent: int = 0
+    failed: int = 0
+    delivered: list[str] = field(default_factory=list)
+    retry: list[str] = field(default_factory=list)
+    invalid: list[str] = field(default_factory=list)
+
+
+def send_multicast(tokens: list[str], title: str, body: str) -> MulticastResult:
+    """
+    Send one notification to up to 1,000 tokens in a single request.
+
+    Raises PushError when the whole request failed; per-token outcomes are
+    sorted into the result.
+    """
     if not settings.fcm_server_key:
-        raise RuntimeError("FCM_SERVER_KEY not configured")
+        raise PushError("FCM_SERVER_KEY not configured", retryable=False)
+
+    outcome = MulticastResult()
+    if not tokens:
+        return outcome
+
+    response = _post({"registration_ids": tokens, "notification": {"title": title, "body": body}})
+    results = response.get("results") or []
+    if len(results) != len(tokens):
+        raise PushError(f"FCM returned {len(results)} results for {len(tokens)} tokens")
+    for token, result in zip(tokens, results):
+        error = result.get("error")
+        if not error:
+            outcome.sent += 1
+            outcome.delivered.append(token)
+        elif error in _RETRYABLE_ERRORS:
+            outcome.retry.append(token)
+        else:
+            outcome.failed += 1
+            if error in _INVALID_TOKEN_ERRORS:
+                outcome.invalid.append(token)
+            else:
+                logger.error("FCM error for a device token: %s", error)
+    return outcome
 
+
+def send_push(token: str, title: str, body: str) -> None:
+    """
+    Send one push synchronously (single attempt). Raises PushError.
+    """
     if not token:
         logger.warning("Skipping push: device token is empty")
         return
+    result = send_multicast([token], title, body)
+    if result.retry:
+        raise PushError("FCM error: Unavailable")
+    if result.failed:
+        raise PushError("FCM rejected the device token", retryable=False)
 
-    payload = {
-        "to": token,
-        "notification": {"title": title, "body": body},
-    }
-    data = json.dumps(payload).encode("utf-8")
-    req = request.Request(
-        _FCM_LEGACY_ENDPOINT,
-        data=data,
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"key={settings.fcm_server_key}",
-        },
-        method="POST",
-    )
-    try:
-        with request.urlopen(req, timeout=10) as resp:
-            if resp.status >= 400:
-                logger.error("FCM error: %s %s", resp.status, resp.read().decode("utf-8", "ignore"))
-    except Exception as exc:
-        logger.error("FCM push failed: %s", exc)
+
+def prune_tokens(tokens: list[str]) -> None:
+    execute_many("DELETE FROM device_tokens WHERE token = ?", [(token,) for token in tokens])
+    logger.info("Pruned %s invalid device token(s)", len(tokens))
+
+
+class PushPool:
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        max_attempts: int,
+        backoff_seconds: float,
+        backoff_max_seconds: float,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._queue: queue.Queue[tuple[list[str], str, str, DoneCallback | None] | None] = queue.Queue(
+            maxsize=max(1, max_queue)
+        )
+        self._threads: list[Thread] = []
+        self._start_lock = Lock()
+        self._stopping = Event()
+
+        self.requests = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.pruned = 0
+        self.dropped = 0
+
+    def submit(
+        self,
+        tokens: list[str],
+        title: str,
+        body: str,
+        on_done: DoneCallback | None = None,
+    ) -> bool:
+        """
+        Queue one notification for `tokens`. Returns False if the queue is full.
+
+        `on_done` is called once per batch of up to 1,000 tokens, from a
+        worker thread, with the tokens that were not delivered and those
+        that were.
+        """
+        tokens = [token for token in dict.fromkeys(tokens) if token]
+        if not tokens:
+            return True
+        self.start()
+        ok = True
+        for i in range(0, len(tokens), _MAX_REGISTRATION_IDS):
+            batch = tokens[i : i + _MAX_REGISTRATION_IDS]
+            try:
+                self._queue.put_nowait((batch, title, body, on_done))
+            except queue.Full:
+                self.dropped += len(batch)
+                logger.error("Push queue full; dropping push to %s device(s)", len(batch))
+                ok = False
+                if on_done is not None:
+                    on_done(batch, [])
+        return ok
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        cap = min(self.backoff_max_seconds, self.backoff_seconds * (2 ** (attempt - 1)))
+        return max(random.uniform(0.0, cap), retry_after or 0.0)
+
+    def _deliver(self, tokens: list[str], title: str, body: str) -> tuple[list[str], list[str]]:
+        """
+        Send with retries; returns the tokens that were not delivered and
+        the tokens that were.
+
+        Tokens FCM rejected for good are in neither list: retrying cannot help.
+        """
+        pending = tokens
+        delivered: list[str] = []
+        for attempt in range(1, self.max_attempts + 1):
+            retry_after = None
+            self.requests += 1
+            try:
+                result = send_multicast(pending, title, body)
+            except PushError as exc:
+                if not exc.retryable:
+                    self.failed += len(pending)
+                    logger.error("FCM push failed: %s", exc)
+                    return pending, delivered
+                retry_after = exc.retry_after
+                last_error = str(exc)
+            else:
+                self.sent += result.sent
+                self.failed += result.failed
+                delivered.extend(result.delivered)
+                if result.invalid:
+                    self._prune(result.invalid)
+                pending = result.retry
+                if not pending:
+                    return [], delivered
+                last_error = "Unavailable"
+            if attempt == self.max_attempts or self._stopping.is_set():
+                break
+            self.retries += 1
+            self._stopping.wait(self._backoff(attempt, retry_after))
+        self.failed += len(pending)
+        logger.error("FCM push to %s device(s) failed after %s attempt(s): %s", len(pending), attempt, last_error)
+        return pending, delivered
+
+    def _prune(self, tokens: list[str]) -> None:
+        try:
+            prune_tokens(tokens)
+        except Exception as exc:
+            logger.error("Pruning invalid device tokens failed: %s", exc)
+            return
+        self.pruned += len(tokens)
+
+    def _run(self) -> None:
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                tokens, title, body, on_done = job
+                try:
+                    undelivered, delivered = self._deliver(tokens, title, body)
+                except Exception:
+                    self.failed += len(tokens)
+                    logger.exception("Unexpected push failure")
+                    undelivered, delivered = tokens, []
+                if on_done is not None:
+                    try:
+                        on_done(undelivered, delivered)
+                    except Exception:
+                        logger.exception("Push completion callback failed")
+        finally:
+            _drop_connection()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            threads = [
+                Thread(target=self._run, name=f"push-worker-{i}", daemon=True) for i in range(self.workers)
+            ]
+            for thread in threads:
+                thread.start()
+            self._threads = threads
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Let queued pushes go out (first attempts only), then stop the workers.
+        """
+        self._stopping.set()
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "requests": self.requests,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "pruned": self.pruned,
+            "dropped": self.dropped,
+        }
+
+
+_POOL: PushPool | None = None
+_POOL_LOCK = Lock()
+
+
+def get_push_pool() -> PushPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = PushPool(
+                workers=settings.push_workers,
+                max_queue=settings.push_queue_max,
+                max_attempts=settings.push_max_attempts,
+                backoff_seconds=settings.push_backoff_seconds,
+                backoff_max_seconds=settings.push_backoff_max_seconds,
+            )
+        return _POOL
+
+
+def _push_counters() -> list[tuple[dict[str, str], float]]:
+    metrics = _POOL.metrics() if _POOL is not None else {}
+    return [
+        ({"result": name}, metrics.get(name, 0)) for name in ("sent", "failed", "retries", "pruned", "dropped")
+    ]
+
+
+register_collector(
+    "baby_monitor_push_messages_total",
+    "counter",
+    "Push outcomes per device token: sent, failed (given up), retries, pruned, dropped.",
+    _push_counters,
+)
@@ -0,0 +1,133 @@
+"""
+backend/realtime.py
+
+In-process broadcast hub for the live dashboard stream (Server-Sent Events).
+
+Every event is JSON-encoded and framed once, when it is published, into a
+bounded history. Each connected viewer just waits on the hub and writes
+the shared frames it has not seen yet, so publishing costs the same for
+one viewer or twenty. Event ids increase by one; a reconnecting client
+sends Last-Event-ID and gets the missed frames replayed, or a "reset" event
+if they have already left the history or the id is from before a restart.
+
+Each audio stream (room) has its own hub, so a dashboard only receives
+events for the room it shows and event ids stay dense per stream.
+
+Events:
+- status: cry state changed (fed by audio.state.update via a listener)
+- volume: new 1 Hz volume sample (fed by the volume logger)
+"""
+
+from __future__ import annotations
+
+from collections import deque
+import itertools
+import json
+from threading import Condition, Lock
+from typing import Any
+
+from backend.audio.state import CryState, add_listener, default_stream_id, get_state
+
+
+_HISTORY_EVENTS = 512
+
+
+class BroadcastHub:
+    def __init__(self, history: int = _HISTORY_EVENTS) -> None:
+        self._cond = Condition()
+        self._frames: deque[bytes] = deque(maxlen=history)
+        self._last_id = 0
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    def publish(self, event: str, data: dict[str, Any]) -> int:
+        payload = json.dumps(data, separators=(",", ":"))
+        with self._cond:
+            self._last_id += 1
+            event_id = self._last_id
+            self._frames.append(f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8"))
+            self._cond.notify_all()
+        return event_id
+
+    def wait(self, after_id: int, timeout: float) -> tuple[list[bytes], int] | None:
+        """
+        Frames published after `after_id`, waiting up to `timeout` seconds.
+
+        Returns ([], after_id) on timeout and None when `after_id` has
+        already fallen out of the history or is newer than anything this hub
+        published (an id from before a restart): the client must resync.
+        """
+        with self._cond:
+            if after_id > self._last_id:
+                return None
+            self._cond.wait_for(lambda: self._last_id > after_id, timeout)
+            last_id = self._last_id
+            if last_id <= after_id:
+                return [], after_id
+            first_id = last_id - len(self._frames) + 1
+            if after_id + 1 < first_id:
+                return None
+            frames = list(itertools.islice(self._frames, after_id + 1 - first_id, None))
+        return frames, last_id
+
+
+_HUBS: dict[str, BroadcastHub] = {}
+_HUBS_LOCK = Lock()
+
+
+def hub_for(stream_id: str | None = None) -> BroadcastHub:
+    key = stream_id or default_stream_id()
+    found = _HUBS.get(key)
+    if found is not None:
+        return found
+    with _HUBS_LOCK:
+        return _HUBS.setdefault(key, BroadcastHub())
+
+
+def status_delta(state: CryState) -> dict[str, Any]:
+    return {
+        "stream_id": state.stream_id,
+        "is_crying": state.is_crying,
+        "current_minute_start": state.current_minute_start.isoformat(),
+        "current_minute_is_crying": state.current_minute_is_crying,
+        "effective_cry_minutes": state.effective_cry_minutes,
+        "consecutive_quiet_minutes": state.consecutive_quiet_minutes,
+        "timeline_version": state.timeline.version,
+        "volume_threshold": state.volume_threshold,
+    }
+
+
+_LAST_STATUS_KEYS: dict[str, tuple] = {}
+
+
+def publish_state(state: CryState) -> None:
+    """
+    State listener: publish a status event only when a visible field changed.
+    """
+    key = (
+        state.is_crying,
+        state.current_minute_is_crying,
+        state.effective_cry_minutes,
+        state.consecutive_quiet_minutes,
+        state.timeline.version,
+        state.volume_threshold,
+    )
+    if _LAST_STATUS_KEYS.get(state.stream_id) == key:
+        return
+    _LAST_STATUS_KEYS[state.stream_id] = key
+    hub_for(state.stream_id).publish("status", status_delta(state))
+
+
+def publish_volume(stream_id: str, recorded_at: str, rms: float) -> None:
+    hub_for(stream_id).publish("volume", {"t": recorded_at, "rms": rms})
+
+
+def start() -> None:
+    add_listener(publish_state)
+
+
+def current_status_frame(stream_id: str | None = None) -> bytes:
+    payload = json.dumps(status_delta(get_state(stream_id)), separators=(",", ":"))
+    return f"event: status\ndata: {payload}\n\n".encode("utf-8")
@@ -0,0 +1,108 @@
+"""
+backend/state_snapshot.py
+
+Warm restart for the cry-state machine.
+
+Each stream's audio.state.snapshot() is written to its state_snapshots row
+every STATE_SNAPSHOT_SECONDS (only when that state changed) and at exit.
+create_app() restores it before audio starts, so a baby who was already
+crying for 15 minutes is still at 15 after a redeploy, minus the quiet
+minutes the restart itself took.
+"""
+
+from __future__ import annotations
+
+import atexit
+from datetime import datetime, timezone
+import logging
+from threading import Event, Thread
+import time
+
+from backend.audio import state as cry_state
+from backend.config import settings
+from backend.database import execute_many, query_all
+
+
+logger = logging.getLogger("baby_monitor.audio")
+
+_UPSERT_SQL = """
+    INSERT INTO state_snapshots (stream_id, saved_at, data) VALUES (?, ?, ?)
+    ON CONFLICT(stream_id) DO UPDATE SET saved_at = excluded.saved_at, data = excluded.data
+"""
+
+# Last snapshot written per stream; unchanged ones are not written again.
+_last_saved: dict[str, bytes] = {}
+_stopping = Event()
+
+
+def save_snapshot(force: bool = False) -> int:
+    """
+    Save every stream whose state changed (all of them with `force`) in
+    one transaction. Returns the number of snapshots written.
+    """
+    saved_at = datetime.now(timezone.utc).isoformat()
+    rows, blobs = [], {}
+    for stream_id in cry_state.stream_ids():
+        blob = cry_state.snapshot(stream_id)
+        if not force and blob == _last_saved.get(stream_id):
+            continue
+        rows.append((stream_id, saved_at, blob))
+        blobs[stream_id] = blob
+    if rows:
+        execute_many(_UPSERT_SQL, rows)
+        _last_saved.update(blobs)
+    return len(rows)
+
+
+def restore_snapshot() -> int:
+    """
+    Restore the configured streams from their snapshots. Returns how many
+    were restored.
+    """
+    started = time.perf_counter()
+    restored = 0
+    for row in query_all("SELECT stream_id, saved_at, data FROM state_snapshots"):
+        stream_id = row["stream_id"]
+        if stream_id not in settings.audio_stream_ids:
+            continue
+        state = cry_state.restore(bytes(row["data"]), stream_id=stream_id)
+        if state is None:
+            logger.warning("Ignoring unusable state snapshot for %s from %s", stream_id, row["saved_at"])
+            continue
+        _last_saved[stream_id] = cry_state.snapshot(stream_id)
+        restored += 1
+        logger.info(
+            "Restored cry state of %s from %s (%s effective cry minutes)",
+            stream_id,
+            row["saved_at"],
+            state.effective_cry_minutes,
+        )
+    if restored:
+        logger.info("Restored %s stream state(s) in %.1f ms", restored, (time.perf_counter() - started) * 1000)
+    return restored
+
+
+def _run() -> None:
+    while not _stopping.wait(settings.state_snapshot_seconds):
+        try:
+            save_snapshot()
+        except Exception as exc:
+            logger.error("Saving state snapshot failed: %s", exc)
+
+
+def _save_at_exit() -> None:
+    _stopping.set()
+    try:
+        save_snapshot(force=True)
+    except Exception as exc:
+        logger.error("Saving state snapshot at exit failed: %s", exc)
+
+
+def start() -> None:
+    """
+    Restore the last snapshot, then keep saving new ones.
+    """
+    restore_snapshot()
+    if settings.state_snapshot_seconds > 0:
+        Thread(target=_run, name="state-snapshot", daemon=True).start()
+    atexit.register(_save_at_exit)
@@ -0,0 +1,277 @@
+"""
+backend/volume_history.py
+
+Volume time series: rollups, retention and windowed reads.
+
+Raw 1 Hz samples live in volume_samples, one series per audio stream.
+volume_rollups holds count/sum/min/max per bucket at 10 s, 1 min and 1 h,
+keyed by (stream_id, resolution_seconds, bucket_start epoch seconds). Rollups are updated in
+the same transaction as each batch of raw samples, and old rows of every
+resolution are pruned by apply_retention().
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import logging
+import sqlite3
+from typing import Iterable
+
+from backend.config import settings
+from backend.database import query_all, transaction
+
+
+logger = logging.getLogger("baby_monitor.volume")
+
+ROLLUP_RESOLUTIONS = (10, 60, 3600)
+
+# (max window minutes, resolution seconds or 0 for raw): ~1,500 points at most.
+_RESOLUTION_FOR_WINDOW = (
+    (20, 0),
+    (4 * 60, 10),
+    (24 * 60, 60),
+)
+
+_DELETE_BATCH = 5000
+_MAX_RAW_ROWS = 20_000
+
+UPSERT_ROLLUP_SQL = """
+    INSERT INTO volume_rollups
+        (stream_id, resolution_seconds, bucket_start, sample_count, rms_sum, rms_min, rms_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(stream_id, resolution_seconds, bucket_start) DO UPDATE SET
+        sample_count = sample_count + excluded.sample_count,
+        rms_sum = rms_sum + excluded.rms_sum,
+        rms_min = MIN(rms_min, excluded.rms_min),
+        rms_max = MAX(rms_max, excluded.rms_max)
+"""
+
+
+def rollup_rows(
+    samples: Iterable[tuple[str, float, float]],
+) -> list[tuple[str, int, int, int, float, float, float]]:
+    """
+    Aggregate (stream_id, epoch_seconds, rms) samples into rollup upsert rows.
+    """
+    buckets: dict[tuple[str, int, int], list[float]] = {}
+    for stream_id, ts, rms in samples:
+        for resolution in ROLLUP_RESOLUTIONS:
+            key = (stream_id, resolution, int(ts // resolution) * resolution)
+            agg = buckets.get(key)
+            if agg is None:
+                buckets[key] = [1, rms, rms, rms]
+            else:
+                agg[0] += 1
+                agg[1] += rms
+                if rms < agg[2]:
+                    agg[2] = rms
+                if rms > agg[3]:
+                    agg[3] = rms
+    return [
+        (stream_id, resolution, start, int(agg[0]), agg[1], agg[2], agg[3])
+        for (stream_id, resolution, start), agg in buckets.items()
+    ]
+
+
+def backfill_rollups(db: sqlite3.Connection) -> None:
+    """
+    Build rollups from raw samples recorded before rollups existed.
+    """
+    if db.execute("SELECT 1 FROM volume_rollups LIMIT 1").fetchone():
+        return
+    if not db.execute("SELECT 1 FROM volume_samples LIMIT 1").fetchone():
+        return
+    logger.info("Backfilling volume rollups from raw samples")
+    for resolution in ROLLUP_RESOLUTIONS:
+        db.execute(
+            """
+            INSERT INTO volume_rollups
+                (stream_id, resolution_seconds, bucket_start, sample_count, rms_sum, rms_min, rms_max)
+            SELECT stream_id, ?, (CAST(strftime('%s', recorded_at) AS INTEGER) / ?) * ?,
+                   COUNT(*), SUM(rms), MIN(rms), MAX(rms)
+            FROM volume_samples
+            WHERE recorded_at IS NOT NULL
+            GROUP BY 1, 3
+            """,
+            (resolution, resolution, resolution),
+        )
+    db.commit()
+
+
+def _retention_cutoffs(now: datetime) -> list[tuple[int, datetime]]:
+    return [
+        (0, now - timedelta(hours=settings.volume_retention_raw_hours)),
+        (10, now - timedelta(days=settings.volume_retention_10s_days)),
+        (60, now - timedelta(days=settings.volume_retention_1m_days)),
+        (3600, now - timedelta(days=settings.volume_retention_1h_days)),
+    ]
+
+
+def apply_retention(now: datetime | None = None) -> int:
+    """
+    Delete samples and rollups older than their configured retention.
+
+    Raw rows are deleted in small batches, each taking the writer only
+    briefly. Returns the number of rows removed.
+    """
+    removed = 0
+    for resolution, cutoff in _retention_cutoffs(now or datetime.now(timezone.utc)):
+        if resolution == 0:
+            while True:
+                with transaction() as db:
+                    cur = db.execute(
+                        """
+                        DELETE FROM volume_samples WHERE id IN (
+                            SELECT id FROM volume_samples WHERE recorded_at < ? LIMIT ?
+                        )
+                        """,
+                        (cutoff.isoformat(), _DELETE_BATCH),
+                    )
+                removed += cur.rowcount
+                if cur.rowcount < _DELETE_BATCH:
+                    break
+        else:
+            with transaction() as db:
+                cur = db.execute(
+                    "DELETE FROM volume_rollups WHERE resolution_seconds = ? AND bucket_start < ?",
+                    (resolution, int(cutoff.timestamp())),
+                )
+            removed += cur.rowcount
+    return removed
+
+
+def resolution_for_window(minutes: int) -> int:
+    for max_minutes, resolution in _RESOLUTION_FOR_WINDOW:
+        if minutes <= max_minutes:
+            return resolution
+    return ROLLUP_RESOLUTIONS[-1]
+
+
+def _bucket_sample(bucket_start: int, count: int, total: float, low: float, high: float) -> dict:
+    return {
+        "t": datetime.fromtimestamp(bucket_start, tz=timezone.utc).isoformat(),
+        "rms": total / count,
+        "min": low,
+        "max": high,
+    }
+
+
+def latest_cursor() -> int:
+    # Sample ids are shared by all streams, so the cursor is too.
+    row = query_all("SELECT MAX(id) AS id FROM volume_samples")
+    return int(row[0]["id"] or 0) if row else 0
+
+
+def _raw_filter(stream_id: str, cutoff: datetime, since: int | None) -> tuple[str, dict]:
+    # A cursor poll walks the primary key; a window read walks the (stream_id, recorded_at) index.
+    params = {"stream": stream_id, "cutoff": cutoff.isoformat()}
+    if since is not None:
+        return "id > :since AND stream_id = :stream AND recorded_at >= :cutoff", {**params, "since": since}
+    return "stream_id = :stream AND recorded_at >= :cutoff", params
+
+
+def _raw_samples(stream_id: str, cutoff: datetime, since: int | None) -> tuple[list[dict], int | None]:
+    where, params = _raw_filter(stream_id, cutoff, since)
+    order = "id" if since is not None else "recorded_at"
+    rows = query_all(
+        f"""
+        SELECT id, recorded_at, rms
+        FROM volume_samples
+        WHERE {where}
+        ORDER BY {order} ASC
+        LIMIT :limit
+        """,
+        {**params, "limit": _MAX_RAW_ROWS},
+    )
+    cursor = max((row["id"] for row in rows), default=since)
+    return [{"t": row["recorded_at"], "rms": row["rms"]} for row in rows], cursor
+
+
+def _raw_buckets(
+    stream_id: str, cutoff: datetime, since: int | None, bucket_seconds: int
+) -> tuple[list[dict], int | None]:
+    where, params = _raw_filter(stream_id, cutoff, since)
+    rows = query_all(
+        f"""
+        SELECT (CAST(strftime('%s', recorded_at) AS INTEGER) / :bucket) * :bucket AS bucket_start,
+               COUNT(*) AS sample_count, SUM(rms) AS rms_sum,
+               MIN(rms) AS rms_min, MAX(rms) AS rms_max, MAX(id) AS last_id
+        FROM volume_samples
+        WHERE {where}
+        GROUP BY bucket_start
+        ORDER BY bucket_start ASC
+        """,
+        {**params, "bucket": bucket_seconds},
+    )
+    cursor = max((row["last_id"] for row in rows), default=since)
+    samples = [
+        _bucket_sample(row["bucket_start"], row["sample_count"], row["rms_sum"], row["rms_min"], row["rms_max"])
+        for row in rows
+    ]
+    return samples, cursor
+
+
+def _rollup_buckets(stream_id: str, cutoff: datetime, resolution: int, bucket_seconds: int) -> list[dict]:
+    rows = query_all(
+        """
+        SELECT (bucket_start / :bucket) * :bucket AS grouped_start,
+               SUM(sample_count) AS sample_count, SUM(rms_sum) AS rms_sum,
+               MIN(rms_min) AS rms_min, MAX(rms_max) AS rms_max
+        FROM volume_rollups
+        WHERE stream_id = :stream AND resolution_seconds = :resolution AND bucket_start >= :start
+        GROUP BY grouped_start
+        ORDER BY grouped_start ASC
+        """,
+        {
+            "stream": stream_id,
+            "bucket": bucket_seconds,
+            "resolution": resolution,
+            "start": int(cutoff.timestamp()) // bucket_seconds * bucket_seconds,
+        },
+    )
+    return [
+        _bucket_sample(row["grouped_start"], row["sample_count"], row["rms_sum"], row["rms_min"], row["rms_max"])
+        for row in rows
+    ]
+
+
+def load_samples(
+    minutes: int,
+    since: int | None = None,
+    bucket_seconds: int | None = None,
+    stream_id: str | None = None,
+) -> tuple[int, list[dict], int | None]:
+    """
+    Return (resolution_seconds, samples, cursor) for the last `minutes` of
+    one stream (the first configured stream by default).
+
+    - since: only samples with id > since (raw rows, the dashboard's live
+      tail). The returned cursor is the id to pass next time.
+    - bucket_seconds: min/max/mean per bucket, computed in SQL. Served from
+      the coarsest rollup that divides it, unless `since` asks for new raw
+      rows only.
+    - neither: resolution is chosen from the window size.
+
+    Resolution 0 means raw samples. Bucketed samples report the mean as
+    "rms" plus the bucket min/max.
+    """
+    stream_id = stream_id or settings.audio_stream_ids[0]
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+
+    if bucket_seconds is not None and bucket_seconds > 1:
+        if since is None:
+            for resolution in reversed(ROLLUP_RESOLUTIONS):
+                if bucket_seconds % resolution == 0:
+                    return (
+                        bucket_seconds,
+                        _rollup_buckets(stream_id, cutoff, resolution, bucket_seconds),
+                        latest_cursor(),
+                    )
+        samples, cursor = _raw_buckets(stream_id, cutoff, since, bucket_seconds)
+        return bucket_seconds, samples, cursor if cursor is not None else latest_cursor()
+
+    resolution = 0 if since is not None or bucket_seconds is not None else resolution_for_window(minutes)
+    if resolution == 0:
+        samples, cursor = _raw_samples(stream_id, cutoff, since)
+        return 0, samples, cursor if cursor is not None else latest_cursor()
+    return resolution, _rollup_buckets(stream_id, cutoff, resolution, resolution), latest_cursor()
@@ -0,0 +1,257 @@
+"""
+backend/volume_writer.py
+
+Write-behind queue for volume_samples.
+
+The volume logger produces one sample per second. Instead of an INSERT and
+a commit (an fsync on the SD card) per sample, samples are queued in memory
+and written in a single executemany transaction every VOLUME_FLUSH_SECONDS
+or once VOLUME_FLUSH_MAX_ROWS are waiting. stop() flushes what is left.
+
+Each flush also folds the batch into the 10 s / 1 min / 1 h rollups in the
+same transaction, and the writer thread runs the retention job every
+VOLUME_RETENTION_INTERVAL_SECONDS.
+
+The same thread runs other small writes handed to submit() (cry session
+rows), so state listeners on the analysis thread never wait for the
+database writer lock. Submitted jobs wake the thread and run before the
+next sample flush.
+
+Queue depth, written and dropped rows and flush counts are exported on
+/api/metrics; flush latency goes to the volume_flush stage histogram.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from datetime import datetime
+import logging
+import sqlite3
+from threading import Event, Lock, Thread
+import time
+from typing import Callable
+
+from backend.config import settings
+from backend.database import transaction
+from backend.metrics import STAGE_SECONDS, register_collector
+from backend.volume_history import UPSERT_ROLLUP_SQL, apply_retention, rollup_rows
+
+
+logger = logging.getLogger("baby_monitor.volume")
+
+_INSERT_SQL = "INSERT INTO volume_samples (stream_id, recorded_at, rms) VALUES (?, ?, ?)"
+
+_FLUSH = STAGE_SECONDS.labels("volume_flush")
+
+# Runs on the writer thread inside its own transaction.
+WriteJob = Callable[[sqlite3.Connection], None]
+
+
+class VolumeSampleWriter:
+    def __init__(
+        self,
+        flush_seconds: float,
+        max_batch: int,
+        max_queue: int,
+        retention_interval_seconds: float = 0.0,
+    ) -> None:
+        self.flush_seconds = flush_seconds
+        self.max_batch = max(1, max_batch)
+        self.retention_interval_seconds = retention_interval_seconds
+        self._last_retention = 0.0
+        # (stream_id, recorded_at ISO string, epoch seconds, rms)
+        self._queue: deque[tuple[str, str, float, float]] = deque()
+        self._jobs: deque[WriteJob] = deque()
+        self._max_queue = max(self.max_batch, max_queue)
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._wake = Event()
+        self._stopping = Event()
+        self._thread: Thread | None = None
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.jobs_run = 0
+        self.job_errors = 0
+
+    def add(self, recorded_at: datetime, rms: float, stream_id: str) -> None:
+        sample = (stream_id, recorded_at.isoformat(), recorded_at.timestamp(), rms)
+        with self._lock:
+            if len(self._queue) >= self._max_queue:
+                # Database unavailable for a long time: keep the newest samples.
+                self._queue.popleft()
+                self.rows_dropped += 1
+            self._queue.append(sample)
+            full = len(self._queue) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def submit(self, job: WriteJob) -> None:
+        """
+        Run job(db) in a transaction on the writer thread, shortly.
+        """
+        with self._lock:
+            self._jobs.append(job)
+        self._wake.set()
+
+    def _run_jobs(self) -> None:
+        with self._lock:
+            jobs = list(self._jobs)
+            self._jobs.clear()
+        for job in jobs:
+            try:
+                with transaction() as db:
+                    job(db)
+            except Exception as exc:
+                self.job_errors += 1
+                logger.error("Background write %r failed: %s", job, exc)
+            else:
+                self.jobs_run += 1
+
+    def flush(self) -> int:
+        """
+        Run submitted jobs, then write the samples queued so far in one
+        transaction. Returns sample rows written.
+        """
+        with self._flush_lock:
+            self._run_jobs()
+            with self._lock:
+                if not self._queue:
+                    return 0
+                batch = list(self._queue)
+                self._queue.clear()
+
+            started = time.perf_counter()
+            try:
+                with transaction() as db:
+                    db.executemany(_INSERT_SQL, [(stream, iso, rms) for stream, iso, _ts, rms in batch])
+                    db.executemany(
+                        UPSERT_ROLLUP_SQL, rollup_rows((stream, ts, rms) for stream, _iso, ts, rms in batch)
+                    )
+            except Exception as exc:
+                self.flush_errors += 1
+                logger.error("Volume flush of %s rows failed: %s", len(batch), exc)
+                with self._lock:
+                    # Put the batch back in front of anything queued meanwhile.
+                    self._queue.extendleft(reversed(batch))
+                    while len(self._queue) > self._max_queue:
+                        self._queue.popleft()
+                        self.rows_dropped += 1
+                return 0
+
+            elapsed = time.perf_counter() - started
+            _FLUSH.observe(elapsed)
+            self.flushes += 1
+            self.rows_written += len(batch)
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+            return len(batch)
+
+    def _maybe_apply_retention(self) -> None:
+        if self.retention_interval_seconds <= 0:
+            return
+        now = time.monotonic()
+        if self._last_retention and now - self._last_retention < self.retention_interval_seconds:
+            return
+        self._last_retention = now
+        try:
+            removed = apply_retention()
+        except Exception as exc:
+            logger.error("Volume retention failed: %s", exc)
+            return
+        if removed:
+            logger.info("Volume retention removed %s rows", removed)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+            self._maybe_apply_retention()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = Thread(target=self._run, name="volume-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def metrics(self) -> dict[str, float]:
+        with self._lock:
+            depth = len(self._queue)
+        return {
+            "queue_depth": depth,
+            "jobs_pending": len(self._jobs),
+            "jobs_run": self.jobs_run,
+            "job_errors": self.job_errors,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_seconds": self.last_flush_seconds,
+            "max_flush_seconds": self.max_flush_seconds,
+        }
+
+
+_WRITER: VolumeSampleWriter | None = None
+_WRITER_LOCK = Lock()
+
+
+def get_volume_writer() -> VolumeSampleWriter:
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = VolumeSampleWriter(
+                flush_seconds=settings.volume_flush_seconds,
+                max_batch=settings.volume_flush_max_rows,
+                max_queue=settings.volume_queue_max_rows,
+                retention_interval_seconds=settings.volume_retention_interval_seconds,
+            )
+        return _WRITER
+
+
+def _writer_metrics() -> dict[str, float]:
+    return _WRITER.metrics() if _WRITER is not None else {}
+
+
+def _writer_rows() -> list[tuple[dict[str, str], float]]:
+    metrics = _writer_metrics()
+    return [
+        ({"result": "written"}, metrics.get("rows_written", 0)),
+        ({"result": "dropped"}, metrics.get("rows_dropped", 0)),
+    ]
+
+
+def _writer_flushes() -> list[tuple[dict[str, str], float]]:
+    metrics = _writer_metrics()
+    return [({"result": "ok"}, metrics.get("flushes", 0)), ({"result": "error"}, metrics.get("flush_errors", 0))]
+
+
+register_collector(
+    "baby_monitor_volume_queue_depth",
+    "gauge",
+    "Volume samples waiting for the next flush.",
+    lambda: [({}, _writer_metrics().get("queue_depth", 0))],
+)
+register_collector(
+    "baby_monitor_volume_rows_total",
+    "counter",
+    "Volume samples written, or dropped because the queue was full.",
+    _writer_rows,
+)
+register_collector(
+    "baby_monitor_volume_flushes_total",
+    "counter",
+    "Volume sample flushes by result.",
+    _writer_flushes,
+)
@@ -0,0 +1,135 @@
+"""
+benchmarks/bench_detector.py
+
+Micro-benchmark for the RMS backends behind analyze_chunk, and for their
+per-frame form used by FrameDetector (chunks cut into AUDIO_FRAME_SECONDS
+hop frames; "usec/frame" is what auto backend selection compares).
+
+Usage:
+    python -m benchmarks.bench_detector [--seconds 0.02 0.1 0.5 1.0] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+from array import array
+import math
+import random
+import time
+from typing import Callable
+
+from backend.audio import detector
+from backend.config import settings
+
+
+def _make_chunk(frames: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    samples = array(
+        "h",
+        (
+            int(8000 * math.sin(2 * math.pi * 440 * i / settings.audio_sample_rate) + rng.randint(-500, 500))
+            for i in range(frames)
+        ),
+    )
+    return samples.tobytes()
+
+
+def _legacy_loop(buffer: bytes) -> float:
+    samples = array("h")
+    samples.frombytes(bytes(buffer))
+    return detector._rms_from_int16(samples)
+
+
+def _time_per_call(func: Callable[[bytes], object], chunk: bytes, repeat: int) -> float:
+    # Size the inner loop so every measurement runs ~50 ms.
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(chunk)
+        elapsed = time.perf_counter() - start
+        if elapsed >= 0.05:
+            break
+        loops *= 2
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(chunk)
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def run(chunk_seconds: list[float], repeat: int) -> list[dict]:
+    backends: dict[str, Callable[[bytes], float]] = {"loop": _legacy_loop}
+    for name in detector.available_backends():
+        backends[name] = detector.get_backend(name)
+
+    results = []
+    for seconds in chunk_seconds:
+        frames = max(1, int(settings.audio_sample_rate * seconds))
+        chunk = _make_chunk(frames)
+        baseline = None
+        for name, func in backends.items():
+            per_call = _time_per_call(func, chunk, repeat)
+            if baseline is None:
+                baseline = per_call
+            results.append(
+                {
+                    "backend": name,
+                    "chunk_seconds": seconds,
+                    "frames": frames,
+                    "usec_per_call": per_call * 1e6,
+                    "msamples_per_sec": frames / per_call / 1e6,
+                    "speedup": baseline / per_call,
+                }
+            )
+    return results
+
+
+def run_frames(chunk_seconds: list[float], repeat: int) -> list[dict]:
+    frame_samples = max(1, int(settings.audio_sample_rate * settings.audio_frame_seconds))
+    results = []
+    for seconds in chunk_seconds:
+        frames = max(1, int(settings.audio_sample_rate * seconds) // frame_samples)
+        chunk = _make_chunk(frames * frame_samples)
+        for name in detector.available_backends():
+            frame_rms = detector.get_frame_backend(name)
+            per_call = _time_per_call(lambda data: frame_rms(data, frame_samples), chunk, repeat)
+            results.append(
+                {
+                    "backend": name,
+                    "chunk_seconds": seconds,
+                    "frames": frames,
+                    "usec_per_call": per_call * 1e6,
+                    "usec_per_frame": per_call / frames * 1e6,
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[0.02, 0.1, 0.5, 1.0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"selected backend: {detector.BACKEND_NAME}")
+    print(f"{'backend':<8} {'chunk_s':>8} {'frames':>8} {'usec/call':>12} {'Msamples/s':>11} {'speedup':>8}")
+    for row in run(args.seconds, args.repeat):
+        print(
+            f"{row['backend']:<8} {row['chunk_seconds']:>8.3f} {row['frames']:>8d} "
+            f"{row['usec_per_call']:>12.1f} {row['msamples_per_sec']:>11.2f} {row['speedup']:>7.1f}x"
+        )
+    print()
+    print(f"per {settings.audio_frame_seconds * 1000:g} ms frame:")
+    print(f"{'backend':<8} {'chunk_s':>8} {'frames':>8} {'usec/call':>12} {'usec/frame':>11}")
+    for row in run_frames(args.seconds, args.repeat):
+        print(
+            f"{row['backend']:<8} {row['chunk_seconds']:>8.3f} {row['frames']:>8d} "
+            f"{row['usec_per_call']:>12.1f} {row['usec_per_frame']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
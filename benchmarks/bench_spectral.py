@@ -0,0 +1,65 @@
+"""
+benchmarks/bench_spectral.py
+
+Throughput of the spectral cry stage, expressed as real-time streams per core.
+
+Usage:
+    python -m benchmarks.bench_spectral [--chunk-seconds 0.5] [--audio-seconds 60]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np  # type: ignore
+
+from backend.audio.spectral import SpectralCryDetector
+from backend.config import settings
+
+
+def _cry_like(seconds: float, sample_rate: int) -> np.ndarray:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 420.0 * (1.0 + 0.05 * np.sin(2 * np.pi * 3.0 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    signal = sum((0.3 / k) * np.sin(k * phase) for k in range(1, 8))
+    return (np.clip(signal, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def run(chunk_seconds: float, audio_seconds: float) -> dict:
+    sample_rate = settings.audio_sample_rate
+    pcm = _cry_like(audio_seconds, sample_rate).tobytes()
+    chunk_bytes = int(chunk_seconds * sample_rate) * 2
+    chunks = [pcm[i : i + chunk_bytes] for i in range(0, len(pcm), chunk_bytes)]
+
+    detector = SpectralCryDetector(sample_rate, settings.audio_fft_size)
+    start = time.perf_counter()
+    for chunk in chunks:
+        detector.process(chunk)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "chunk_seconds": chunk_seconds,
+        "audio_seconds": audio_seconds,
+        "elapsed_seconds": elapsed,
+        "realtime_factor": audio_seconds / elapsed,
+        "cpu_percent_per_stream": 100.0 * elapsed / audio_seconds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("--chunk-seconds", type=float, default=settings.audio_chunk_seconds)
+    parser.add_argument("--audio-seconds", type=float, default=60.0)
+    args = parser.parse_args()
+
+    result = run(args.chunk_seconds, args.audio_seconds)
+    print(
+        f"fft={settings.audio_fft_size} chunk={result['chunk_seconds']}s: "
+        f"{result['realtime_factor']:.0f}x real time, "
+        f"{result['cpu_percent_per_stream']:.2f}% of a core per stream"
+    )
+
+
+if __name__ == "__main__":
+    main()
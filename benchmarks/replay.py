@@ -0,0 +1,221 @@
+"""
+benchmarks/replay.py
+
+Replay recorded or synthetic audio through detector -> cry state -> dispatcher, faster than real time.
+
+The pipeline is the one a live stream runs (FrameDetector, CryStateMachine,
+the dispatcher's due_candidates decision) but on the audio's own clock, so
+8 hours of audio replay in seconds and cooldowns behave as they would
+overnight. Nothing is written to the database: one in-memory notification
+candidate stands in for the users.
+
+Reports throughput (x real time) and, when cry labels are known, detector
+accuracy: per-frame precision/recall, cries caught, false alarms, onset
+latency and cry-onset-to-alert latency (the audio-time share of the live
+onset-to-send number at /api/metrics/latency). Labels come from the synthetic schedule or from --labels, a
+text file of "start end [name]" seconds per line (Audacity's label export).
+
+Usage:
+    python -m benchmarks.replay --synthetic-hours 8 [--seed 1]
+    python -m benchmarks.replay --file night.wav [--labels night.txt] [--speed 0]
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+import json
+from pathlib import Path
+import time
+
+from backend.audio.detector import FrameDetector
+from backend.audio.sources import AudioSource, FileSource, SyntheticSource
+from backend.audio.state import CryStateMachine
+from backend.config import settings
+from backend.metrics import LatencyRing
+from backend.notifications.dispatcher import NotificationCandidate, due_candidates
+
+
+# A fixed start keeps minute boundaries, and so results, reproducible.
+_REPLAY_EPOCH = datetime(2026, 1, 1, 20, 0, tzinfo=timezone.utc).timestamp()
+
+
+def load_labels(path: str | Path) -> list[tuple[float, float]]:
+    labels = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and not line.lstrip().startswith("#"):
+            labels.append((float(fields[0]), float(fields[1])))
+    return sorted(labels)
+
+
+class _AudioClock:
+    def __init__(self, start: float = _REPLAY_EPOCH) -> None:
+        self.start = start
+        self.offset = 0.0
+
+    def __call__(self) -> float:
+        return self.start + self.offset
+
+
+def _label_at(labels: list[tuple[float, float]], index: int, seconds: float) -> tuple[bool, int]:
+    # Labels are sorted and time only moves forward: keep a cursor.
+    while index < len(labels) and labels[index][1] <= seconds:
+        index += 1
+    return index < len(labels) and labels[index][0] <= seconds, index
+
+
+def run(
+    source: AudioSource,
+    labels: list[tuple[float, float]] | None = None,
+    threshold_seconds: int = 20,
+    cooldown_seconds: int | None = None,
+) -> dict:
+    clock = _AudioClock()
+    detector = FrameDetector()
+    machine = CryStateMachine("replay", clock=clock)
+    candidate = NotificationCandidate(
+        user_id=1,
+        email="replay@example.invalid",
+        threshold_seconds=threshold_seconds,
+        cooldown_seconds=cooldown_seconds or settings.notify_cooldown_seconds,
+        last_notified_at=None,
+    )
+    last_notified: dict[tuple[int, str], datetime] = {}
+    frame_seconds = detector.frame_bytes / 2 / source.sample_rate
+    threshold = settings.audio_volume_threshold
+
+    frames = 0
+    notifications = 0
+    crying_frames = 0
+    tp = fp = fn = 0
+    label_index = 0
+    # label index -> audio time of the first crying frame inside it
+    first_hit: dict[int, float] = {}
+    false_alarms = 0
+    # label index -> audio time of its first notification
+    first_alert: dict[int, float] = {}
+    was_crying = False
+    cry_minutes_peak = 0
+
+    started = time.perf_counter()
+    for chunk in source.chunks():
+        state = None
+        for crying, level, confidence in detector.feed(chunk):
+            clock.offset = frames * frame_seconds
+            state = machine.update(crying, volume=level, threshold=threshold, confidence=confidence)
+            frames += 1
+            if state.is_crying:
+                crying_frames += 1
+            if labels is not None:
+                truth, label_index = _label_at(labels, label_index, clock.offset)
+                if state.is_crying and truth:
+                    tp += 1
+                    first_hit.setdefault(label_index, clock.offset)
+                elif state.is_crying:
+                    fp += 1
+                    if not was_crying:
+                        false_alarms += 1
+                elif truth:
+                    fn += 1
+            was_crying = state.is_crying
+        if state is None:
+            continue
+        cry_minutes_peak = max(cry_minutes_peak, state.effective_cry_minutes)
+        now = datetime.fromtimestamp(clock(), tz=timezone.utc)
+        for due in due_candidates(state, (candidate,), now, last_notified):
+            last_notified[(due.user_id, state.stream_id)] = now
+            notifications += 1
+            if labels is not None and label_index < len(labels) and labels[label_index][0] <= clock.offset:
+                first_alert.setdefault(label_index, clock.offset)
+    elapsed = time.perf_counter() - started
+
+    audio_seconds = frames * frame_seconds
+    result = {
+        "source": source.describe(),
+        "audio_seconds": audio_seconds,
+        "elapsed_seconds": elapsed,
+        "realtime_factor": audio_seconds / elapsed if elapsed > 0 else 0.0,
+        "frames": frames,
+        "frames_per_second": frames / elapsed if elapsed > 0 else 0.0,
+        "crying_seconds": crying_frames * frame_seconds,
+        "peak_effective_cry_minutes": cry_minutes_peak,
+        "notifications": notifications,
+    }
+    if labels is not None:
+        latencies = [hit - labels[index][0] for index, hit in first_hit.items()]
+        alert_latency = LatencyRing(max(1, len(first_alert)))
+        for index, alerted in first_alert.items():
+            alert_latency.observe(alerted - labels[index][0])
+        result.update(
+            {
+                "labelled_cries": len(labels),
+                "cries_caught": len(first_hit),
+                "false_alarms": false_alarms,
+                "frame_precision": tp / (tp + fp) if tp + fp else 1.0,
+                "frame_recall": tp / (tp + fn) if tp + fn else 1.0,
+                "mean_onset_latency_seconds": sum(latencies) / len(latencies) if latencies else None,
+                "cries_alerted": len(first_alert),
+                "onset_to_alert_seconds": alert_latency.percentiles(),
+            }
+        )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--file", help="WAV or raw int16 PCM file to replay")
+    group.add_argument("--synthetic-hours", type=float, help="generate this many hours of audio")
+    parser.add_argument("--labels", help="cry labels for --file: 'start end' seconds per line")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--speed", type=float, default=0.0, help="x real time; 0 = as fast as possible")
+    # Replay is not bound by capture latency: big chunks amortise per-chunk work.
+    parser.add_argument("--chunk-seconds", type=float, default=1.0)
+    parser.add_argument("--threshold-seconds", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    chunk_frames = max(1, int(settings.audio_sample_rate * args.chunk_seconds))
+    labels = None
+    if args.file:
+        source: AudioSource = FileSource(args.file, speed=args.speed, chunk_frames=chunk_frames)
+        if args.labels:
+            labels = load_labels(args.labels)
+    else:
+        synthetic = SyntheticSource(
+            args.synthetic_hours * 3600.0, seed=args.seed, speed=args.speed, chunk_frames=chunk_frames
+        )
+        source, labels = synthetic, synthetic.labels
+
+    result = run(source, labels, threshold_seconds=args.threshold_seconds)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(
+        f"{result['source']}: {result['audio_seconds'] / 3600:.2f} h of audio in "
+        f"{result['elapsed_seconds']:.1f} s ({result['realtime_factor']:.0f}x real time, "
+        f"{result['frames_per_second']:.0f} frames/s)"
+    )
+    print(
+        f"crying {result['crying_seconds']:.0f} s, peak {result['peak_effective_cry_minutes']} effective "
+        f"minutes, {result['notifications']} notification(s)"
+    )
+    if labels is not None:
+        latency = result["mean_onset_latency_seconds"]
+        print(
+            f"caught {result['cries_caught']}/{result['labelled_cries']} cries, "
+            f"{result['false_alarms']} false alarm(s), frame precision {result['frame_precision']:.3f}, "
+            f"recall {result['frame_recall']:.3f}, onset latency "
+            f"{'n/a' if latency is None else f'{latency:.2f} s'}"
+        )
+        alert = result["onset_to_alert_seconds"]
+        if alert["p50"] is not None:
+            print(
+                f"alerted {result['cries_alerted']}/{result['labelled_cries']} cries, onset to alert "
+                f"p50 {alert['p50']:.1f} s, p90 {alert['p90']:.1f} s, max {alert['max']:.1f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+benchmarks/suite.py
+
+Hot-path benchmark suite with JSON baselines: detector, state, dispatcher, pipeline, HTTP and auth.
+
+Each benchmark times one operation, sizing its inner loop so a round takes
+~50 ms, and keeps the best of --repeat rounds (the least disturbed by the
+rest of the system). Groups:
+- detector:   analyze_chunk and FrameDetector.feed on one capture chunk
+- state:      CryStateMachine.update (no listeners attached)
+- dispatcher: due_candidates over 100 users; evaluate_notifications with
+              nobody due (the per-frame steady state)
+- pipeline:   one capture chunk through app._build_audio_callback(), with
+              the listeners create_app() registers
+- http:       /api/status (200 and 304), /api/volume and /api/events via
+              Flask's test client against create_app()
+- auth:       verify_token and an authenticated GET /api/settings, each
+              with the verified-token cache and with it cleared per call
+              (the path every request took before the cache)
+
+Results are compared with the baseline JSON. A benchmark slower than
+baseline * (1 + tolerance) is a regression and the run exits with status 1.
+--save (or a missing baseline) stores this run as the new baseline.
+Baselines are only comparable on the same machine; a mismatch is reported.
+
+The suite runs against a scratch database with audio capture and FCM off.
+
+Usage:
+    python -m benchmarks.suite [--only detector state] [--tolerance 0.25] [--save]
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+# Point settings at scratch resources before backend.config is imported.
+_SCRATCH_DIR = tempfile.mkdtemp(prefix="baby-monitor-bench-")
+os.environ["DATABASE_PATH"] = os.path.join(_SCRATCH_DIR, "bench.sqlite3")
+os.environ["AUDIO_ENABLED"] = "0"
+os.environ["FCM_ENABLED"] = "0"
+os.environ["STATE_SNAPSHOT_SECONDS"] = "0"
+
+import argparse  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+import json  # noqa: E402
+from pathlib import Path  # noqa: E402
+import platform  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from typing import Callable  # noqa: E402
+
+from backend.config import settings  # noqa: E402
+from benchmarks.bench_detector import _make_chunk  # noqa: E402
+
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+GROUPS = ("detector", "state", "dispatcher", "pipeline", "http", "auth")
+
+Setup = Callable[[], Callable[[], object]]
+_BENCHMARKS: list[tuple[str, Setup]] = []
+_APP = None
+
+
+def _benchmark(name: str) -> Callable[[Setup], Setup]:
+    """
+    Register `setup`, which prepares state and returns the operation to time.
+    """
+
+    def register(setup: Setup) -> Setup:
+        _BENCHMARKS.append((name, setup))
+        return setup
+
+    return register
+
+
+def _time_per_call(func: Callable[[], object], repeat: int) -> float:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= 0.05:
+            break
+        loops *= 2
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def _capture_chunk() -> bytes:
+    return _make_chunk(max(1, int(settings.audio_sample_rate * settings.audio_chunk_seconds)))
+
+
+def _seed_users(count: int) -> None:
+    from backend.database import execute_many, init_db, query_one
+    from backend.notifications.dispatcher import invalidate_candidates
+
+    init_db()
+    if query_one("SELECT 1 FROM users LIMIT 1"):
+        return
+    execute_many(
+        "INSERT INTO users (id, email, password_hash) VALUES (?, ?, 'x')",
+        [(i, f"bench{i}@example.invalid") for i in range(1, count + 1)],
+    )
+    # Thresholds nobody reaches: every evaluation is a "nobody due" pass.
+    execute_many(
+        "INSERT INTO notification_settings (user_id, threshold_seconds, cooldown_seconds) VALUES (?, 86400, 60)",
+        [(i,) for i in range(1, count + 1)],
+    )
+    invalidate_candidates()
+
+
+def _app():
+    global _APP
+    if _APP is None:
+        from backend.app import create_app
+
+        _seed_users(100)
+        _APP = create_app()
+    return _APP
+
+
+@_benchmark("detector.analyze_chunk")
+def _analyze_chunk() -> Callable[[], object]:
+    from backend.audio.detector import analyze_chunk
+
+    chunk = _capture_chunk()
+    return lambda: analyze_chunk(chunk)
+
+
+@_benchmark("detector.frame_feed")
+def _frame_feed() -> Callable[[], object]:
+    from backend.audio.detector import FrameDetector
+
+    detector = FrameDetector()
+    chunk = _capture_chunk()
+    return lambda: detector.feed(chunk)
+
+
+@_benchmark("state.update")
+def _state_update() -> Callable[[], object]:
+    from backend.audio.state import CryStateMachine
+
+    machine = CryStateMachine("bench-state")
+    return lambda: machine.update(True, volume=0.2, threshold=0.1, confidence=0.9)
+
+
+@_benchmark("dispatcher.due_candidates")
+def _due_candidates() -> Callable[[], object]:
+    from backend.audio.state import CryStateMachine
+    from backend.notifications.dispatcher import NotificationCandidate, due_candidates
+
+    state = CryStateMachine("bench-dispatch").update(True, volume=0.2, threshold=0.1)
+    candidates = [
+        NotificationCandidate(i, f"bench{i}@example.invalid", 86400, 60, None) for i in range(1, 101)
+    ]
+    now = datetime.now(timezone.utc)
+    return lambda: due_candidates(state, candidates, now, {})
+
+
+@_benchmark("dispatcher.evaluate_nobody_due")
+def _evaluate_nobody_due() -> Callable[[], object]:
+    from backend.audio.state import CryStateMachine
+    from backend.notifications.dispatcher import evaluate_notifications
+
+    _seed_users(100)
+    state = CryStateMachine("bench-dispatch").update(True, volume=0.2, threshold=0.1)
+    evaluate_notifications(state)
+    return lambda: evaluate_notifications(state)
+
+
+@_benchmark("pipeline.audio_callback")
+def _audio_callback() -> Callable[[], object]:
+    from backend.app import _build_audio_callback
+
+    _app()
+    callback = _build_audio_callback("bench-pipeline")
+    chunk = memoryview(_capture_chunk())
+    return lambda: callback(chunk)
+
+
+@_benchmark("http.status")
+def _http_status() -> Callable[[], object]:
+    client = _app().test_client()
+    return lambda: client.get("/api/status")
+
+
+@_benchmark("http.status_not_modified")
+def _http_status_not_modified() -> Callable[[], object]:
+    client = _app().test_client()
+    etag = client.get("/api/status").headers["ETag"]
+    return lambda: client.get("/api/status", headers={"If-None-Match": etag})
+
+
+@_benchmark("http.volume")
+def _http_volume() -> Callable[[], object]:
+    client = _app().test_client()
+    return lambda: client.get("/api/volume?minutes=15")
+
+
+@_benchmark("http.events")
+def _http_events() -> Callable[[], object]:
+    client = _app().test_client()
+    return lambda: client.get("/api/events?limit=50")
+
+
+def _bench_token() -> str:
+    from backend.auth.auth_utils import create_token
+
+    _app()
+    return create_token({"sub": 1, "email": "bench1@example.invalid"})
+
+
+@_benchmark("auth.verify_token")
+def _verify_token() -> Callable[[], object]:
+    from backend.auth.auth_utils import verify_token
+
+    token = _bench_token()
+    return lambda: verify_token(token)
+
+
+@_benchmark("auth.verify_token_uncached")
+def _verify_token_uncached() -> Callable[[], object]:
+    from backend.auth.auth_utils import clear_token_cache, verify_token
+
+    token = _bench_token()
+    return lambda: (clear_token_cache(), verify_token(token))
+
+
+@_benchmark("auth.http_settings")
+def _http_settings() -> Callable[[], object]:
+    client = _app().test_client()
+    headers = {"Authorization": f"Bearer {_bench_token()}"}
+    return lambda: client.get("/api/settings", headers=headers)
+
+
+@_benchmark("auth.http_settings_uncached")
+def _http_settings_uncached() -> Callable[[], object]:
+    from backend.auth.auth_utils import clear_token_cache
+
+    client = _app().test_client()
+    headers = {"Authorization": f"Bearer {_bench_token()}"}
+    return lambda: (clear_token_cache(), client.get("/api/settings", headers=headers))
+
+
+def _machine() -> dict[str, str]:
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "sample_rate": str(settings.audio_sample_rate),
+        "chunk_seconds": str(settings.audio_chunk_seconds),
+    }
+
+
+def run(groups: tuple[str, ...], repeat: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for name, setup in _BENCHMARKS:
+        if name.split(".", 1)[0] not in groups:
+            continue
+        per_call = _time_per_call(setup(), repeat)
+        results[name] = {"usec_per_op": per_call * 1e6, "ops_per_sec": 1.0 / per_call}
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], tolerance: float
+) -> list[dict]:
+    rows = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        change = None if before is None else result["usec_per_op"] / before["usec_per_op"] - 1.0
+        rows.append(
+            {
+                "name": name,
+                "usec_per_op": result["usec_per_op"],
+                "baseline_usec_per_op": None if before is None else before["usec_per_op"],
+                "change": change,
+                "regressed": change is not None and change > tolerance,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--output", type=Path, help="also write this run's results here")
+    args = parser.parse_args()
+
+    results = run(tuple(args.only), args.repeat)
+    document = {
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        "machine": _machine(),
+        "results": results,
+    }
+
+    baseline_doc = None
+    if args.baseline.exists():
+        baseline_doc = json.loads(args.baseline.read_text(encoding="utf-8"))
+    baseline = baseline_doc["results"] if baseline_doc else {}
+    if baseline_doc and baseline_doc.get("machine") != document["machine"]:
+        print(f"warning: baseline was recorded on {baseline_doc.get('machine')}; timings may not compare")
+
+    rows = compare(results, baseline, args.tolerance)
+    print(f"{'benchmark':<32} {'usec/op':>10} {'baseline':>10} {'change':>8}")
+    for row in rows:
+        before = "-" if row["baseline_usec_per_op"] is None else f"{row['baseline_usec_per_op']:.1f}"
+        change = "-" if row["change"] is None else f"{row['change'] * 100:+.1f}%"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['name']:<32} {row['usec_per_op']:>10.1f} {before:>10} {change:>8}{flag}")
+
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    if args.save or baseline_doc is None:
+        # Keep baseline entries of groups this run skipped, if they are comparable.
+        same_machine = baseline_doc is not None and baseline_doc.get("machine") == document["machine"]
+        merged = {**baseline, **results} if same_machine else results
+        args.baseline.write_text(json.dumps({**document, "results": merged}, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+
+    regressions = [row["name"] for row in rows if row["regressed"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
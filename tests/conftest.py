@@ -0,0 +1,15 @@
+"""
+tests/conftest.py
+
+Settings are read once at import: point the database at a scratch
+directory before any backend module is imported.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="baby-monitor-tests-"), "test.sqlite3")
+os.environ["AUDIO_ENABLED"] = "0"
+os.environ["FCM_ENABLED"] = "0"
@@ -0,0 +1,66 @@
+"""
+tests/test_cry_events.py
+
+Cry sessions are written by the background writer, not the state listener.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from backend import cry_events
+from backend.database import init_db, query_all
+from backend.volume_writer import VolumeSampleWriter
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    init_db()
+    # Not started: jobs only run when the test flushes.
+    background = VolumeSampleWriter(flush_seconds=60.0, max_batch=100, max_queue=1000)
+    monkeypatch.setattr(cry_events, "get_volume_writer", lambda: background)
+    return background
+
+
+def _state(started_at: datetime | None, last_cry_at: datetime | None = None) -> SimpleNamespace:
+    return SimpleNamespace(cry_session_started_at=started_at, last_cry_at=last_cry_at)
+
+
+def _event(event_id: int):
+    rows = query_all("SELECT stream_id, ended_at, duration_seconds FROM cry_events WHERE id = ?", (event_id,))
+    return rows[0] if rows else None
+
+
+def test_session_rows_are_written_off_the_listener(writer):
+    recorder = cry_events._SessionRecorder("events-test")
+    started_at = datetime(2027, 1, 5, 3, 0, tzinfo=timezone.utc)
+
+    recorder.on_state(_state(started_at))
+    event_id = recorder.event_id
+    assert event_id is not None
+    assert _event(event_id) is None
+
+    writer.flush()
+    row = _event(event_id)
+    assert row["stream_id"] == "events-test" and row["ended_at"] is None
+
+    recorder.on_state(_state(None, last_cry_at=started_at + timedelta(seconds=95)))
+    assert _event(event_id)["ended_at"] is None
+    writer.flush()
+    assert _event(event_id)["duration_seconds"] == 95
+    daily = query_all("SELECT session_count, cry_seconds FROM cry_daily WHERE stream_id = 'events-test'")
+    assert [tuple(row) for row in daily] == [(1, 95)]
+
+
+def test_event_ids_are_not_reused(writer):
+    recorder = cry_events._SessionRecorder("events-ids")
+    started_at = datetime(2027, 1, 6, 3, 0, tzinfo=timezone.utc)
+    recorder.on_state(_state(started_at))
+    first = recorder.event_id
+    recorder.on_state(_state(started_at + timedelta(minutes=5), last_cry_at=started_at + timedelta(seconds=10)))
+    assert recorder.event_id == first + 1
+    writer.flush()
+    assert _event(first) is not None and _event(first + 1) is not None
@@ -0,0 +1,71 @@
+"""
+tests/test_detector.py
+
+Frame detection: RMS backends agree, frames are cut across chunk borders.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from backend.audio import detector
+from benchmarks.bench_detector import _make_chunk
+
+
+_FRAME_SAMPLES = 441
+
+
+@pytest.mark.parametrize("name", detector.available_backends())
+def test_frame_backend_matches_scalar_rms(name):
+    # Five frames plus a torn sample: the partial frame is ignored.
+    chunk = _make_chunk(_FRAME_SAMPLES * 5 + 100) + b"\x01"
+    rms = detector.get_backend("array")
+    frame_bytes = _FRAME_SAMPLES * 2
+    expected = [rms(chunk[offset : offset + frame_bytes]) for offset in range(0, frame_bytes * 5, frame_bytes)]
+    levels = detector.get_frame_backend(name)(chunk, _FRAME_SAMPLES)
+    assert levels == pytest.approx(expected, rel=1e-3)
+
+
+def test_frame_detector_carries_partial_frames():
+    frame_detector = detector.FrameDetector(frame_seconds=_FRAME_SAMPLES / detector.settings.audio_sample_rate)
+    chunk = _make_chunk(_FRAME_SAMPLES * 4)
+    # 1.5 + 2.5 frames: the half frame of the first chunk completes in the second.
+    split = _FRAME_SAMPLES * 3
+    first = frame_detector.feed(chunk[:split])
+    second = frame_detector.feed(chunk[split:])
+    whole = detector.FrameDetector(frame_seconds=_FRAME_SAMPLES / detector.settings.audio_sample_rate).feed(chunk)
+    assert len(first) == 1 and len(second) == 3
+    assert [level for _crying, level, _confidence in first + second] == pytest.approx(
+        [level for _crying, level, _confidence in whole]
+    )
+
+
+def _process_detector() -> detector.ProcessFrameDetector:
+    return detector.ProcessFrameDetector(frame_seconds=_FRAME_SAMPLES / detector.settings.audio_sample_rate)
+
+
+def test_process_detector_restarts_a_killed_worker():
+    process_detector = _process_detector()
+    chunk = _make_chunk(_FRAME_SAMPLES * 2)
+    try:
+        assert len(process_detector.feed(chunk)) == 2
+        first = process_detector._process
+        first.kill()
+        first.join()
+        assert len(process_detector.feed(chunk)) == 2
+        assert process_detector.restarts == 1
+        assert process_detector._process is not first and process_detector._process.is_alive()
+    finally:
+        process_detector.close()
+
+
+def test_process_detector_falls_back_in_process(monkeypatch):
+    monkeypatch.setattr(detector.ProcessFrameDetector, "MAX_RESTARTS", 0)
+    process_detector = _process_detector()
+    chunk = _make_chunk(_FRAME_SAMPLES * 2)
+    process_detector._process.kill()
+    process_detector._process.join()
+    assert len(process_detector.feed(chunk)) == 2
+    assert process_detector._fallback is not None
+    assert len(process_detector.feed(chunk)) == 2
+    process_detector.close()
@@ -0,0 +1,52 @@
+"""
+tests/test_dispatcher.py
+
+Alert thresholds against the crying the detector actually reported.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from backend.audio.state import CryStateMachine
+from backend.notifications.dispatcher import NotificationCandidate, due_candidates, effective_cry_seconds
+
+
+_FRAME = 0.02
+_START = 1_800_000_000.0  # on a minute boundary
+_CANDIDATE = NotificationCandidate(
+    user_id=1, email="parent@example.invalid", threshold_seconds=20, cooldown_seconds=300, last_notified_at=None
+)
+
+
+def _feed(machine: CryStateMachine, start: float, seconds: float, loud: bool):
+    state = None
+    for index in range(round(seconds / _FRAME)):
+        volume = 1.0 if loud else 0.0
+        state = machine.update(False, volume=volume, threshold=0.5, captured_at=start + index * _FRAME)
+    return state
+
+
+def _due(state) -> bool:
+    now = datetime.fromtimestamp(_START + 30, tz=timezone.utc)
+    return bool(due_candidates(state, [_CANDIDATE], now, {}))
+
+
+def test_short_noises_do_not_add_up_to_a_threshold():
+    machine = CryStateMachine("test")
+    _feed(machine, _START, 0.08, loud=True)
+    _feed(machine, _START + 0.08, 20.0, loud=False)
+    state = _feed(machine, _START + 20.08, 0.08, loud=True)
+    # The session has been open for 20 s, but only a few seconds were crying.
+    assert state.cry_session_started_at is not None
+    assert effective_cry_seconds(state) < 5
+    assert not _due(state)
+
+
+def test_sustained_crying_reaches_threshold_within_the_minute():
+    machine = CryStateMachine("test")
+    state = _feed(machine, _START, 19.0, loud=True)
+    assert not _due(state)
+    state = _feed(machine, _START + 19.0, 2.0, loud=True)
+    assert 20 <= effective_cry_seconds(state) < 22
+    assert _due(state)
@@ -0,0 +1,156 @@
+"""
+tests/test_outbox.py
+
+Notification outbox delivery and retries against a scripted push pool.
+"""
+
+from __future__ import annotations
+
+from dataclasses import replace
+from datetime import datetime, timezone
+import time
+
+import pytest
+
+from backend.database import execute, init_db, query_all, transaction
+from backend.metrics import render
+from backend.notifications import outbox, push
+
+
+class ScriptedPool:
+    """
+    Push pool stand-in: tokens in `failing` are reported undelivered, the
+    rest delivered, synchronously. With `hang` set jobs are accepted and
+    never reported, as when the process dies mid-send.
+    """
+
+    def __init__(self) -> None:
+        self.failing: set[str] = set()
+        self.hang = False
+        self.jobs: list[list[str]] = []
+
+    def submit(self, tokens, title, body, on_done=None) -> bool:
+        self.jobs.append(list(tokens))
+        if self.hang:
+            return True
+        undelivered = [token for token in tokens if token in self.failing]
+        on_done(undelivered, [token for token in tokens if token not in self.failing])
+        return True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    init_db()
+    execute("DELETE FROM notification_outbox")
+    execute("DELETE FROM notification_deliveries")
+    execute("DELETE FROM device_tokens WHERE user_id = 10")
+    execute("INSERT OR IGNORE INTO users (id, email, password_hash) VALUES (10, 'outbox@example.invalid', 'x')")
+    execute("INSERT INTO device_tokens (user_id, token) VALUES (10, 'phone'), (10, 'tablet')")
+    # Retries are due at once.
+    monkeypatch.setattr(
+        outbox,
+        "settings",
+        replace(outbox.settings, fcm_enabled=True, push_backoff_seconds=0.0, push_backoff_max_seconds=0.0),
+    )
+    scripted = ScriptedPool()
+    monkeypatch.setattr(push, "get_push_pool", lambda: scripted)
+    return scripted
+
+
+def _drainer(**overrides) -> outbox.OutboxDrainer:
+    options = {"poll_seconds": 1.0, "batch_size": 10, "max_attempts": 3, "max_age_seconds": 0, "retention_days": 7}
+    options.update(overrides)
+    return outbox.OutboxDrainer(**options)
+
+
+def _enqueue() -> None:
+    with transaction() as db:
+        outbox.enqueue(db, [10], "Baby is crying", "Crying for 1 minute.", datetime.now(timezone.utc), "nursery")
+
+
+def _rows() -> list:
+    return query_all("SELECT attempts, delivered_at, failed_at, latency_seconds FROM notification_outbox")
+
+
+def test_partial_failure_retries_only_undelivered_tokens(pool):
+    _enqueue()
+    drainer = _drainer()
+    pool.failing = {"tablet"}
+    assert drainer.drain_once() == 1
+    assert sorted(pool.jobs[0]) == ["phone", "tablet"]
+    row = _rows()[0]
+    assert row["delivered_at"] is None and row["attempts"] == 1
+    # The phone got it: latency is recorded once, at the first delivery.
+    first_latency = row["latency_seconds"]
+    assert first_latency is not None
+
+    pool.failing = set()
+    assert drainer.drain_once() == 1
+    assert pool.jobs[1] == ["tablet"]
+    row = _rows()[0]
+    assert row["delivered_at"] is not None
+    assert row["latency_seconds"] == first_latency
+    assert query_all("SELECT * FROM notification_deliveries") == []
+
+
+def test_row_whose_devices_were_all_reached_is_completed_without_a_push(pool):
+    _enqueue()
+    drainer = _drainer()
+    pool.failing = {"tablet"}
+    drainer.drain_once()
+    # The tablet is unregistered before the retry; only the phone is left, and it already has the alert.
+    execute("DELETE FROM device_tokens WHERE token = 'tablet'")
+    assert drainer.drain_once() == 1
+    assert len(pool.jobs) == 1
+    assert _rows()[0]["delivered_at"] is not None
+
+
+def test_restarted_drainer_replays_rows_lost_in_a_crash(pool):
+    _enqueue()
+    _enqueue()
+    crashed = _drainer()
+    pool.failing = {"tablet"}
+    crashed.drain_once()
+    # The process dies with the retries handed to the push pool: no callback ever reports back.
+    pool.hang = True
+    assert crashed.drain_once() == 2
+
+    pool.hang = False
+    pool.failing = set()
+    pool.jobs.clear()
+    restarted = _drainer(poll_seconds=0.05)
+    restarted.start()
+    try:
+        assert restarted.replayed == 2
+        deadline = time.monotonic() + 5
+        while any(row["delivered_at"] is None for row in _rows()) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        restarted.stop()
+    assert all(row["delivered_at"] is not None for row in _rows())
+    # Only the tablet still needed the alerts (one shared multicast); the phone is not pushed twice.
+    assert pool.jobs == [["tablet"]]
+
+
+def test_gives_up_after_max_attempts(pool):
+    _enqueue()
+    drainer = _drainer(max_attempts=2)
+    pool.failing = {"phone", "tablet"}
+    drainer.drain_once()
+    drainer.drain_once()
+    assert drainer.drain_once() == 0
+    row = _rows()[0]
+    assert row["failed_at"] is not None and row["attempts"] == 2
+    assert row["latency_seconds"] is None
+
+
+def test_drainer_counters_are_exported(pool, monkeypatch):
+    drainer = _drainer()
+    monkeypatch.setattr(outbox, "_DRAINER", drainer)
+    _enqueue()
+    drainer.notify()
+    drainer.drain_once()
+    text = render()
+    assert 'baby_monitor_outbox_rows{state="pending"} 0' in text
+    assert 'baby_monitor_outbox_rows_total{result="delivered"} 1' in text
+    assert "baby_monitor_outbox_delivered_per_second " in text
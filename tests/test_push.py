@@ -0,0 +1,177 @@
+"""
+tests/test_push.py
+
+FCM push sender against a local stub server (http.server in a thread).
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from threading import Lock, Thread
+import time
+
+import pytest
+
+from backend.database import execute, init_db, query_all
+from backend.notifications import push
+
+
+class FcmStub:
+    """
+    Answers legacy FCM multicast requests.
+
+    `script` holds per-request overrides, used in order: "drop" closes the
+    connection without answering, (status, headers) answers with that
+    status. `token_errors` maps a token to the errors it gets on successive
+    requests; tokens without one succeed.
+    """
+
+    def __init__(self) -> None:
+        self.script: deque = deque()
+        self.token_errors: dict[str, list[str]] = {}
+        # (client port, registration_ids) per request that reached the handler
+        self.requests: list[tuple[int, list[str]]] = []
+        self._lock = Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                tokens = payload["registration_ids"]
+                with stub._lock:
+                    stub.requests.append((self.client_address[1], tokens))
+                    action = stub.script.popleft() if stub.script else None
+                if action == "drop":
+                    self.close_connection = True
+                    return
+                if action is not None:
+                    status, headers = action
+                    self._reply(status, b"", headers)
+                    return
+                results = []
+                for token in tokens:
+                    errors = stub.token_errors.get(token)
+                    if errors:
+                        results.append({"error": errors.pop(0)})
+                    else:
+                        results.append({"message_id": f"m-{token}"})
+                self._reply(200, json.dumps({"results": results}).encode("utf-8"))
+
+            def _reply(self, status: int, body: bytes, headers: dict[str, str] | None = None) -> None:
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/fcm/send"
+
+    def connections(self) -> int:
+        return len({port for port, _tokens in self.requests})
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = FcmStub()
+    server.thread.start()
+    monkeypatch.setattr(
+        push, "settings", replace(push.settings, fcm_endpoint=server.url, fcm_server_key="test-key")
+    )
+    yield server
+    push._drop_connection()
+    server.server.shutdown()
+    server.server.server_close()
+
+
+def _pool(**overrides) -> push.PushPool:
+    options = {
+        "workers": 1,
+        "max_queue": 10,
+        "max_attempts": 3,
+        "backoff_seconds": 0.001,
+        "backoff_max_seconds": 0.01,
+    }
+    options.update(overrides)
+    return push.PushPool(**options)
+
+
+def test_keep_alive_reuses_one_connection(stub):
+    for _ in range(5):
+        result = push.send_multicast(["a", "b"], "t", "b")
+        assert result.sent == 2
+    assert len(stub.requests) == 5
+    assert stub.connections() == 1
+
+
+def test_reconnects_after_remote_disconnect(stub):
+    stub.script.append("drop")
+    result = push.send_multicast(["a"], "t", "b")
+    assert result.delivered == ["a"]
+    assert len(stub.requests) == 2
+    assert stub.connections() == 2
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_after_throttling_honouring_retry_after(stub, status):
+    stub.script.append((status, {"Retry-After": "0.2"}))
+    pool = _pool()
+    started = time.monotonic()
+    undelivered, delivered = pool._deliver(["a", "b"], "t", "b")
+    assert time.monotonic() - started >= 0.2
+    assert undelivered == []
+    assert delivered == ["a", "b"]
+    assert pool.retries == 1
+    assert [tokens for _port, tokens in stub.requests] == [["a", "b"], ["a", "b"]]
+
+
+def test_retries_only_unavailable_tokens(stub):
+    stub.token_errors["b"] = ["Unavailable"]
+    pool = _pool()
+    undelivered, delivered = pool._deliver(["a", "b", "c"], "t", "b")
+    assert undelivered == []
+    assert sorted(delivered) == ["a", "b", "c"]
+    assert [tokens for _port, tokens in stub.requests] == [["a", "b", "c"], ["b"]]
+    assert pool.sent == 3
+
+
+def test_prunes_not_registered_tokens(stub):
+    init_db()
+    execute("INSERT OR IGNORE INTO users (id, email, password_hash) VALUES (1, 'push@example.invalid', 'x')")
+    execute("INSERT INTO device_tokens (user_id, token) VALUES (1, 'dead'), (1, 'alive')")
+    stub.token_errors["dead"] = ["NotRegistered"]
+    pool = _pool()
+    undelivered, delivered = pool._deliver(["dead", "alive"], "t", "b")
+    assert undelivered == []
+    assert delivered == ["alive"]
+    assert pool.pruned == 1
+    assert len(stub.requests) == 1
+    remaining = [row["token"] for row in query_all("SELECT token FROM device_tokens WHERE user_id = 1")]
+    assert remaining == ["alive"]
+
+
+def test_full_queue_reports_batch_as_undelivered(monkeypatch):
+    pool = _pool(max_queue=1)
+    # No workers: the first job stays queued and fills the queue.
+    monkeypatch.setattr(pool, "start", lambda: None)
+    calls = []
+    assert pool.submit(["a"], "t", "b", on_done=lambda *args: calls.append(args))
+    assert not pool.submit(["b", "c"], "t", "b", on_done=lambda *args: calls.append(args))
+    assert calls == [(["b", "c"], [])]
+    assert pool.dropped == 2
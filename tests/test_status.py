@@ -0,0 +1,52 @@
+"""
+tests/test_status.py
+
+/api/status ETags while audio frames keep arriving.
+"""
+
+from __future__ import annotations
+
+from dataclasses import replace
+
+from flask import Flask
+import pytest
+
+from backend.api import status
+from backend.audio import state as cry_state
+
+
+_STREAM = "status-test"
+_START = 1_800_000_000.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(status, "settings", replace(status.settings, audio_streams=((_STREAM, None),)))
+    app = Flask(__name__)
+    status.register_routes(app)
+    return app.test_client()
+
+
+def _feed(frames: int, volume: float, start: float) -> None:
+    for index in range(frames):
+        cry_state.update(False, volume=volume, threshold=0.5, stream_id=_STREAM, captured_at=start + index * 0.02)
+
+
+def test_steady_frames_keep_the_etag(client):
+    _feed(200, 0.1, _START)
+    first = client.get("/api/status")
+    etag = first.headers["ETag"]
+    _feed(200, 0.1, _START + 4)
+    again = client.get("/api/status", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+
+def test_visible_change_moves_the_etag(client):
+    _feed(200, 0.1, _START + 10)
+    etag = client.get("/api/status").headers["ETag"]
+    _feed(200, 0.2, _START + 14)
+    response = client.get("/api/status", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["volume_level"] == 0.2
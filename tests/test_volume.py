@@ -0,0 +1,92 @@
+"""
+tests/test_volume.py
+
+/api/volume reads: `since` cursor paging and rollup buckets.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import volume_history
+from backend.database import execute, init_db
+from backend.volume_writer import VolumeSampleWriter
+
+
+@pytest.fixture
+def writer():
+    init_db()
+    execute("DELETE FROM volume_samples")
+    execute("DELETE FROM volume_rollups")
+    return VolumeSampleWriter(flush_seconds=60.0, max_batch=1000, max_queue=10_000)
+
+
+def _write(writer: VolumeSampleWriter, stream_id: str, start: datetime, levels: list[float]) -> None:
+    for offset, level in enumerate(levels):
+        writer.add(start + timedelta(seconds=offset), level, stream_id)
+    writer.flush()
+
+
+def _poll(stream_id: str, since: int) -> tuple[list[dict], int]:
+    resolution, samples, cursor = volume_history.load_samples(15, since=since, stream_id=stream_id)
+    assert resolution == 0
+    return samples, cursor
+
+
+def test_cursor_pages_have_no_duplicates_or_gaps(writer, monkeypatch):
+    monkeypatch.setattr(volume_history, "_MAX_RAW_ROWS", 7)
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    _write(writer, "nursery", start, [0.01 * i for i in range(10)])
+    _resolution, first, cursor = volume_history.load_samples(15, stream_id="nursery")
+    seen = [sample["rms"] for sample in first]
+
+    # Another stream writes in between; its rows share the id sequence.
+    _write(writer, "nursery", start + timedelta(seconds=10), [0.5 + 0.01 * i for i in range(12)])
+    _write(writer, "playroom", start + timedelta(seconds=10), [0.9] * 5)
+    _write(writer, "nursery", start + timedelta(seconds=22), [0.7 + 0.01 * i for i in range(4)])
+
+    while True:
+        page, next_cursor = _poll("nursery", cursor)
+        if not page:
+            assert next_cursor == cursor
+            break
+        assert len(page) <= 7
+        assert next_cursor > cursor
+        seen.extend(sample["rms"] for sample in page)
+        cursor = next_cursor
+
+    expected = [0.01 * i for i in range(10)] + [0.5 + 0.01 * i for i in range(12)]
+    expected += [0.7 + 0.01 * i for i in range(4)]
+    assert seen == pytest.approx(expected)
+
+
+def test_empty_poll_keeps_the_cursor(writer):
+    start = datetime.now(timezone.utc) - timedelta(minutes=1)
+    _write(writer, "nursery", start, [0.1, 0.2])
+    _resolution, _samples, cursor = volume_history.load_samples(15, stream_id="nursery")
+    assert _poll("nursery", cursor) == ([], cursor)
+
+
+def test_rollup_buckets_match_raw_samples(writer):
+    # Two whole minutes, so every 1 min rollup bucket is complete.
+    start = (datetime.now(timezone.utc) - timedelta(minutes=10)).replace(second=0, microsecond=0)
+    levels = [(i % 7) / 10 for i in range(120)]
+    _write(writer, "nursery", start, levels)
+
+    resolution, rolled, cursor = volume_history.load_samples(30, bucket_seconds=60, stream_id="nursery")
+    assert resolution == 60
+    assert cursor == volume_history.latest_cursor()
+    assert [bucket["t"] for bucket in rolled] == [start.isoformat(), (start + timedelta(minutes=1)).isoformat()]
+    for bucket, minute in zip(rolled, (levels[:60], levels[60:])):
+        assert bucket["rms"] == pytest.approx(sum(minute) / 60)
+        assert bucket["min"] == min(minute) and bucket["max"] == max(minute)
+
+    # A cursor poll with buckets only aggregates rows newer than the cursor.
+    _write(writer, "nursery", start + timedelta(minutes=2), [0.3, 0.5])
+    _resolution, fresh, next_cursor = volume_history.load_samples(
+        30, since=cursor, bucket_seconds=60, stream_id="nursery"
+    )
+    assert len(fresh) == 1 and fresh[0]["rms"] == pytest.approx(0.4)
+    assert next_cursor == cursor + 2
@@ -13,6 +13,17 @@ const VOLUME_Y_MIN = 0;
 const VOLUME_Y_MAX = 0.1;
 const allSamples = [];
 let lastSampleTime = 0;
+let volumeCursor = null;
+// Room shown by this dashboard: ?stream=<id>, or the server's default stream.
+const STREAM_ID = new URLSearchParams(window.location.search).get("stream");
+const STREAM_QUERY = STREAM_ID ? `stream=${encodeURIComponent(STREAM_ID)}` : "";
+
+function withStream(path) {
+  if (!STREAM_QUERY) {
+    return path;
+  }
+  return `${path}${path.includes("?") ? "&" : "?"}${STREAM_QUERY}`;
+}
 
 const thresholdSlider = document.getElementById("thresholdSlider");
 const incidentThresholdSlider = document.getElementById("incidentThresholdSlider");
@@ -119,6 +130,23 @@ function applySamples(samples) {
   }
 }
 
+// Replace the buffer with fetched history, keeping live samples newer than
+// it: stream events may arrive while the fetch is in flight.
+function replaceSamples(samples) {
+  const loaded = [];
+  for (const sample of samples) {
+    const ts = new Date(sample.t).getTime();
+    if (!Number.isNaN(ts) && (!loaded.length || ts > loaded[loaded.length - 1].t)) {
+      loaded.push({ t: ts, level: Number(sample.rms || 0) });
+    }
+  }
+  const lastLoaded = loaded.length ? loaded[loaded.length - 1].t : 0;
+  const live = allSamples.filter((point) => point.t > lastLoaded);
+  allSamples.length = 0;
+  allSamples.push(...loaded, ...live);
+  lastSampleTime = allSamples.length ? allSamples[allSamples.length - 1].t : 0;
+}
+
 function pruneSamples() {
   const cutoff = Date.now() - MAX_HISTORY_MINUTES * 60 * 1000;
   while (allSamples.length && allSamples[0].t < cutoff) {
@@ -350,7 +378,8 @@ function renderIncidentChart(buckets, startTime, endTime) {
 
 async function loadStatus() {
   try {
-    const response = await fetch(`/api/status?ts=${Date.now()}`, { cache: "no-store" });
+    // "no-cache" revalidates with If-None-Match; an unchanged status is a bodiless 304.
+    const response = await fetch(withStream("/api/status"), { cache: "no-cache" });
     if (!response.ok) {
       throw new Error("status request failed");
     }
@@ -361,25 +390,44 @@ async function loadStatus() {
   }
 }
 
+async function fetchVolume(query) {
+  const response = await fetch(withStream(`/api/volume?${query}&ts=${Date.now()}`), { cache: "no-store" });
+  if (!response.ok) {
+    throw new Error("volume request failed");
+  }
+  return response.json();
+}
+
+function applyThreshold(data) {
+  const threshold = Number(data.threshold || 0);
+  if (!Number.isFinite(currentThreshold)) {
+    const initial = Math.min(VOLUME_Y_MAX, Math.max(VOLUME_Y_MIN, threshold));
+    currentThreshold = initial;
+    if (thresholdSlider) {
+      thresholdSlider.value = String(initial);
+    }
+  }
+}
+
 async function loadVolume() {
   try {
-    const response = await fetch(`/api/volume?minutes=${MAX_HISTORY_MINUTES}&ts=${Date.now()}`, {
-      cache: "no-store",
-    });
-    if (!response.ok) {
-      throw new Error("volume request failed");
-    }
-    const data = await response.json();
-    const samples = Array.isArray(data.samples) ? data.samples : [];
-    const threshold = Number(data.threshold || 0);
-    if (!Number.isFinite(currentThreshold)) {
-      const initial = Math.min(VOLUME_Y_MAX, Math.max(VOLUME_Y_MIN, threshold));
-      currentThreshold = initial;
-      if (thresholdSlider) {
-        thresholdSlider.value = String(initial);
-      }
-    }
-    applySamples(samples);
+    // Older history arrives pre-bucketed by the server; only the
+    // high-resolution tail is fetched as raw samples.
+    const [history, recent] = await Promise.all([
+      fetchVolume(`minutes=${MAX_HISTORY_MINUTES}&bucket_seconds=${DOWNSAMPLE_SECONDS}`),
+      fetchVolume(`minutes=${HIGH_RES_MINUTES}`),
+    ]);
+    const historySamples = Array.isArray(history.samples) ? history.samples : [];
+    const recentSamples = Array.isArray(recent.samples) ? recent.samples : [];
+    const recentStart = recentSamples.length
+      ? new Date(recentSamples[0].t).getTime()
+      : Number.POSITIVE_INFINITY;
+    applyThreshold(recent);
+    replaceSamples([
+      ...historySamples.filter((sample) => new Date(sample.t).getTime() < recentStart),
+      ...recentSamples,
+    ]);
+    volumeCursor = recent.cursor;
     pruneSamples();
     renderVolumeChart();
     updateIncidentChart();
@@ -389,13 +437,18 @@ async function loadVolume() {
 }
 
 async function pollNewSamples() {
+  if (volumeCursor === null || volumeCursor === undefined) {
+    return;
+  }
   try {
-    const response = await fetch(`/api/volume?minutes=1&ts=${Date.now()}`, { cache: "no-store" });
-    if (!response.ok) {
-      throw new Error("poll request failed");
-    }
-    const data = await response.json();
+    const data = await fetchVolume(`since=${volumeCursor}`);
     const samples = Array.isArray(data.samples) ? data.samples : [];
+    if (data.cursor !== null && data.cursor !== undefined) {
+      volumeCursor = data.cursor;
+    }
+    if (!samples.length) {
+      return;
+    }
     applySamples(samples);
     pruneSamples();
     renderVolumeChart();
@@ -465,10 +518,37 @@ function initAlertAfterSlider() {
   });
 }
 
+function startPolling() {
+  setInterval(loadStatus, STATUS_POLL_MS);
+  setInterval(pollNewSamples, VOLUME_POLL_MS);
+}
+
+function startStream() {
+  if (!window.EventSource) {
+    startPolling();
+    return;
+  }
+  // The browser reconnects on its own and sends Last-Event-ID, so the
+  // server replays whatever was missed.
+  const source = new EventSource(withStream("/api/stream"));
+  source.addEventListener("status", (event) => {
+    updateStatus(JSON.parse(event.data));
+  });
+  source.addEventListener("volume", (event) => {
+    applySamples([JSON.parse(event.data)]);
+    pruneSamples();
+    renderVolumeChart();
+    updateIncidentChart();
+  });
+  source.addEventListener("reset", () => {
+    // loadVolume() replaces the buffer, filling the gap the reset reported.
+    loadVolume();
+  });
+}
+
 loadStatus();
-loadVolume();
 initThresholdSlider();
 initIncidentThresholdSlider();
 initAlertAfterSlider();
-setInterval(loadStatus, STATUS_POLL_MS);
-setInterval(pollNewSamples, VOLUME_POLL_MS);
+// Open the stream once history is in, so live samples extend it.
+loadVolume().then(startStream);